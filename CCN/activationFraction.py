@@ -12,6 +12,10 @@ from scipy import stats as st
 import matplotlib.pyplot as plt
 from scipy.optimize import least_squares as LSfit
 pd.set_option('mode.chained_assignment', None)
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'MISC')) # fileLoader is shared with MISC
+from fileLoader import load_files
 from plotgen import box_call, line_call, hist_call,scat_call
 large_nm = 60
 
@@ -59,15 +63,8 @@ def smps_data(files,freq='d',nm = [large_nm]):
     cols : [list of str] Names of used columns from SMPS output
     '''
     global large_nm
-    smps = pd.DataFrame()
-    for i in range(len(files)): #read in smps files and combine
-        f = files[i]
-        file =pd.read_csv(f) #read in smps file
-        file=file.set_index("DateTime Sample Start") #Set index
-        if i == 0:
-            smps= file
-        else:
-            smps = pd.concat([smps,file])
+    #read in smps files in parallel, overlapping timestamps keep the newest file
+    smps, conflicts = load_files(files, "DateTime Sample Start")
     numsmps = [s for s in smps.columns.to_numpy() if ('.' in s) and (s.split('.')[0].isdigit())]
 
     # IMPORTANT: sort numerically
@@ -119,23 +116,8 @@ def ccn_data(files, freq ='d', ss = [0.1,0.7], cortype =''):
     ccn : [DataFrame] Combined CCN data from all inputted files
     cols : [list of str] Names of used columns from CCN output
     '''
-    ccn = pd.DataFrame()
-    for i in range(len(files)): #read in smps files and combine
-        f = files[i]
-        file =pd.read_csv(f) #read in ccn file
-        try:
-            file=file.set_index('Datetime(UTC)') #Set index
-        except:
-            try:
-                file=file.set_index('Datetime UTC') #Set index
-            except:
-                file = file.set_index('Date String (YYYY-MM-DD hh:mm:ss) UTC')
-        file.index = file.index.rename('Datetime(UTC)')
-        if i == 0:
-            ccn = file
-        else:
-            ccn = pd.concat([ccn,file])
-    ccn.index = pd.to_datetime(ccn.index, format='mixed')
+    #read in ccn files in parallel, overlapping timestamps keep the newest file
+    ccn, conflicts = load_files(files, ['Datetime(UTC)', 'Datetime UTC', 'Date String (YYYY-MM-DD hh:mm:ss) UTC'])
     cols = []
     ss_cols = []
     for c in ccn.columns.to_numpy(): 
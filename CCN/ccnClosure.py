@@ -0,0 +1,264 @@
+"""
+Date: 10/19/26
+Purpose: CCN closure between the SMPS size distribution and measured CCN over a grid of kappa values
+"""
+
+"""IMPORTS"""
+import numpy as np
+import pandas as pd
+from os.path import expanduser
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'MISC')) # fileLoader is shared with MISC
+from fileLoader import load_files
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'SMPS')) # sampling line loss correction
+from smpsInletLoss import correct_losses
+pd.set_option('mode.chained_assignment', None)
+
+kappa_grid = np.round(np.arange(0.05, 1.01, 0.01), 2) #default hygroscopicity grid
+
+def critical_diameters(ss_vals, kappas, T=298):
+    '''
+    Köhler lookup table of the critical dry diameter for every ss% set point and kappa.
+    Uses the same kappa-Köhler approximation as cutOffDiameter.critical_diameter.
+    ----------
+
+    Parameters
+    ++++++++++
+    ss_vals : [list of float] ss% set points from CCN
+    kappas : [list of float] hygroscopicity values
+    T : [float] Temperature in K (default = 298)
+
+    Returns
+    ++++++++++
+    Dcrit : [ndarray] Critical diameters in nm w/ shape (n_ss, n_kappa)
+    '''
+    sigma = 0.072  # surface tension (N/m)
+    Mw = 0.018     # kg/mol
+    R = 8.314
+    rho_w = 1000   # kg/m3
+
+    A = (4 * sigma * Mw) / (R * T * rho_w)
+    ss = np.asarray(ss_vals, dtype=float)[:, None] / 100  # % to fraction
+    kappa = np.asarray(kappas, dtype=float)[None, :]
+    Dcrit = ((4 * A**3) / (27 * kappa * (np.log(1 + ss))**2))**(1/3)
+    return Dcrit * 1e9  # m to nm
+
+def bin_edges(dp):
+    '''
+    Log10 bin edges for SMPS midpoint diameters. Inner edges are halfway between
+    neighbouring midpoints, outer edges mirror the first and last half widths.
+    ----------
+
+    Parameters
+    ++++++++++
+    dp : [array-like] Sorted bin midpoint diameters in nm
+
+    Returns
+    ++++++++++
+    log_edges : [ndarray] log10 of the bin edges w/ shape (n_bins+1,)
+    dlogdp : [ndarray] Bin widths in log10 space w/ shape (n_bins,)
+    '''
+    logdp = np.log10(np.asarray(dp, dtype=float))
+    mids = (logdp[1:] + logdp[:-1]) / 2
+    log_edges = np.concatenate(([2*logdp[0] - mids[0]], mids, [2*logdp[-1] - mids[-1]]))
+    return log_edges, np.diff(log_edges)
+
+def closure_table(dp, ss_vals, kappas=kappa_grid, T=298):
+    '''
+    Precomputes where every critical diameter falls on the SMPS bin edges so the
+    cumulative concentration above Dcrit is a single gather + linear interpolation.
+    Only needs to be rebuilt when the bins, set points, kappa grid or T change.
+    ----------
+
+    Parameters
+    ++++++++++
+    dp : [array-like] Sorted bin midpoint diameters in nm
+    ss_vals : [list of float] ss% set points from CCN
+    kappas : [list of float] hygroscopicity grid (default = kappa_grid)
+    T : [float] Temperature in K (default = 298)
+
+    Returns
+    ++++++++++
+    table : [dict] lookup table with keys
+            + 'ss' - set points w/ shape (n_ss,)
+            + 'kappa' - kappa grid w/ shape (n_kappa,)
+            + 'dcrit' - critical diameters [nm] w/ shape (n_ss, n_kappa)
+            + 'idx' - lower edge index w/ shape (n_ss, n_kappa)
+            + 'frac' - fraction of the way to the next edge w/ shape (n_ss, n_kappa)
+            + 'dlogdp' - bin widths w/ shape (n_bins,)
+    '''
+    log_edges, dlogdp = bin_edges(dp)
+    dcrit = critical_diameters(ss_vals, kappas, T=T)
+    # fractional edge position, clipped to the measured size range
+    pos = np.interp(np.log10(dcrit), log_edges, np.arange(len(log_edges)))
+    idx = np.minimum(np.floor(pos).astype(int), len(log_edges)-2)
+    return {'ss': np.asarray(ss_vals, dtype=float), 'kappa': np.asarray(kappas, dtype=float),
+            'dcrit': dcrit, 'idx': idx, 'frac': pos - idx, 'dlogdp': dlogdp}
+
+def predict_ccn(dNdlogdp, table):
+    '''
+    Integrates the size distribution above Dcrit for every row, set point and kappa
+    in one broadcast operation.
+    ----------
+
+    Parameters
+    ++++++++++
+    dNdlogdp : [array-like] dN/dlogDp w/ shape (n_time, n_bins)
+    table : [dict] lookup table from closure_table()
+
+    Returns
+    ++++++++++
+    pred : [ndarray] Predicted CCN [#/cm3] w/ shape (n_time, n_ss, n_kappa)
+    '''
+    N = np.asarray(dNdlogdp, dtype=float) * table['dlogdp']
+    # cumulative concentration above each bin edge, last edge is 0
+    above = np.zeros((N.shape[0], N.shape[1]+1))
+    above[:, :-1] = np.cumsum(N[:, ::-1], axis=1)[:, ::-1]
+    idx, frac = table['idx'], table['frac']
+    return above[:, idx]*(1-frac) + above[:, idx+1]*frac
+
+def best_kappa(pred, meas, kappas):
+    '''
+    Selects the kappa per row that minimizes the mean squared log error between
+    predicted and measured CCN across all set points.
+    ----------
+
+    Parameters
+    ++++++++++
+    pred : [ndarray] Predicted CCN w/ shape (n_time, n_ss, n_kappa)
+    meas : [array-like] Measured CCN w/ shape (n_time, n_ss)
+    kappas : [array-like] hygroscopicity grid w/ shape (n_kappa,)
+
+    Returns
+    ++++++++++
+    kappa : [ndarray] Best-fit kappa w/ shape (n_time,) (nan where no valid set point)
+    k_idx : [ndarray] Index of the best-fit kappa w/ shape (n_time,)
+    err : [ndarray] Root mean squared log10 error at the best-fit kappa w/ shape (n_time,)
+    '''
+    meas = np.asarray(meas, dtype=float)[:, :, None]
+    valid = (pred > 0) & (meas > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sq = np.where(valid, np.log10(np.where(valid, pred/meas, 1))**2, 0)
+    n = valid.sum(axis=1)
+    mse = np.where(n > 0, sq.sum(axis=1)/np.maximum(n, 1), np.inf)
+    k_idx = np.argmin(mse, axis=1)
+    rows = np.arange(len(k_idx))
+    err = np.sqrt(mse[rows, k_idx])
+    kappa = np.where(np.isfinite(err), np.asarray(kappas)[k_idx], np.nan)
+    return kappa, k_idx, np.where(np.isfinite(err), err, np.nan)
+
+def smps_dist(files, freq='h', inlet_loss=False):
+    '''
+    Takes in a list of SMPS files and returns the time averaged dN/dlogDp bins
+    ----------
+
+    Parameters
+    ++++++++++
+    files : [list of str] Paths to SMPS files
+    freq : [str] Resample frequency for DataFrame (default = 'h')
+    inlet_loss : [bool] Correct every scan for sampling line diffusion losses before averaging,
+                 needs measured inlet values in smpsInletLoss.inlet_configs (default = False)
+
+    Returns
+    ++++++++++
+    smps : [DataFrame] dN/dlogDp with numerically sorted bin columns
+    dp : [ndarray] Bin midpoint diameters in nm
+    '''
+    smps, conflicts = load_files(files, "DateTime Sample Start")
+    numsmps = [s for s in smps.columns.to_numpy() if ('.' in s) and (s.split('.')[0].isdigit())]
+    # IMPORTANT: sort numerically
+    numsmps = sorted(numsmps, key=lambda x: float(x))
+    smps = smps[numsmps].sort_index()
+    if inlet_loss:
+        smps = correct_losses(smps)
+    smps = smps.resample(freq).mean()
+    smps.index.names = ['Date']
+    return smps, np.array([float(n) for n in numsmps])
+
+def ccn_meas(files, freq='h', ss_vals=[0.1,0.15,0.25,0.4,0.7]):
+    '''
+    Takes in a list of processed CCN files and returns the STP corrected concentration
+    for each set point
+    ----------
+
+    Parameters
+    ++++++++++
+    files : [list of str] Paths to CCN files
+    freq : [str] Resample frequency for DataFrame, None keeps every row (default = 'h')
+    ss_vals : [list of floats] ss% set points from CCN (default = [0.1,0.15,0.25,0.4,0.7])
+
+    Returns
+    ++++++++++
+    ccn : [DataFrame] N(cm-3)_cor_stp_setpt* columns for the set points found
+    ss_found : [list of float] set points with a matching column
+    '''
+    ccn, conflicts = load_files(files, ['Datetime(UTC)', 'Datetime UTC', 'Date String (YYYY-MM-DD hh:mm:ss) UTC'])
+    ss_found = [ss for ss in ss_vals if f'N(cm-3)_cor_stp_setpt{ss}' in ccn.columns]
+    ccn = ccn[[f'N(cm-3)_cor_stp_setpt{ss}' for ss in ss_found]].sort_index()
+    if freq is not None:
+        ccn = ccn.resample(freq).mean()
+    ccn.index.names = ['Date']
+    return ccn, ss_found
+
+def closure(smps_files, ccn_files, freq='h', ss_vals=[0.1,0.15,0.25,0.4,0.7], kappas=kappa_grid, kappa_ref=0.3, T=298, inlet_loss=False):
+    '''
+    Takes in a list of SMPS and CCN files and returns the CCN closure for every time step.
+    Predicted CCN are computed over time × ss × kappa, the best-fit kappa is the one that
+    minimizes the log error across set points.
+    ----------
+
+    Parameters
+    ++++++++++
+    smps_files : [list of str] Paths to SMPS files
+    ccn_files : [list of str] Paths to CCN files
+    freq : [str] Resample frequency for DataFrames (default = 'h')
+    ss_vals : [list of floats] ss% set points from CCN (default = [0.1,0.15,0.25,0.4,0.7])
+    kappas : [list of floats] hygroscopicity grid (default = kappa_grid)
+    kappa_ref : [float] fixed kappa to also report a closure ratio for (default = 0.3, None to skip)
+    T : [float] Temperature in K for the Köhler table (default = 298)
+    inlet_loss : [bool] Loss correct the SMPS scans before the >Dp integrals, see smps_dist (default = False)
+
+    Returns
+    ++++++++++
+    out : [DataFrame] kappa_best, closure_rmsle and per set point N_pred, N_meas and closure ratios
+    pred : [ndarray] Predicted CCN w/ shape (n_time, n_ss, n_kappa)
+    table : [dict] Köhler lookup table used for the prediction
+    '''
+    smps, dp = smps_dist(smps_files, freq, inlet_loss)
+    ccn, ss_found = ccn_meas(ccn_files, freq, ss_vals)
+    kappas = np.asarray(kappas, dtype=float)
+    if kappa_ref is not None:
+        kappas = np.union1d(kappas, [kappa_ref])
+    idx = smps.index.intersection(ccn.index)
+    smps, ccn = smps.loc[idx], ccn.loc[idx]
+
+    table = closure_table(dp, ss_found, kappas, T=T)
+    pred = predict_ccn(smps.to_numpy(), table)
+    meas = ccn.to_numpy()
+    kappa, k_idx, err = best_kappa(pred, meas, kappas)
+
+    rows = np.arange(len(idx))
+    pred_best = pred[rows, :, k_idx]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio_best = np.where(meas > 0, pred_best/meas, np.nan)
+    out = pd.DataFrame({'kappa_best': kappa, 'closure_rmsle': err}, index=idx)
+    for i, ss in enumerate(ss_found):
+        out[f'N(cm-3)_meas_setpt{ss}'] = meas[:, i]
+        out[f'N(cm-3)_pred_setpt{ss}'] = pred_best[:, i]
+        out[f'closure_ratio_setpt{ss}'] = ratio_best[:, i]
+    if kappa_ref is not None:
+        ref = int(np.argmin(np.abs(kappas - kappa_ref)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio_ref = np.where(meas > 0, pred[:, :, ref]/meas, np.nan)
+        for i, ss in enumerate(ss_found):
+            out[f'closure_ratio_k{kappa_ref}_setpt{ss}'] = ratio_ref[:, i]
+    return out, pred, table
+
+if __name__ == '__main__':
+    smps = [expanduser("~/Documents/Research/2024_SMPS_NumberSizeDist_1hr.csv"), expanduser("~/Documents/Research/SMPS_NumberSizeDist_2025_1hr.csv")]
+    ccn = [expanduser("~/Documents/Research/CCN_Processed_2024_1hr.csv"), expanduser("~/Documents/Research/CCN_Processed_2025_1hr.csv")]
+    data, pred, table = closure(smps, ccn, freq='h')
+    print(data.describe())
+    out = expanduser("~/Documents/Research/CCN_closure_1hr.csv")
+    data.to_csv(out)
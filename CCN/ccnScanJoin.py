@@ -0,0 +1,150 @@
+"""
+Date: 10/19/26
+Purpose: Join CCN minute data onto SMPS scans by averaging every set point over each scan's
+own [start, end) window, giving a scan resolution dataset for activation fraction and closure
+work instead of daily or monthly means
+"""
+
+"""IMPORTS"""
+import numpy as np
+import pandas as pd
+from os.path import expanduser
+from ccnClosure import ccn_meas
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'MISC')) # fileLoader is shared with MISC
+from fileLoader import load_files
+
+def scan_windows(smps, duration=None, max_gap=600):
+    '''
+    Start and end time of every SMPS scan. The end is the start plus the scan duration
+    (up scan + retrace when the AIM columns are present), never past the next scan's start.
+    Scans with a missing or non-finite duration get a NaT end and are left out of the join.
+    ----------
+
+    Parameters
+    ++++++++++
+    smps : [DataFrame] SMPS scans indexed by scan start time
+    duration : [float] Scan duration in seconds, None to take it from the file (default = None)
+    max_gap : [float] Longest window in seconds when the duration comes from the scan spacing (default = 600)
+
+    Returns
+    ++++++++++
+    start : [ndarray of datetime64[ns]] Scan start times, sorted
+    end : [ndarray of datetime64[ns]] Scan end times
+    '''
+    start = pd.to_datetime(smps.index).to_numpy(dtype='datetime64[ns]')
+    nxt = np.append(start[1:], np.datetime64('NaT', 'ns'))
+    if duration is not None:
+        end = start + np.timedelta64(int(duration*1e9), 'ns')
+    elif {'Scan Up Time(s)', 'Retrace Time(s)'} <= set(smps.columns):
+        secs = smps['Scan Up Time(s)'].to_numpy(dtype=float) + smps['Retrace Time(s)'].to_numpy(dtype=float)
+        secs = np.where(np.isfinite(secs), secs, np.nan)
+        end = np.where(np.isnan(secs), np.datetime64('NaT', 'ns'),
+                       start + (np.nan_to_num(secs)*1e9).astype('timedelta64[ns]'))
+    else:
+        spacing = np.diff(start)
+        typical = np.median(spacing) if len(spacing) else np.timedelta64(max_gap, 's')
+        end = np.where(np.isnat(nxt), start + typical, np.minimum(nxt, start + np.timedelta64(max_gap, 's')))
+    end = np.where(np.isnat(nxt), end, np.minimum(end, nxt))
+    return start, end
+
+def window_means(data, start, end):
+    '''
+    Mean and count of every column over each [start, end) window. Cumulative sums over the
+    sorted data are differenced at searchsorted bounds, so each window costs O(1).
+    ----------
+
+    Parameters
+    ++++++++++
+    data : [DataFrame] Time series indexed by time, nan are skipped
+    start : [array-like of datetime64] Window starts
+    end : [array-like of datetime64] Window ends (exclusive), NaT windows are empty
+
+    Returns
+    ++++++++++
+    means : [ndarray] Window means w/ shape (n_windows, n_columns), nan for empty windows
+    counts : [ndarray] Number of values in each window w/ the same shape
+    '''
+    data = data.sort_index()
+    t = pd.to_datetime(data.index).to_numpy(dtype='datetime64[ns]')
+    v = data.to_numpy(dtype=float)
+    valid = np.isfinite(v)
+    csum = np.vstack([np.zeros((1, v.shape[1])), np.cumsum(np.where(valid, v, 0), axis=0)])
+    ccount = np.vstack([np.zeros((1, v.shape[1]), dtype=int), np.cumsum(valid, axis=0)])
+    start = np.asarray(start, dtype='datetime64[ns]')
+    end = np.asarray(end, dtype='datetime64[ns]')
+    lo = np.searchsorted(t, start, side='left')
+    hi = np.searchsorted(t, end, side='left')
+    # a NaT start or end would sort past every time and take in all the data after the scan
+    hi = np.where(np.isnat(start) | np.isnat(end), lo, hi)
+    counts = ccount[hi] - ccount[lo]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(counts > 0, (csum[hi] - csum[lo])/counts, np.nan)
+    return means, counts
+
+def scan_join(smps, ccn, ss_found, duration=None, total_col='Total Concentration (#/cm³)'):
+    '''
+    Averages the CCN set point concentrations over every SMPS scan window and adds them
+    to the scans with the activation fraction N_CCN/N_total
+    ----------
+
+    Parameters
+    ++++++++++
+    smps : [DataFrame] SMPS scans indexed by scan start time
+    ccn : [DataFrame] N(cm-3)_cor_stp_setpt* columns at full time resolution
+    ss_found : [list of float] Set points of the ccn columns, in column order
+    duration : [float] Scan duration in seconds, None to take it from the file (default = None)
+    total_col : [str] SMPS total concentration column (default = 'Total Concentration (#/cm³)')
+
+    Returns
+    ++++++++++
+    data : [DataFrame] SMPS scans with 'Scan End', CCN means, counts and activation fractions
+    '''
+    smps = smps.sort_index()
+    start, end = scan_windows(smps, duration)
+    means, counts = window_means(ccn, start, end)
+    data = smps.copy()
+    data['Scan End'] = end
+    total = data[total_col].to_numpy(dtype=float) if total_col in data.columns else None
+    for i, ss in enumerate(ss_found):
+        data[f'N(cm-3)_cor_stp_setpt{ss}'] = means[:, i]
+        data[f'n_ccn_setpt{ss}'] = counts[:, i]
+        if total is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                data[f'AF_setpt{ss}'] = np.where(total > 0, means[:, i]/total, np.nan)
+    return data
+
+def scan_join_files(smps_files, ccn_files, ss_vals=[0.1,0.15,0.25,0.4,0.7], duration=None, dropna=True):
+    '''
+    Reads SMPS and CCN files and joins them at SMPS scan resolution
+    ----------
+
+    Parameters
+    ++++++++++
+    smps_files : [list of str] Paths to SMPS files (individual scans, not averaged)
+    ccn_files : [list of str] Paths to CCN files (minute data)
+    ss_vals : [list of floats] ss% set points from CCN (default = [0.1,0.15,0.25,0.4,0.7])
+    duration : [float] Scan duration in seconds, None to take it from the file (default = None)
+    dropna : [bool] Drop scans without CCN data at any set point (default = True)
+
+    Returns
+    ++++++++++
+    data : [DataFrame] Joined scans, see scan_join
+    ss_found : [list of float] Set points found in the CCN files
+    '''
+    smps, conflicts = load_files(smps_files, "DateTime Sample Start")
+    smps = smps[~smps.index.isna()]
+    ccn, ss_found = ccn_meas(ccn_files, None, ss_vals)
+    data = scan_join(smps, ccn, ss_found, duration)
+    if dropna:
+        data = data[data[[f'n_ccn_setpt{ss}' for ss in ss_found]].to_numpy().any(axis=1)]
+    return data, ss_found
+
+if __name__ == '__main__':
+    smps = [expanduser("~/Documents/Research/SMPS_NumberSizeDist_2025.csv")]
+    ccn = [expanduser("~/Documents/Research/CCN_Processed_2025.csv")]
+    data, ss_found = scan_join_files(smps, ccn)
+    print(data[[f'AF_setpt{ss}' for ss in ss_found]].describe())
+    out = expanduser("~/Documents/Research/SMPS_CCN_scan_join.csv")
+    data.to_csv(out)
@@ -14,6 +14,13 @@ from scipy.linalg import lstsq
 import matplotlib.pyplot as plt
 from pathlib import Path
 from os.path import expanduser 
+import sys
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'SMPS')) # sampling line loss correction
+from smpsInletLoss import correct_losses
+
+# correct the SMPS bins for sampling line diffusion losses before the >Dp sums,
+# needs measured inlet values in smpsInletLoss.inlet_configs
+inlet_loss = False
 
 #Read in files, feel free to replace these with exact 
 # ccn24 = pd.read_csv(expanduser("~/Documents/Research/CCN_Processed_2024_1hr.csv"))
@@ -41,6 +48,8 @@ numsmps = [s for s in smps.columns.to_numpy() if ('.' in s) and (s.split('.')[0]
 gr200 = [s for s in numsmps if float(s) >200]
 gr80 = [s for s in numsmps if float(s) >80]
 smps = smps[numsmps]
+if inlet_loss:
+    smps = correct_losses(smps)
 smps = smps.resample('d').mean()
 smps.index.names = ['Date']
 smps['>80nm'] = smps[gr80].mean(axis=1)  
@@ -11,6 +11,10 @@ from scipy.stats import linregress, pearsonr
 import matplotlib.pyplot as plt
 from scipy.optimize import least_squares as LSfit
 pd.set_option('mode.chained_assignment', None)
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'MISC')) # fileLoader is shared with MISC
+from fileLoader import load_files
 plt.rcParams['font.size'] = 20
 
 def critical_diameter(ss, kappa=0.1, T=298):
@@ -70,16 +74,8 @@ def smps_data(files,freq='d',ss = [0.1,0.7]):
     smps : [DataFrame] Combined SMPS data from all inputted files
     cols : [list of str] Names of used columns from SMPS output
     '''
-    smps = pd.DataFrame()
-    for i in range(len(files)): #read in smps files and combine
-        f = files[i]
-        file =pd.read_csv(f) #read in smps file
-        file=file.set_index("DateTime Sample Start") #Set index
-        if i == 0:
-            smps= file
-        else:
-            smps = pd.concat([smps,file])
-    smps.index = pd.to_datetime(smps.index)
+    #read in smps files in parallel, overlapping timestamps keep the newest file
+    smps, conflicts = load_files(files, "DateTime Sample Start")
     numsmps = [s for s in smps.columns.to_numpy() if ('.' in s) and (s.split('.')[0].isdigit())]
     total = smps['Total Concentration (#/cm³)'].to_numpy()
     # IMPORTANT: sort numerically
@@ -124,23 +120,8 @@ def ccn_data(files, freq ='d', ss = [0.1,0.7], cortype =''):
     ccn : [DataFrame] Combined CCN data from all inputted files
     cols : [list of str] Names of used columns from CCN output
     '''
-    ccn = pd.DataFrame()
-    for i in range(len(files)): #read in smps files and combine
-        f = files[i]
-        file =pd.read_csv(f) #read in ccn file
-        try:
-            file=file.set_index('Datetime(UTC)') #Set index
-        except:
-            try:
-                file=file.set_index('Datetime UTC') #Set index
-            except:
-                file = file.set_index('Date String (YYYY-MM-DD hh:mm:ss) UTC')
-        file.index = file.index.rename('Datetime(UTC)')
-        if i == 0:
-            ccn = file
-        else:
-            ccn = pd.concat([ccn,file])
-    ccn.index = pd.to_datetime(ccn.index, format='mixed')
+    #read in ccn files in parallel, overlapping timestamps keep the newest file
+    ccn, conflicts = load_files(files, ['Datetime(UTC)', 'Datetime UTC', 'Date String (YYYY-MM-DD hh:mm:ss) UTC'])
     cols = ['T(C)_inlet','T1(C)','T(C)_sample','T(C)_OPC','T(C)_nafion','Q(lpm)_sample','Q(lpm)_sheath','P(hPA)_sample']
     ss_cols = []
     for c in ccn.columns.to_numpy(): 
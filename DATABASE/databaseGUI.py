@@ -10,12 +10,21 @@ import pandas as pd
 import os
 import datetime as dt 
 import tkinter as tk
+from tkinter import filedialog
 # from tkinter import ttk
 from rangeslider import RangeSliderH 
+from databaseQuery import Store, Catalog, plan_query, run_query
 
 
+store = Store()
+catalog = Catalog(store.root / 'catalog.json')
 start_date = pd.Timestamp("01/01/2024")
 end_date= pd.Timestamp("01/01/2025")
+first, last = store.extent()
+if first is not None:
+   # slider spans the stored data, whole days
+   start_date = first.normalize()
+   end_date = last.normalize() + pd.Timedelta(1, "days")
 root = tk.Tk()
 root.title('AppalAIR Database')
 # Create a StringVar to associate with the l1
@@ -119,6 +128,8 @@ l3 = tk.Label(root,
                 )
 #listbox options  
 values = ["CCN SS", "SMPS ultrafine count", "AE33 Black Carbon", "Standard Temperature","CCN flow", "SMPS fine count", "AE33 Brown Carbon", "Ambient Temperature"] 
+if catalog.names():
+   values = catalog.names()
 
 # create a Listbox widget
 lb_vars = tk.Listbox(root, selectmode="multiple", 
@@ -247,18 +258,32 @@ proc_entry.pack()
 lb_proc.pack(side="top",padx = 10, pady = 5,
           expand = tk.YES, fill = "both")
 
-# Function for printing the
+# Function for querying the
 # selected listbox value(s)
-vars_out = []
-proc_out = []
 def selected_item():
-   for i in lb_vars.curselection():
-      vars_out.append(lb_vars.get(i))
-   for i in lb_proc.curselection():
-      proc_out.append(lb_proc.get(i))
-   print(vars_out)
-   print(proc_out)
-   root.quit()
+   vars_out = [lb_vars.get(i) for i in lb_vars.curselection()]
+   proc_out = [lb_proc.get(i) for i in lb_proc.curselection()]
+   # slider dates are whole days, the end day is included
+   start = pd.Timestamp(dateConv(hLeft.get(), start_date,end_date))
+   end = pd.Timestamp(dateConv(hRight.get(), start_date,end_date)) + pd.Timedelta(1, "days")
+   try:
+      plan = plan_query(store, catalog, vars_out, start, end, proc_out)
+      print(plan.explain())
+      data = run_query(store, catalog, plan)
+   except (KeyError, ValueError) as e:
+      print(e)
+      status_var.set(f"Error: {e}")
+      return
+   if data.dropna(how="all").empty:
+      status_var.set("No data for the selected dates")
+      return
+   out = filedialog.asksaveasfilename(defaultextension=".csv",
+                                      initialfile=f"AppalAIR_{start.date()}_{(end - pd.Timedelta(1, 'days')).date()}.csv",
+                                      filetypes=[("CSV", "*.csv")])
+   if not out:
+      return
+   data.to_csv(out)
+   status_var.set(f"{len(data)} rows written to {os.path.basename(out)}")
 
 # Create a button widget and
 # map the command parameter to
@@ -268,11 +293,12 @@ btn = tk.Button(root, text='Output Selected Data', command=selected_item)
 # Placing the button and listbox
 btn.pack(pady=5)
 
+status_var = tk.StringVar(root, "")
 lblank= tk.Label(root, 
-                 text="", 
+                 textvariable=status_var, 
                  anchor=tk.CENTER,          
                  height=2,              
-                 width=15,                            
+                 width=50,                            
                  padx=15,               
                  pady=2,                            
                  justify=tk.LEFT,              
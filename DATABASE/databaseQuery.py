@@ -0,0 +1,454 @@
+"""
+Date: 10/19/26
+Purpose: Local store and query planner behind databaseGUI. Instrument data is kept in monthly
+partitions, one numpy file per column, and a catalog maps the variable names shown in the GUI
+to the instrument and column they are stored under. A query reads only the partitions that
+overlap the selected dates and only the columns of the selected variables, then applies the
+selected conversion and averaging.
+
+python databaseQuery.py ingest AE33 AE33_2024.csv
+python databaseQuery.py catalog "AE33 Black Carbon" AE33 BC6 --units ng/m3
+python databaseQuery.py query "AE33 Black Carbon" --start 2024-01-01 --end 2024-02-01 --process "Daily Mean"
+"""
+
+"""IMPORTS"""
+import numpy as np
+import pandas as pd
+import os
+import sys
+import json
+import shutil
+import argparse
+from pathlib import Path
+
+store_path = Path(__file__).resolve().parent.parent / 'data' / 'database'
+
+# GUI processing options -> resample rule
+means = {'Daily Mean': 'D', 'Weekly Mean': 'W', 'Monthly Mean': 'MS'}
+conversions = ['STP Conversion', 'ATP Conversion']
+
+# catalog entries read for ATP conversion
+ambient_temperature = 'Ambient Temperature'
+ambient_pressure = 'Ambient Pressure'
+ambient_tolerance = pd.Timedelta('1h') # furthest ambient reading matched to a sample
+
+standard_temperature = 273.15 # K
+standard_pressure = 1013.25 # hPa
+
+def _month(time):
+    return pd.Timestamp(time).strftime('%Y-%m')
+
+def _write_partition(folder, df):
+    # written next to the partition and swapped in, an interrupted write leaves the old one
+    tmp = folder.with_name('.' + folder.name + '.tmp')
+    old = folder.with_name('.' + folder.name + '.old')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    np.save(tmp / 'time.npy', df.index.to_numpy(dtype='datetime64[ns]').astype(np.int64))
+    for i, c in enumerate(df.columns):
+        np.save(tmp / f'c{i}.npy', df[c].to_numpy(dtype=np.float64))
+    meta = {'columns': [str(c) for c in df.columns], 'rows': len(df),
+            'start': str(df.index[0]), 'end': str(df.index[-1])}
+    with open(tmp / 'meta.json', 'w') as f:
+        json.dump(meta, f)
+    shutil.rmtree(old, ignore_errors=True)
+    if folder.exists():
+        folder.rename(old)
+    tmp.rename(folder)
+    shutil.rmtree(old, ignore_errors=True)
+
+class Store():
+    """
+    Instrument data partitioned by instrument and month, root/instrument/YYYY-MM/ holds
+    time.npy (int64 ns, sorted and unique), one float64 file per column and meta.json
+    """
+    def __init__(self, root=store_path):
+        self.root = Path(root)
+
+    def instruments(self):
+        """
+        Instruments with data in the store
+        """
+        if not self.root.is_dir():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir() and not p.name.startswith('.'))
+
+    def partitions(self, instrument, start=None, end=None):
+        """
+        Monthly partition folders of an instrument that can hold times in [start, end)
+        ----------
+        Paramaters
+        ++++++++++
+        instrument : [str] Instrument name, ex. 'AE33'
+        start : [str/datetime] First time wanted (default = None, first partition)
+        end : [str/datetime] Time to stop before (default = None, last partition)
+
+        Returns
+        ++++++++++
+        folders : [list of Path] Partition folders in time order
+        """
+        folder = self.root / instrument
+        if not folder.is_dir():
+            return []
+        first = None if start is None else _month(start)
+        last = None if end is None else _month(pd.Timestamp(end) - pd.Timedelta(1, 'ns'))
+        return [p for p in sorted(folder.iterdir()) if p.is_dir() and not p.name.startswith('.')
+                and (first is None or p.name >= first) and (last is None or p.name <= last)]
+
+    def meta(self, partition):
+        """
+        Columns, row count and first and last time of a partition
+        """
+        with open(Path(partition) / 'meta.json') as f:
+            return json.load(f)
+
+    def columns(self, instrument):
+        """
+        Every column stored for an instrument
+        """
+        found = {}
+        for p in self.partitions(instrument):
+            found.update(dict.fromkeys(self.meta(p)['columns']))
+        return list(found)
+
+    def extent(self, instrument=None):
+        """
+        First and last time in the store, or of one instrument, (None, None) when empty
+        """
+        names = self.instruments() if instrument is None else [instrument]
+        starts, ends = [], []
+        for name in names:
+            parts = self.partitions(name)
+            if parts:
+                starts.append(pd.Timestamp(self.meta(parts[0])['start']))
+                ends.append(pd.Timestamp(self.meta(parts[-1])['end']))
+        if not starts:
+            return None, None
+        return min(starts), max(ends)
+
+    def read_partition(self, partition, columns, start=None, end=None):
+        """
+        Rows of one partition with start <= time < end, columns not in the partition are nan
+        ----------
+        Paramaters
+        ++++++++++
+        partition : [Path] Partition folder
+        columns : [list of str] Columns to read
+        start : [str/datetime] First time to include (default = None)
+        end : [str/datetime] Time to stop before (default = None)
+
+        Returns
+        ++++++++++
+        data : [Pandas DataFrame] Selected rows and columns indexed by time
+        """
+        partition = Path(partition)
+        stored = {c: i for i, c in enumerate(self.meta(partition)['columns'])}
+        times = np.load(partition / 'time.npy', mmap_mode='r')
+        lo = 0 if start is None else np.searchsorted(times, pd.Timestamp(start).value, 'left')
+        hi = len(times) if end is None else np.searchsorted(times, pd.Timestamp(end).value, 'left')
+        data = {}
+        for c in columns:
+            if c in stored:
+                data[c] = np.array(np.load(partition / f'c{stored[c]}.npy', mmap_mode='r')[lo:hi])
+            else:
+                data[c] = np.full(hi - lo, np.nan)
+        index = pd.DatetimeIndex(np.array(times[lo:hi]).astype('datetime64[ns]'), name='time')
+        return pd.DataFrame(data, index=index, columns=columns)
+
+    def read(self, instrument, columns, start=None, end=None):
+        """
+        Rows of an instrument with start <= time < end, only the overlapping partitions are opened
+        ----------
+        Paramaters
+        ++++++++++
+        instrument : [str] Instrument name
+        columns : [list of str] Columns to read
+        start : [str/datetime] First time to include (default = None)
+        end : [str/datetime] Time to stop before (default = None)
+
+        Returns
+        ++++++++++
+        data : [Pandas DataFrame] Selected rows and columns indexed by time
+        """
+        parts = [self.read_partition(p, columns, start, end) for p in self.partitions(instrument, start, end)]
+        if not parts:
+            return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='time'), dtype=np.float64)
+        return pd.concat(parts)
+
+    def write(self, instrument, df):
+        """
+        Adds data to the store. Rows are split into monthly partitions and merged with the rows
+        already stored column by column, where a time and column are in both the new value is kept
+        and columns missing from the new data keep their stored values.
+        ----------
+        Paramaters
+        ++++++++++
+        instrument : [str] Instrument name, ex. 'AE33'
+        df : [Pandas DataFrame] Numeric columns indexed by time
+
+        Returns
+        ++++++++++
+        months : [list of str] Partitions written
+        """
+        df = df.copy()
+        df.index = pd.DatetimeIndex(df.index, name='time')
+        df = df[df.index.notna()].astype(np.float64)
+        df.columns = [str(c) for c in df.columns]
+        months = []
+        for month, new in df.groupby(df.index.to_period('M')):
+            month = str(month)
+            folder = self.root / instrument / month
+            new = new[~new.index.duplicated(keep='last')]
+            if folder.exists():
+                old = self.read_partition(folder, self.meta(folder)['columns'])
+                columns = list(old.columns) + [c for c in new.columns if c not in old.columns]
+                new = new.combine_first(old)[columns]
+            new = new.sort_index()
+            _write_partition(folder, new)
+            months.append(month)
+        return months
+
+class Catalog():
+    """
+    Maps the variable names shown in the GUI to stored columns, kept in a json file as
+    name -> {'instrument', 'column', 'units', 'temperature', 'pressure'}. temperature (C) and
+    pressure (hPa) are the instrument's sample condition columns, used by the conversions.
+    """
+    def __init__(self, path=None):
+        self.path = store_path / 'catalog.json' if path is None else Path(path)
+        self.entries = {}
+        if self.path.is_file():
+            with open(self.path) as f:
+                self.entries = json.load(f)
+
+    def names(self):
+        """
+        Variable names in the catalog
+        """
+        return list(self.entries)
+
+    def add(self, name, instrument, column, units='', temperature=None, pressure=None):
+        """
+        Adds or replaces a variable and saves the catalog
+        """
+        self.entries[name] = {'instrument': instrument, 'column': column, 'units': units,
+                              'temperature': temperature, 'pressure': pressure}
+        self.save()
+
+    def save(self):
+        """
+        Writes the catalog, replacing the old file in one step
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + '.part')
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def resolve(self, name):
+        """
+        Catalog entry of a variable name
+        """
+        if name not in self.entries:
+            raise KeyError(f'{name} is not in the catalog {self.path}')
+        return self.entries[name]
+
+class QueryPlan():
+    """
+    What a query reads and does: the partitions and columns of every instrument, the
+    conversion and the averaging. Built by plan_query, run by run_query.
+    """
+    def __init__(self, names, start, end, reads, freq, conversion, converted):
+        self.names = names
+        self.start = start
+        self.end = end
+        self.reads = reads # instrument -> {'columns': [...], 'partitions': [...]}
+        self.freq = freq
+        self.conversion = conversion
+        self.converted = converted # variable names the conversion applies to
+
+    def explain(self):
+        """
+        Readable description of the plan
+        """
+        lines = [f'{len(self.names)} variables from {self.start} to {self.end}']
+        for instrument, read in self.reads.items():
+            months = [p.name for p in read['partitions']]
+            span = f'{months[0]} .. {months[-1]}' if months else 'no data'
+            lines.append(f'  {instrument}: {len(months)} partitions ({span}), columns {read["columns"]}')
+        if self.conversion:
+            lines.append(f'  {self.conversion} of {self.converted}')
+        if self.freq:
+            lines.append(f'  resampled to {self.freq} means')
+        return '\n'.join(lines)
+
+def plan_query(store, catalog, names, start=None, end=None, processing=()):
+    """
+    Plans a query of GUI variables over a date range
+    ----------
+    Paramaters
+    ++++++++++
+    store : [Store] Data store
+    catalog : [Catalog] Variable catalog
+    names : [list of str] GUI variable names
+    start : [str/datetime] First time to include (default = None)
+    end : [str/datetime] Time to stop before (default = None)
+    processing : [list of str] GUI processing options, at most one mean and one conversion
+
+    Returns
+    ++++++++++
+    plan : [QueryPlan]
+    """
+    if not names:
+        raise ValueError('No variables selected')
+    unknown = [p for p in processing if p not in means and p not in conversions]
+    chosen_means = [p for p in processing if p in means]
+    chosen_conv = [p for p in processing if p in conversions]
+    if unknown:
+        raise ValueError(f'Unknown processing options: {unknown}')
+    if len(chosen_means) > 1:
+        raise ValueError(f'Select only one mean, not {chosen_means}')
+    if len(chosen_conv) > 1:
+        raise ValueError(f'Select only one conversion, not {chosen_conv}')
+    conversion = chosen_conv[0] if chosen_conv else None
+
+    wanted = {}
+    def need(instrument, column):
+        cols = wanted.setdefault(instrument, [])
+        if column is not None and column not in cols:
+            cols.append(column)
+
+    converted = []
+    for name in names:
+        entry = catalog.resolve(name)
+        need(entry['instrument'], entry['column'])
+        if conversion and entry.get('temperature') and entry.get('pressure'):
+            need(entry['instrument'], entry['temperature'])
+            need(entry['instrument'], entry['pressure'])
+            converted.append(name)
+    if conversion == 'ATP Conversion' and converted:
+        for name in (ambient_temperature, ambient_pressure):
+            entry = catalog.resolve(name)
+            need(entry['instrument'], entry['column'])
+
+    reads = {instrument: {'columns': columns, 'partitions': store.partitions(instrument, start, end)}
+             for instrument, columns in wanted.items()}
+    freq = means[chosen_means[0]] if chosen_means else None
+    return QueryPlan(list(names), start, end, reads, freq, conversion, converted)
+
+def run_query(store, catalog, plan):
+    """
+    Runs a query plan
+    ----------
+    Paramaters
+    ++++++++++
+    store : [Store] Data store
+    catalog : [Catalog] Variable catalog
+    plan : [QueryPlan] From plan_query
+
+    Returns
+    ++++++++++
+    data : [Pandas DataFrame] One column per GUI variable indexed by time, instruments are
+        joined on time
+    """
+    frames = {}
+    for instrument, read in plan.reads.items():
+        parts = [store.read_partition(p, read['columns'], plan.start, plan.end) for p in read['partitions']]
+        if not parts:
+            parts = [pd.DataFrame(columns=read['columns'], index=pd.DatetimeIndex([], name='time'), dtype=np.float64)]
+        frames[instrument] = pd.concat(parts)
+
+    if plan.conversion == 'ATP Conversion' and plan.converted:
+        ambient = {}
+        for key, name in (('temperature', ambient_temperature), ('pressure', ambient_pressure)):
+            entry = catalog.resolve(name)
+            ambient[key] = frames[entry['instrument']][entry['column']]
+
+    columns = {}
+    for name in plan.names:
+        entry = catalog.resolve(name)
+        data = frames[entry['instrument']]
+        values = data[entry['column']]
+        if name in plan.converted:
+            t = data[entry['temperature']] + standard_temperature
+            p = data[entry['pressure']]
+            if plan.conversion == 'STP Conversion':
+                values = values * (standard_pressure / p) * (t / standard_temperature)
+            else:
+                t_amb = ambient['temperature'].reindex(data.index, method='nearest', tolerance=ambient_tolerance)
+                p_amb = ambient['pressure'].reindex(data.index, method='nearest', tolerance=ambient_tolerance)
+                values = values * (p_amb / p) * (t / (t_amb + standard_temperature))
+        if plan.freq:
+            values = values.resample(plan.freq).mean()
+        columns[name] = values
+
+    result = pd.concat(columns, axis=1, join='outer').sort_index()
+    result.index.name = 'time'
+    return result
+
+def query(names, start=None, end=None, processing=(), store=None, catalog=None):
+    """
+    Plans and runs a query, see plan_query
+    """
+    store = Store() if store is None else store
+    catalog = Catalog(store.root / 'catalog.json') if catalog is None else catalog
+    return run_query(store, catalog, plan_query(store, catalog, names, start, end, processing))
+
+def read_csv(path, time_col=None):
+    """
+    Reads a csv for ingest, the time column (default = first column) becomes the index
+    and columns with no numeric values are dropped
+    """
+    df = pd.read_csv(path, low_memory=False)
+    time_col = df.columns[0] if time_col is None else time_col
+    index = pd.to_datetime(df.pop(time_col), format='mixed', errors='coerce')
+    df = df.apply(pd.to_numeric, errors='coerce').dropna(axis=1, how='all')
+    df.index = pd.DatetimeIndex(index, name='time')
+    return df
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='AppalAIR database store')
+    parser.add_argument('--store', default=str(store_path), help='store folder')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    ingest = sub.add_parser('ingest', help='add csv files to the store')
+    ingest.add_argument('instrument')
+    ingest.add_argument('files', nargs='+')
+    ingest.add_argument('--time-col', default=None, help='time column (default: first column)')
+
+    cat = sub.add_parser('catalog', help='add a GUI variable to the catalog')
+    cat.add_argument('name')
+    cat.add_argument('instrument')
+    cat.add_argument('column')
+    cat.add_argument('--units', default='')
+    cat.add_argument('--temperature', default=None, help='sample temperature column (C)')
+    cat.add_argument('--pressure', default=None, help='sample pressure column (hPa)')
+
+    q = sub.add_parser('query', help='query GUI variables')
+    q.add_argument('names', nargs='+')
+    q.add_argument('--start', default=None)
+    q.add_argument('--end', default=None)
+    q.add_argument('--process', nargs='*', default=[], choices=list(means) + conversions)
+    q.add_argument('--out', default=None, help='csv file (default: print)')
+    args = parser.parse_args(argv)
+
+    store = Store(args.store)
+    catalog = Catalog(store.root / 'catalog.json')
+    if args.command == 'ingest':
+        for file in args.files:
+            months = store.write(args.instrument, read_csv(file, args.time_col))
+            print(f'{file}: {len(months)} partitions of {args.instrument} written')
+    elif args.command == 'catalog':
+        catalog.add(args.name, args.instrument, args.column, args.units, args.temperature, args.pressure)
+    else:
+        plan = plan_query(store, catalog, args.names, args.start, args.end, args.process)
+        print(plan.explain())
+        data = run_query(store, catalog, plan)
+        if args.out:
+            data.to_csv(args.out)
+        else:
+            print(data)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
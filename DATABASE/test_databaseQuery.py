@@ -0,0 +1,25 @@
+"""
+Date: 10/19/26
+Purpose: Checks of the databaseQuery store, run with pytest from the DATABASE folder
+"""
+
+"""IMPORTS"""
+import numpy as np
+import pandas as pd
+from databaseQuery import Store
+
+def test_partial_write_keeps_other_columns(tmp_path):
+    store = Store(tmp_path)
+    times = pd.date_range('2024-01-31 23:58', periods=4, freq='1min')
+    store.write('CCN', pd.DataFrame({'N': [1.0, 2.0, 3.0, 4.0], 'T': 20.0, 'P': 900.0}, index=times))
+    # overlapping ingest with only some of the columns, one time new and one value missing
+    later = pd.date_range('2024-02-01 00:00', periods=3, freq='1min')
+    store.write('CCN', pd.DataFrame({'N': [30.0, np.nan, 50.0], 'SS': 0.2}, index=later))
+
+    data = store.read('CCN', ['N', 'T', 'P', 'SS'])
+    assert list(data.index) == list(times) + [later[-1]]
+    assert data['N'].tolist() == [1.0, 2.0, 30.0, 4.0, 50.0]
+    assert data['T'].tolist()[:4] == [20.0] * 4 and np.isnan(data['T'].iloc[4])
+    assert data['P'].tolist()[:4] == [900.0] * 4
+    assert np.isnan(data['SS'].iloc[:2]).all() and data['SS'].iloc[2:].tolist() == [0.2] * 3
+    assert store.columns('CCN')[:3] == ['N', 'T', 'P']
@@ -10,10 +10,15 @@ from PyQt6.QtWidgets import (
     QWidget,
     QStyleFactory,
     QTextEdit,
-    QGridLayout
+    QGridLayout,
+    QComboBox
 )
 from PyQt6.QtGui import QFont
 import mplnetpytools as mpt
+from functools import partial
+from mplnetmanifest import Manifest
+from mplnetworkers import JobQueue
+from mplnetmetadata import MetadataCache
 
 # Only needed for access to command line arguments
 import sys
@@ -23,16 +28,30 @@ class MainWindow(QMainWindow):
     # Restart code
     EXIT_CODE_REBOOT = -12342
 
+    # Clear-sky average choices, (freq, clear_sky, file prefix) for mpt.ClearSkyAvg
+    CLEAR_SKY_OPTIONS = {
+        'Hourly, cloudy profiles removed': ('h', 'profile', 'CLRHRAVG_'),
+        'Daily, cloudy profiles removed': ('D', 'profile', 'CLRDAYAVG_'),
+        'Hourly, below cloud base': ('h', 'below_base', 'CLRBASEHRAVG_'),
+        'Daily, below cloud base': ('D', 'below_base', 'CLRBASEDAYAVG_'),
+    }
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("MPLNET GUI")
         self.vars = mpt.SelectionVariables()
         self.filevars = mpt.FileVariables()
+        # Variable lists are read once per file type, level and version and kept between sessions
+        self.filevars.setMetadataCache(MetadataCache())
         
-        # Start with accessing the mplnet website and retrieving the ntml to parse
-        url = 'https://mplnet.gsfc.nasa.gov/out/data/V3_partners/Appalachian_State/'
-        html = mpt.get_mplnet_html(url)  
-        self.vars.getVars(html.text)
+        # Start with the cached manifest of the mplnet website, only new months are read from the server
+        self.manifest = Manifest()
+        self.manifest.refresh()
+        self.vars.setManifest(self.manifest)
+
+        # Downloads and exports run in order on a worker thread, progress is shown in the selectionWindow
+        self.jobs = JobQueue()
+        self.jobs.message.connect(self.updateSelection)
 
         # Get current working directory
         qPath = QDir.currentPath()
@@ -100,6 +119,7 @@ class MainWindow(QMainWindow):
         self.grid.setRowStretch(5, 1)
         self.grid.setRowStretch(6, 1)
         self.grid.setRowStretch(7, 1)
+        self.grid.setRowStretch(8, 1)
 
         # add grid with addWidget(widgetName, row, column, optional:rowSpan, optional:columnSpan)
         self.grid.addWidget(self.infoLabel, 1, 0, 1, 3)
@@ -143,6 +163,32 @@ class MainWindow(QMainWindow):
         self.dayavgRadio.toggled.connect(lambda:self.radioState(self.dayavgRadio))
         self.grid.addWidget(self.dayavgRadio, 7, 4, 1, 2)
 
+        # cloud screened average, needs the CLD files of the same days
+        self.clearavgRadio = QRadioButton('Clear-Sky Average')
+        self.clearavgRadio.setEnabled(False)
+        self.clearavgRadio.toggled.connect(lambda:self.radioState(self.clearavgRadio))
+        self.grid.addWidget(self.clearavgRadio, 8, 0, 1, 2)
+
+        # hourly or daily bins, and whole cloudy profiles or only the bins at and above the cloud base removed
+        self.clearBox = QComboBox()
+        self.clearBox.addItems(list(self.CLEAR_SKY_OPTIONS))
+        self.clearBox.setEnabled(False)
+        self.grid.addWidget(self.clearBox, 9, 0, 1, 2)
+
+        # export format, nc4 writes chunked and compressed netCDF4 with time and altitude coordinates
+        self.formatBox = QComboBox()
+        self.formatBox.addItems(['csv', 'nc4'])
+        self.formatBox.setEnabled(False)
+        self.formatBox.currentTextChanged.connect(self.formatChanged)
+        self.grid.addWidget(self.formatBox, 8, 2, 1, 2)
+
+        # Create cancel button, stops the running download or export and the queued ones
+        self.cancelButton = QPushButton("Cancel")
+        self.cancelButton.setEnabled(False)
+        self.cancelButton.clicked.connect(self.jobs.cancel)
+        self.jobs.idle.connect(lambda: self.cancelButton.setEnabled(False))
+        self.grid.addWidget(self.cancelButton, 8, 4)
+
         # Create variable selection button
         self.varSelectButton = QPushButton("Select File Type")
         self.varSelectButton.setEnabled(False)
@@ -180,8 +226,16 @@ class MainWindow(QMainWindow):
 
     # Restart function
     def restart(self):
+        # Stop the running and queued jobs before the window is rebuilt
+        self.jobs.cancel()
+        self.jobs.wait()
         QApplication.exit(MainWindow.EXIT_CODE_REBOOT)
 
+    def submitJob(self, name, fn, finished=None, stopped=None):
+        # Queue a download or export on the worker thread
+        self.cancelButton.setEnabled(True)
+        return self.jobs.submit(name, fn, finished, stopped)
+
     def updateSelection(self, text):
         # Get current text from selectionWindow
         currentText = []
@@ -203,50 +257,59 @@ class MainWindow(QMainWindow):
     def transitExport(self, var):
         self.grid.addWidget(self.exportButton, 6, 3, 1, 2)
         self.exportButton.setEnabled(True)
+        self.formatBox.setEnabled(True)
         self.minavgRadio.setEnabled(True)
         self.minavgRadio.setChecked(True)
         
         if (var != 'cloud_mask'): #doesn't make sense to average the cloud mask data so don't enable averaging buttons if cloud mask is selected
             self.hravgRadio.setEnabled(True)
             self.dayavgRadio.setEnabled(True)
+        if var not in ('cloud_mask', 'cloud_base', 'cloud_top'): #cloud variables can not be cloud screened
+            self.clearavgRadio.setEnabled(True)
+            self.clearBox.setEnabled(True)
+
+    def formatChanged(self, fmt):
+        self.exportButton.setText("Export to ." + fmt)
 
     def exportClicked(self):
-        # Export the selected variable to a .csv file
+        # Export the selected variable to a .csv or .nc4 file
+        # The export is queued, more exports can be selected while it runs
+        fmt = self.formatBox.currentText()
 
         # Get the full path for files of the selected type
-        if self.minavgRadio.isChecked():
-            _, dirs, files = self.vars.prepDownload()
-            fullpathfiles = [x + y for x, y in zip(dirs, files) if  y.find(self.filevars.selectedFileType) > -1]
-
-            variable = self.filevars.selectedFileVars
-            filename = mpt.create_export_name(self.vars, variable)
-
-            mpt.MinuteAvg(filename, fullpathfiles, variable).to_csv(filename, header=True)
+        _, dirs, files = self.vars.prepDownload()
+        fullpathfiles = [x + y for x, y in zip(dirs, files) if  y.find(self.filevars.selectedFileType) > -1]
+        variable = self.filevars.selectedFileVars
 
-            self.selectionWindow.addItem("Exported " + filename)
-            self.exportButton.setEnabled(False)
+        if self.minavgRadio.isChecked():
+            self.exportJob('', mpt.MinuteAvg, fullpathfiles, variable, fmt)
         if self.hravgRadio.isChecked():
-            _, dirs, files = self.vars.prepDownload()
-            fullpathfiles = [x + y for x, y in zip(dirs, files) if  y.find(self.filevars.selectedFileType) > -1]
-
-            variable = self.filevars.selectedFileVars
-            filename = 'HRAVG_' + mpt.create_export_name(self.vars, variable)
-
-            mpt.HrAvg(filename, fullpathfiles, variable).to_csv(filename, header=True)
-
-            self.selectionWindow.addItem("Exported " + filename)
-            self.exportButton.setEnabled(False)
+            self.exportJob('HRAVG_', mpt.HrAvg, fullpathfiles, variable, fmt)
         if self.dayavgRadio.isChecked():
-            _, dirs, files = self.vars.prepDownload()
-            fullpathfiles = [x + y for x, y in zip(dirs, files) if  y.find(self.filevars.selectedFileType) > -1]
-
-            variable = self.filevars.selectedFileVars
-            filename = 'DAYAVG_' + mpt.create_export_name(self.vars, variable)
-
-            mpt.DayAvg(filename, fullpathfiles, variable).to_csv(filename, header=True)
-
-            self.selectionWindow.addItem("Exported " + filename)
-            self.exportButton.setEnabled(False)
+            self.exportJob('DAYAVG_', mpt.DayAvg, fullpathfiles, variable, fmt)
+        if self.clearavgRadio.isChecked():
+            freq, clear_sky, prefix = self.CLEAR_SKY_OPTIONS[self.clearBox.currentText()]
+            average = partial(mpt.ClearSkyAvg, freq=freq, clear_sky=clear_sky)
+            self.exportJob(prefix, average, fullpathfiles, variable, fmt)
+
+    def exportJob(self, prefix, average, fullpathfiles, variable, fmt):
+        # Queue one export, progress is reported as each file is read
+        filename = prefix + mpt.create_export_name(self.vars, variable, fmt)
+        total = len(fullpathfiles)
+
+        def run(job):
+            count = []
+            def progress(file):
+                job.check()
+                count.append(file)
+                job.report('Read {} of {}: {}'.format(len(count), total, file.split('/')[-1]))
+            df = average(filename, fullpathfiles, variable, progress=progress)
+            job.check()
+            job.report('Writing ' + filename)
+            mpt.save_export(df, filename, fullpathfiles, variable)
+            return 'Exported ' + filename
+
+        self.submitJob('Export ' + filename, run)
 
     def downloadClicked(self):
         # Download the selected files
@@ -254,16 +317,19 @@ class MainWindow(QMainWindow):
         # Clear selectionWindow for downloading status
         self.selectionWindow.clear()
 
-        # Build the download urls and update the selectionWindow
-        # TODO: Add a progress bar or update files as completed for better user experience
+        # The selection is fixed now, the files are downloaded concurrently on the worker thread
+        # and the selectionWindow is updated as each completes
         urls, dirs, files = self.vars.prepDownload()
-        for (url, dir, file) in zip(urls, dirs, files):
-            print(url +', '+ dir + file)
-            text = self.vars.download(url, dir, file)
-            self.updateSelection(text)
+
+        def run(job):
+            mpt.download_files(urls, dirs, files, done=job.report, cancelled=job.cancel_event)
+            return 'Download complete'
+
+        self.submitJob('Download', run, self.downloadFinished, lambda _: self.downloadButton.setEnabled(True))
 
         self.downloadButton.setEnabled(False)
 
+    def downloadFinished(self, text):
         # Set the file types from the download for the variable selection
         self.filevars.setFileTypes(self.vars.selectedFileTypes)
 
@@ -274,12 +340,19 @@ class MainWindow(QMainWindow):
         if b.text() == 'Minute Average':
             self.hravgRadio.setChecked(False)
             self.dayavgRadio.setChecked(False)
+            self.clearavgRadio.setChecked(False)
         if b.text() == 'Hourly Average':
             self.minavgRadio.setChecked(False)
             self.dayavgRadio.setChecked(False)
+            self.clearavgRadio.setChecked(False)
         if b.text() == 'Daily Average':
             self.minavgRadio.setChecked(False)
             self.hravgRadio.setChecked(False)
+            self.clearavgRadio.setChecked(False)
+        if b.text() == 'Clear-Sky Average':
+            self.minavgRadio.setChecked(False)
+            self.hravgRadio.setChecked(False)
+            self.dayavgRadio.setChecked(False)
         
 
     def updateVarInfo(self):
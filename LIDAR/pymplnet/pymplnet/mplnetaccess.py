@@ -1,3 +1,4 @@
+import io
 import pickle
 import pyAesCrypt
 import os
@@ -55,22 +56,20 @@ class MPLNetAccess():
         if file == None:
             return False
 
-        # decrypt
+        # decrypt in memory, the unencrypted data never touches the disk
         # with open('mplnet.dat', 'rb') as f:
         with open(file, 'rb') as f:
+            g = io.BytesIO()
             try:
-                with open('mplnet.pkl', 'wb') as g:
-                    pyAesCrypt.decryptStream(f, g, KeyAccess, 64*1024)
+                pyAesCrypt.decryptStream(f, g, KeyAccess, 64*1024)
             except ValueError:
                 print('Decryption failed.')
-                os.remove('mplnet.pkl') 
+                return False
         # unpickle
-        with open('mplnet.pkl', 'rb') as f:
-            data = pickle.load(f)
-        # clean up unencrypted file
-        os.remove('mplnet.pkl')
+        data = pickle.loads(g.getvalue())
         self.__username = data.username
         self.__password = data.password
+        return True
 
     def getUser(self):
         """
@@ -0,0 +1,224 @@
+# mplnetbatch.py
+# Batch reprocessing of MPLNET hourly and daily products over the whole local archive
+# The archive is sharded by variable and month, shards are averaged in a process pool and the
+# results come back through shared memory. Finished shards are checkpointed so a run resumes.
+#
+# python mplnetbatch.py --variables nrb cloud_base --freq h D --format nc4
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory, resource_tracker
+from mplnetdataset import MPLNetDataset
+from mplnetpytools import stream_average, common_grid, save_export
+
+FREQ_PREFIX = {'h': 'HRAVG', 'D': 'DAYAVG'}
+
+def shard_signature(files):
+    """
+    Returns the names, sizes and modification times of the files of a shard,
+    a checkpointed shard is redone when this changes
+    """
+
+    return [[os.path.basename(x), os.path.getsize(x), os.path.getmtime(x)] for x in files]
+
+def build_shards(dataset, variables=None, freqs=('h', 'D'), level=None, start=None, end=None):
+    """
+    Returns the shards of the archive, one per variable, month and averaging frequency
+
+    Args:
+        dataset (MPLNetDataset): The indexed archive
+        variables (list): variable names, None for every variable with a time dimension (default: None)
+        freqs (list): 'h' for hourly and/or 'D' for daily averages (default: ('h', 'D'))
+        level (str): level of the files, None for the highest level of each day (default: None)
+        start (str): first month, ex. '2023-01' (default: None)
+        end (str): last month (default: None)
+
+    Returns:
+        list: dicts with key, variable, month, freq and files, sorted by variable and month
+    """
+
+    if variables is None:
+        variables = sorted({name for record in dataset.files.values()
+                            for name, info in record['variables'].items()
+                            if name != 'time' and 'time' in info['dims']})
+    shards = []
+    for variable in variables:
+        months = {}
+        for path in dataset.paths(variable, level):
+            month = dataset.files[path]['date'][:7]
+            if (start is None or month >= start) and (end is None or month <= end):
+                months.setdefault(month, []).append(path)
+        for month in sorted(months):
+            for freq in freqs:
+                shards.append({'key': '{}/{}/{}'.format(variable, month, freq), 'variable': variable,
+                               'month': month, 'freq': freq, 'files': months[month]})
+    return shards
+
+def run_shard(files, variable, freq, grid):
+    """
+    Averages one shard and places the result in a new shared memory block
+
+    Args:
+        files (list): full paths of the files of the shard
+        variable (str): name of variable
+        freq (str): 'h' for hourly or 'D' for daily averages
+        grid (numpy.ndarray): common altitude grid (km), None if the variable is not a profile
+
+    Returns:
+        dict: shared memory name, shape, index (datetime64[ns] as int64), columns and altitude of
+            the result, None if no file could be read. The caller unlinks the block
+    """
+
+    df = stream_average(files, variable, freq, workers=1, grid=grid)
+    if df.empty:
+        return None
+    values = df.to_numpy(dtype=np.float64)
+    shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    np.ndarray(values.shape, dtype=np.float64, buffer=shm.buf)[...] = values
+    shm.close()
+    altitude = df.attrs.get('altitude')
+    return {'name': shm.name, 'shape': values.shape, 'index': df.index.to_numpy().astype(np.int64),
+            'columns': list(df.columns), 'altitude': None if altitude is None else np.asarray(altitude)}
+
+def receive_shard(result):
+    """
+    Returns the DataFrame of a shard from shared memory and releases the block
+    """
+
+    shm = shared_memory.SharedMemory(name=result['name'])
+    try:
+        values = np.ndarray(result['shape'], dtype=np.float64, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+    df = pd.DataFrame(values, index=pd.DatetimeIndex(result['index'].astype('datetime64[ns]'), name='time'),
+                      columns=result['columns'])
+    if result['altitude'] is not None:
+        df.attrs['altitude'] = result['altitude']
+    return df
+
+class Checkpoint():
+    """
+    Record of the finished shards of a batch run, kept in a json file next to the outputs
+
+    Attributes:
+        path (str): The json file
+        done (dict): shard key -> {'output': file written, 'signature': see shard_signature}
+
+    Methods:
+        finished(shard): True if the shard was written from the same files
+        record(shard, output): Marks a shard finished and saves the checkpoint
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.done = json.load(f)
+
+    def finished(self, shard):
+        entry = self.done.get(shard['key'])
+        return (entry is not None and os.path.exists(entry['output'])
+                and entry['signature'] == shard_signature(shard['files']))
+
+    def record(self, shard, output):
+        self.done[shard['key']] = {'output': output, 'signature': shard_signature(shard['files'])}
+        temp = self.path + '.part'
+        with open(temp, 'w') as f:
+            json.dump(self.done, f)
+        os.replace(temp, self.path)
+
+def output_name(out_dir, shard, fmt):
+    """
+    Returns the output file of a shard, ex. out/nrb/HRAVG_NRB_2023-01.nc4
+    """
+
+    name = '{}_{}_{}.{}'.format(FREQ_PREFIX[shard['freq']], shard['variable'].upper(), shard['month'], fmt)
+    return os.path.join(out_dir, shard['variable'], name)
+
+def reprocess(data_path='../data/', out_dir='../products/', variables=None, freqs=('h', 'D'), level=None,
+              start=None, end=None, fmt='nc4', workers=4, restart=False):
+    """
+    Averages every shard of the archive not yet checkpointed
+
+    Args:
+        data_path (str): directory of the MPLNET files (default: '../data/')
+        out_dir (str): directory the products and the checkpoint are written to (default: '../products/')
+        variables, freqs, level, start, end: see build_shards
+        fmt (str): 'nc4' or 'csv' (default: 'nc4')
+        workers (int): number of shards averaged at once (default: 4)
+        restart (bool): ignore the checkpoint and redo every shard (default: False)
+
+    Returns:
+        dict: number of shards 'done', 'skipped' from the checkpoint and 'failed'
+    """
+
+    dataset = MPLNetDataset(data_path)
+    shards = build_shards(dataset, variables, freqs, level, start, end)
+    checkpoint = Checkpoint(os.path.join(out_dir, 'mplnet_batch_checkpoint.json'))
+    os.makedirs(out_dir, exist_ok=True)
+    todo = [s for s in shards if restart or not checkpoint.finished(s)]
+    counts = {'done': 0, 'skipped': len(shards) - len(todo), 'failed': 0}
+    print('{} shards, {} already done'.format(len(shards), counts['skipped']))
+
+    # every month of a variable is regridded onto the same altitudes
+    grids = {v: common_grid(dataset.paths(v, level), v) for v in sorted({s['variable'] for s in todo})}
+
+    # workers share this process's resource tracker, so blocks they create and this process unlinks are not reported as leaked
+    resource_tracker.ensure_running()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_shard, s['files'], s['variable'], s['freq'], grids[s['variable']]): s for s in todo}
+        try:
+            for future in as_completed(futures):
+                shard = futures[future]
+                try:
+                    result = future.result()
+                    if result is None:
+                        raise ValueError('no readable files')
+                    df = receive_shard(result)
+                    output = output_name(out_dir, shard, fmt)
+                    os.makedirs(os.path.dirname(output), exist_ok=True)
+                    # written under a temporary name so an interrupted write is never checkpointed
+                    temp = output + '.part.' + fmt
+                    save_export(df, temp, shard['files'], shard['variable'])
+                    os.replace(temp, output)
+                    checkpoint.record(shard, output)
+                    counts['done'] += 1
+                    print('[{}/{}] {} -> {}'.format(counts['done'] + counts['failed'], len(todo), shard['key'], output))
+                except Exception as e:
+                    counts['failed'] += 1
+                    print(e)
+                    print('Error processing shard: {}'.format(shard['key']))
+        except KeyboardInterrupt:
+            # finished shards are already checkpointed, the next run resumes from here
+            pool.shutdown(cancel_futures=True)
+            raise
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rebuild MPLNET hourly and daily products for the whole archive')
+    parser.add_argument('--data', default='../data/', help='directory of the MPLNET files (default: ../data/)')
+    parser.add_argument('--out', default='../products/', help='output directory (default: ../products/)')
+    parser.add_argument('--variables', nargs='+', default=None, help='variables to average (default: every time variable)')
+    parser.add_argument('--freq', nargs='+', default=['h', 'D'], choices=['h', 'D'], help='h hourly, D daily (default: both)')
+    parser.add_argument('--level', default=None, help='file level, ex. L15 (default: highest available each day)')
+    parser.add_argument('--start', default=None, help='first month, ex. 2023-01')
+    parser.add_argument('--end', default=None, help='last month, ex. 2023-12')
+    parser.add_argument('--format', default='nc4', choices=['nc4', 'csv'], help='output format (default: nc4)')
+    parser.add_argument('--workers', type=int, default=4, help='shards averaged at once (default: 4)')
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and redo every shard')
+    args = parser.parse_args(argv)
+
+    counts = reprocess(args.data, args.out, args.variables, args.freq, args.level, args.start, args.end,
+                       args.format, args.workers, args.restart)
+    print('{done} shards written, {skipped} skipped, {failed} failed'.format(**counts))
+    return 1 if counts['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
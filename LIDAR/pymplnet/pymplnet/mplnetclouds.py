@@ -0,0 +1,158 @@
+# mplnetclouds.py
+# Cloud events from the MPLNET cloud_base/cloud_top retrievals
+# The minute cloud presence series of the whole archive is run-length encoded with numpy
+# to give a table of cloud events and hourly or daily cloud fraction and event counts
+
+import os
+import glob
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from mplnetpytools import read_variable
+
+def read_cloud_file(file):
+    """
+    Returns the cloud presence, lowest base and highest top of every minute in one CLD file
+
+    Args:
+        file (str): full path of the CLD file
+
+    Returns:
+        times (numpy.ndarray): datetime64[s] times
+        base (numpy.ndarray): lowest cloud base (km) of each minute, nan when clear
+        top (numpy.ndarray): highest cloud top (km) of each minute, nan when clear
+    """
+
+    times, base = read_variable(file, 'cloud_base')
+    _, top = read_variable(file, 'cloud_top')
+    present = (~np.isnan(base)).any(axis=1)
+    base = np.where(present, np.nanmin(np.where(np.isnan(base), np.inf, base), axis=1), np.nan)
+    top = np.where((~np.isnan(top)).any(axis=1), np.nanmax(np.where(np.isnan(top), -np.inf, top), axis=1), np.nan)
+    return times, base, top
+
+def cloud_series(files, workers=4):
+    """
+    Returns the minute cloud series of many CLD files, sorted by time with duplicates removed
+
+    Args:
+        files (list): list of full CLD file paths
+        workers (int): number of files read at once, 1 reads in this process (default: 4)
+
+    Returns:
+        times, base, top (numpy.ndarray): see read_cloud_file, present where base is not nan
+    """
+
+    files = [x for x in files if os.path.isfile(x)]
+    if workers == 1 or len(files) <= 1:
+        parts = list(map(read_cloud_file, files))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(read_cloud_file, files))
+    if not parts:
+        return np.array([], dtype='datetime64[s]'), np.array([]), np.array([])
+    times = np.concatenate([p[0] for p in parts])
+    base = np.concatenate([p[1] for p in parts])
+    top = np.concatenate([p[2] for p in parts])
+    times, first = np.unique(times, return_index=True)
+    return times, base[first], top[first]
+
+def cloud_events(times, base, top, max_gap=np.timedelta64(2, 'm')):
+    """
+    Returns the table of cloud events, runs of consecutive cloudy minutes
+    A run is broken by a clear minute or by a gap in the data longer than max_gap
+
+    Args:
+        times (numpy.ndarray): datetime64 times, sorted
+        base (numpy.ndarray): lowest cloud base of each minute, nan when clear
+        top (numpy.ndarray): highest cloud top of each minute, nan when clear
+        max_gap (numpy.timedelta64): longest time between minutes of one event (default: 2 minutes)
+
+    Returns:
+        Pandas DataFrame with start, end, duration, minutes, mean_base, min_base and max_top of each event
+    """
+
+    times = np.asarray(times, dtype='datetime64[s]')
+    present = ~np.isnan(base)
+    columns = ['start', 'end', 'duration', 'minutes', 'mean_base', 'min_base', 'max_top']
+    if not present.any():
+        return pd.DataFrame(columns=columns)
+
+    # an event starts at a cloudy minute after a clear minute or a gap, and ends likewise
+    gap = np.diff(times) > max_gap
+    before = np.concatenate(([False], present[:-1] & ~gap))
+    after = np.concatenate((present[1:] & ~gap, [False]))
+    starts = np.flatnonzero(present & ~before)
+    ends = np.flatnonzero(present & ~after)
+
+    # events are contiguous among the cloudy minutes, so reduceat over them covers each event exactly
+    cloudy = np.flatnonzero(present)
+    at = np.searchsorted(cloudy, starts)
+    minutes = np.diff(np.append(at, len(cloudy)))
+    b, t = base[cloudy], top[cloudy]
+    step = np.median(np.diff(times)) if len(times) > 1 else np.timedelta64(60, 's')
+    return pd.DataFrame({'start': times[starts].astype('datetime64[ns]'),
+                         'end': times[ends].astype('datetime64[ns]'),
+                         'duration': (times[ends] - times[starts] + step).astype('timedelta64[ns]'),
+                         'minutes': minutes,
+                         'mean_base': np.add.reduceat(b, at) / minutes,
+                         'min_base': np.fmin.reduceat(b, at),
+                         'max_top': np.fmax.reduceat(t, at)}, columns=columns)
+
+def cloud_fraction(times, base, events=None, freq='h'):
+    """
+    Returns the cloud fraction and number of cloud events starting in every time bin
+
+    Args:
+        times (numpy.ndarray): datetime64 times
+        base (numpy.ndarray): lowest cloud base of each minute, nan when clear
+        events (Pandas DataFrame): events from cloud_events (default: None, computed here)
+        freq (str): 'h' for hourly or 'D' for daily bins (default: 'h')
+
+    Returns:
+        Pandas DataFrame indexed by time with cloud_fraction, minutes and events columns
+    """
+
+    times = np.asarray(times, dtype='datetime64[s]')
+    if events is None:
+        events = cloud_events(times, base, np.full(len(base), np.nan))
+    if len(times) == 0:
+        return pd.DataFrame(columns=['cloud_fraction', 'minutes', 'events'])
+    step = np.timedelta64(1, freq).astype('timedelta64[s]')
+    first = times.min().astype('datetime64[' + freq + ']').astype('datetime64[s]')
+    bins = ((times - first) // step).astype(np.int64)
+    n = int(bins.max()) + 1
+    minutes = np.bincount(bins, minlength=n)
+    cloudy = np.bincount(bins, weights=~np.isnan(base), minlength=n)
+    start_bins = ((events['start'].to_numpy().astype('datetime64[s]') - first) // step).astype(np.int64)
+    counts = np.bincount(start_bins, minlength=n)[:n]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(minutes > 0, cloudy / minutes, np.nan)
+    index = pd.DatetimeIndex((first + np.arange(n) * step).astype('datetime64[ns]'), name='time')
+    return pd.DataFrame({'cloud_fraction': fraction, 'minutes': minutes, 'events': counts}, index=index)
+
+def cloud_climatology(files, workers=4, max_gap=np.timedelta64(2, 'm')):
+    """
+    Returns the cloud events and the hourly and daily cloud fraction of many CLD files
+
+    Args:
+        files (list): list of full CLD file paths
+        workers (int): number of files read at once (default: 4)
+        max_gap (numpy.timedelta64): longest time between minutes of one event (default: 2 minutes)
+
+    Returns:
+        events (Pandas DataFrame): see cloud_events
+        hourly (Pandas DataFrame): see cloud_fraction
+        daily (Pandas DataFrame): see cloud_fraction
+    """
+
+    times, base, top = cloud_series(files, workers)
+    events = cloud_events(times, base, top, max_gap)
+    return events, cloud_fraction(times, base, events, 'h'), cloud_fraction(times, base, events, 'D')
+
+if __name__ == '__main__':
+    files = sorted(glob.glob(os.path.join('..', 'data', '**', 'MPLNET_V3_*_CLD_*.nc4'), recursive=True))
+    events, hourly, daily = cloud_climatology(files)
+    print(str(len(events)) + ' cloud events in ' + str(len(files)) + ' files')
+    events.to_csv('CLOUD_EVENTS.csv', index=False)
+    hourly.to_csv('HRAVG_CLOUD_FRACTION.csv')
+    daily.to_csv('DAYAVG_CLOUD_FRACTION.csv')
@@ -0,0 +1,385 @@
+# mplnetdataset.py
+# Lazy virtual dataset over a directory tree of daily MPLNET nc4 files
+# The files are indexed once (time coverage, variables, shapes) and selections by variable,
+# time range and altitude range read only the hyperslabs they need through an LRU chunk cache
+
+import os
+import json
+import numpy as np
+import pandas as pd
+import netCDF4 as nc
+from collections import OrderedDict
+from mplnetmanifest import FILE_PATTERN
+from mplnetpytools import variable_layout, julian_to_datetime, regrid, same_grid, altitude_labels
+
+def datetime_to_julian(t):
+    """
+    Converts datetimes to julian days, the time unit of the MPLNET files
+
+    Args:
+        t (str, datetime or numpy.datetime64): The time to convert
+
+    Returns:
+        float: julian days
+    """
+
+    seconds = (np.datetime64(pd.Timestamp(t), 'ns') - np.datetime64('1970-01-01', 'ns')) / np.timedelta64(1, 's')
+    return seconds / 86400 + 2440587.5
+
+class ChunkCache():
+    """
+    Least recently used cache of arrays read from files
+
+    Attributes:
+        max_bytes (int): Total size of the arrays kept before the least recently used are dropped
+        nbytes (int): Total size of the arrays held
+        hits (int): Number of lookups answered from the cache
+        misses (int): Number of lookups that had to be read
+
+    Methods:
+        get(key, load): Returns the cached array for key, calling load() on a miss
+        clear(): Drops every cached array
+    """
+
+    def __init__(self, max_bytes=256 * 1024**2):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def get(self, key, load):
+        if key in self._items:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key]
+        self.misses += 1
+        value = load()
+        self._items[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes and len(self._items) > 1:
+            _, old = self._items.popitem(last=False)
+            self.nbytes -= old.nbytes
+        return value
+
+    def clear(self):
+        self._items.clear()
+        self.nbytes = 0
+
+class MPLNetDataset():
+    """
+    Virtual dataset over every MPLNET_V3 file below a directory
+
+    Attributes:
+        root (str): The directory searched for files
+        index_path (str): The json file the index is kept in between sessions
+        files (dict): path -> level, fileType, date, first and last time (julian days),
+            number of times, altitude dimension and the dims, shape and dtype of each variable
+        cache (ChunkCache): Recently read hyperslabs
+
+    Methods:
+        index(): Adds new or changed files to the index and drops deleted ones
+        variables(level, fileType): The variable names available
+        paths(variable, level): The files holding a variable, one per date
+        altitude(variable, level): The altitudes (km) of a variable
+        file_altitude(path): The altitudes (km) of one file
+        select(variable, start, end, alt_min, alt_max, level, grid): Lazy selection of a variable
+    """
+
+    def __init__(self, root='../data/', index_path=None, cache_bytes=256 * 1024**2):
+        self.root = os.path.abspath(root)
+        self.index_path = index_path if index_path is not None else os.path.join(self.root, 'mplnet_dataset_index.json')
+        self.files = {}
+        self.cache = ChunkCache(cache_bytes)
+        self.index()
+
+    def _index_file(self, path):
+        match = FILE_PATTERN.match(os.path.basename(path))
+        with nc.Dataset(path, 'r') as f:
+            time = np.ma.filled(f.variables['time'][:].astype(float), np.nan) if 'time' in f.variables else np.array([])
+            altitude_dim = f.variables['altitude'].dimensions[0] if 'altitude' in f.variables else None
+            variables = {name: {'dims': list(var.dimensions), 'shape': list(var.shape), 'dtype': str(var.dtype)}
+                         for name, var in f.variables.items()}
+        return {'level': match.group(1), 'fileType': match.group(2),
+                'date': match.group(3) + '-' + match.group(4) + '-' + match.group(5),
+                'start': float(np.nanmin(time)) if len(time) else None,
+                'end': float(np.nanmax(time)) if len(time) else None,
+                'ntime': int(len(time)), 'altitude_dim': altitude_dim, 'variables': variables,
+                'mtime': os.path.getmtime(path), 'size': os.path.getsize(path)}
+
+    def index(self):
+        """
+        Indexes the files below root, files already in the saved index are only
+        opened again if their size or modification time changed
+
+        Args:
+            None
+
+        Returns:
+            int: Number of files opened
+        """
+
+        saved = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                saved = json.load(f)
+
+        self.files = {}
+        opened = 0
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                if not FILE_PATTERN.match(name):
+                    continue
+                path = os.path.join(folder, name)
+                old = saved.get(path)
+                if old is not None and old['mtime'] == os.path.getmtime(path) and old['size'] == os.path.getsize(path):
+                    self.files[path] = old
+                    continue
+                try:
+                    self.files[path] = self._index_file(path)
+                    opened += 1
+                except (OSError, KeyError) as e:
+                    print(e)
+                    print('Error indexing file: {}'.format(path))
+
+        if opened or len(self.files) != len(saved):
+            temp = self.index_path + '.part'
+            with open(temp, 'w') as f:
+                json.dump(self.files, f)
+            os.replace(temp, self.index_path)
+        return opened
+
+    def variables(self, level=None, fileType=None):
+        """
+        Returns the variable names available
+
+        Args:
+            level (str): Only files of this level, ex. 'L15' (default: None)
+            fileType (str): Only files of this type, ex. 'NRB' (default: None)
+
+        Returns:
+            list: Sorted variable names
+        """
+
+        names = set()
+        for record in self.files.values():
+            if (level is None or record['level'] == level) and (fileType is None or record['fileType'] == fileType):
+                names.update(record['variables'])
+        return sorted(names)
+
+    def paths(self, variable, level=None):
+        """
+        Returns the files holding a variable, one file per date
+
+        Args:
+            variable (str): name of variable
+            level (str): level of the files (default: None, highest available for each date)
+
+        Returns:
+            list: paths sorted by date
+        """
+
+        rank = lambda record: int(record['level'][1:].ljust(2, '0'))
+        best = {}
+        for path, record in self.files.items():
+            if variable not in record['variables'] or (level is not None and record['level'] != level):
+                continue
+            date = record['date']
+            if date not in best or rank(record) > rank(self.files[best[date]]):
+                best[date] = path
+        return [best[date] for date in sorted(best)]
+
+    def altitude(self, variable, level=None):
+        """
+        Returns the altitudes (km) of the files holding a variable, read from the first file
+
+        Args:
+            variable (str): name of variable
+            level (str): level of the files (default: None, highest available)
+
+        Returns:
+            numpy.ndarray: altitudes in km, empty if the files have no altitude
+        """
+
+        files = self.paths(variable, level)
+        if not files:
+            return np.array([])
+        return self.file_altitude(files[0])
+
+    def file_altitude(self, path):
+        """
+        Returns the altitudes (km) of one file (cached), empty if the file has no altitude
+        """
+
+        if self.files[path]['altitude_dim'] is None:
+            return np.array([])
+        return self.cache.get((path, 'altitude'), lambda: self._read(path, 'altitude', (slice(None),)))
+
+    def _read(self, path, variable, key):
+        with nc.Dataset(path, 'r') as f:
+            data = f.variables[variable][key]
+        return np.ma.filled(np.ma.asarray(data, dtype=float), np.nan)
+
+    def times(self, path):
+        """
+        Returns the times of one file in julian days (cached)
+        """
+
+        return self.cache.get((path, 'time'), lambda: self._read(path, 'time', (slice(None),)))
+
+    def select(self, variable, start=None, end=None, alt_min=None, alt_max=None, level=None, grid=None):
+        """
+        Returns a lazy selection of a variable, nothing is read until it is iterated or loaded
+        Profiles of files on another altitude grid are regridded onto the grid of the selection
+
+        Args:
+            variable (str): name of variable
+            start (str/datetime): first time to include (default: None, beginning of the record)
+            end (str/datetime): time to stop before (default: None, end of the record)
+            alt_min (float): lowest altitude in km (default: None)
+            alt_max (float): highest altitude in km (default: None)
+            level (str): level of the files (default: None, highest available for each day)
+            grid (numpy.ndarray): altitude grid (km) of the selection (default: None, the first file's altitude)
+
+        Returns:
+            Selection
+        """
+
+        files = self.paths(variable, level)
+        if not files:
+            raise KeyError('No files hold the variable {}'.format(variable))
+        jd0 = datetime_to_julian(start) if start is not None else -np.inf
+        jd1 = datetime_to_julian(end) if end is not None else np.inf
+        files = [p for p in files if self.files[p]['start'] is None
+                 or (self.files[p]['end'] >= jd0 and self.files[p]['start'] < jd1)]
+        altitude = np.asarray(grid, dtype=float) if grid is not None else self.altitude(variable, level)
+        dims = self.files[files[0]]['variables'][variable]['dims'] if files else []
+        if len(altitude) and self.files[files[0]]['altitude_dim'] in dims:
+            lo = alt_min if alt_min is not None else -np.inf
+            hi = alt_max if alt_max is not None else np.inf
+            altitude = altitude[(altitude >= lo) & (altitude <= hi)]
+        return Selection(self, variable, files, jd0, jd1, alt_min, alt_max, altitude)
+
+class Selection():
+    """
+    Lazy selection of one variable over time and altitude ranges of a MPLNetDataset
+
+    Attributes:
+        dataset (MPLNetDataset): The dataset the selection reads from
+        variable (str): name of variable
+        files (list): paths of the files overlapping the time range
+        altitude (numpy.ndarray): altitudes (km) of the selected bins
+
+    Methods:
+        chunks(): Yields the times and values of the selection one file at a time
+        load(): Returns the whole selection as a DataFrame
+    """
+
+    def __init__(self, dataset, variable, files, jd0, jd1, alt_min, alt_max, altitude):
+        self.dataset = dataset
+        self.variable = variable
+        self.files = files
+        self.altitude = altitude
+        self._jd0, self._jd1 = jd0, jd1
+        self._alt_min, self._alt_max = alt_min, alt_max
+
+    def __iter__(self):
+        return self.chunks()
+
+    def _hyperslab(self, path):
+        # index of the selected times and altitudes, wavelength removed
+        record = self.dataset.files[path]
+        info = record['variables'][self.variable]
+        time = self.dataset.times(path) if 'time' in info['dims'] else None
+        t0, t1 = 0, 0
+        if time is not None:
+            t0 = int(np.searchsorted(time, self._jd0, side='left'))
+            t1 = int(np.searchsorted(time, self._jd1, side='left'))
+        # the altitude range is found on each file's own altitudes,
+        # on another grid the bins just outside it are kept for regridding
+        altitude = self.dataset.file_altitude(path) if record['altitude_dim'] in info['dims'] else np.array([])
+        a0, a1 = 0, len(altitude)
+        if len(altitude):
+            if self._alt_min is not None:
+                a0 = int(np.searchsorted(altitude, self._alt_min, side='left'))
+            if self._alt_max is not None:
+                a1 = int(np.searchsorted(altitude, self._alt_max, side='right'))
+            if not same_grid(altitude[a0:a1], self.altitude):
+                a0, a1 = max(a0 - 1, 0), min(a1 + 1, len(altitude))
+        key = []
+        for dim, n in zip(info['dims'], info['shape']):
+            if dim == 'wavelength' and len(info['dims']) > 1:
+                key.append(0)
+            elif dim == 'time':
+                key.append(slice(t0, t1))
+            elif dim == record['altitude_dim']:
+                key.append(slice(a0, a1))
+            else:
+                key.append(slice(None))
+        return tuple(key), time, (t0, t1), altitude[a0:a1]
+
+    def chunks(self):
+        """
+        Yields the selection one file at a time, reading only the selected hyperslab
+
+        Args:
+            None
+
+        Returns:
+            generator of (times, values): times as datetime64[s] (None if the variable has no time
+                dimension) and values with shape (times, columns)
+        """
+
+        for path in self.files:
+            key, time, (t0, t1), altitude = self._hyperslab(path)
+            if time is not None and t1 <= t0:
+                continue
+            # slices are not hashable, the cache key uses their bounds
+            bounds = tuple((k.start, k.stop) if isinstance(k, slice) else k for k in key)
+            values = self.dataset.cache.get((path, self.variable, bounds),
+                                            lambda: self._read(path, key))
+            if len(altitude) and not same_grid(altitude, self.altitude):
+                values = regrid(values, altitude, self.altitude)
+            yield (julian_to_datetime(time[t0:t1]) if time is not None else None), values
+
+    def _read(self, path, key):
+        with nc.Dataset(path, 'r') as f:
+            var = f.variables[self.variable]
+            _, dims = variable_layout(var)
+            data = np.ma.filled(np.ma.asarray(var[key], dtype=float), np.nan)
+        if len(dims) > 1 and dims[1] == 'time':
+            data = data.T
+        return data.reshape(data.shape[0], -1) if data.ndim else data.reshape(1, 1)
+
+    def load(self):
+        """
+        Returns the whole selection as a DataFrame
+        Columns are named by altitude ('1.155 km') for profile variables,
+        after the variable for a single column and by position otherwise
+
+        Args:
+            None
+
+        Returns:
+            Pandas DataFrame indexed by time
+        """
+
+        chunks = list(self.chunks())
+        if not chunks:
+            return pd.DataFrame()
+        values = np.concatenate([v for _, v in chunks])
+        times = [t for t, _ in chunks]
+        index = pd.DatetimeIndex(np.concatenate(times).astype('datetime64[ns]'), name='time') if times[0] is not None else None
+        columns = values.shape[1]
+        if columns == 1:
+            column_names = [self.variable]
+        elif columns == len(self.altitude):
+            column_names = altitude_labels(self.altitude)
+        else:
+            column_names = [str(x) for x in range(columns)]
+        return pd.DataFrame(values, index=index, columns=column_names)
+
+if __name__ == '__main__':
+    dataset = MPLNetDataset()
+    print(str(len(dataset.files)) + ' files indexed')
+    print(dataset.variables())
@@ -0,0 +1,215 @@
+# mplnetdownload.py
+# Pooled, concurrent downloader for MPLNET data files
+# Credentials are decrypted once per process and every request goes through one pooled session
+
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+_lock = threading.Lock()
+_credentials = None
+_session = None
+
+def get_credentials():
+    """
+    Returns the MPLNET username and password, decrypting mplnet.dat
+    only the first time it is called in this process
+
+    Args:
+        None
+
+    Returns:
+        tuple: (username, password)
+
+    Raises:
+        PermissionError: mplnet.dat is missing, can not be decrypted or holds no credentials,
+            nothing is cached so the next call tries again
+    """
+
+    global _credentials
+    with _lock:
+        if _credentials is None:
+            # imported here so modules that only read local files do not need pyAesCrypt
+            from mplnetaccess import MPLNetAccess
+            key = MPLNetAccess()
+            if not key.getAccess() or not key.getUser() or not key.getPass():
+                raise PermissionError('MPLNET credentials could not be read from mplnet.dat')
+            _credentials = (key.getUser(), key.getPass())
+        return _credentials
+
+def get_session(pool_size=8):
+    """
+    Returns the process wide authenticated requests session.
+    Connections are pooled and reused across downloads
+
+    Args:
+        pool_size (int): Maximum number of pooled connections per host (default: 8)
+
+    Returns:
+        requests.Session: The shared session
+    """
+
+    global _session
+    if _session is None:
+        auth = get_credentials()
+        with _lock:
+            if _session is None:
+                s = requests.Session()
+                s.auth = auth
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                s.mount('https://', adapter)
+                s.mount('http://', adapter)
+                _session = s
+    return _session
+
+class DownloadCancelled(Exception):
+    """
+    Raised inside a download when the manager is cancelled
+    """
+
+class DownloadManager():
+    """
+    Downloads files concurrently over one pooled session
+
+    Files that already exist are skipped before any request is made.
+    Data is written to a .part file that is renamed into place once complete,
+    and an interrupted .part file is resumed with an HTTP Range request.
+    Setting cancelled stops the downloads between chunks, their .part files are kept for resuming.
+
+    Attributes:
+        session (requests.Session): Session used for every request
+        workers (int): Number of concurrent downloads
+        retries (int): Attempts per file after the first failure
+        backoff (float): Seconds to wait before the first retry, doubled each retry
+        chunk_size (int): Bytes written per chunk
+        timeout (float): Seconds to wait for the server to respond
+        progress (callable): Called as progress(path, bytes_done, bytes_total) while downloading,
+            bytes_total is None if the server does not report a size
+        cancelled (threading.Event): Set to stop the downloads
+
+    Methods:
+        download(url, path): Downloads one file and returns its status
+        download_many(jobs, done): Downloads a list of (url, path) concurrently
+    """
+
+    def __init__(self, session=None, workers=4, retries=3, backoff=1.0, chunk_size=64 * 1024,
+                 timeout=60, progress=None, cancelled=None):
+        self.session = session if session is not None else get_session(max(workers, 1))
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.progress = progress
+        self.cancelled = cancelled if cancelled is not None else threading.Event()
+
+    def _remote_size(self, url, response):
+        # size of the file on the server from a 416 Content-Range ('bytes */1234') or a HEAD request
+        content_range = response.headers.get('Content-Range', '')
+        if content_range.startswith('bytes */'):
+            try:
+                return int(content_range[len('bytes */'):])
+            except ValueError:
+                pass
+        head = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+        length = head.headers.get('Content-Length')
+        return int(length) if head.ok and length is not None else None
+
+    def _fetch(self, url, path, part):
+        # one attempt, resumes from the end of an existing .part file
+        done = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {'Range': 'bytes=%d-' % done} if done else {}
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 416:
+                # the range starts at or past the end, the .part file is only complete if it has the server's size
+                if self._remote_size(url, response) == done:
+                    return
+                # stale or oversized, start over on the next attempt
+                os.remove(part)
+                raise requests.exceptions.RequestException('%s: .part file of %d bytes does not match the server' % (url, done))
+            if response.status_code == 404:
+                raise FileNotFoundError(url)
+            response.raise_for_status()
+            if response.status_code != 206:
+                # server ignored the range, start over
+                done = 0
+            length = response.headers.get('Content-Length')
+            total = done + int(length) if length is not None else None
+            with open(part, 'ab' if done else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if self.cancelled.is_set():
+                        raise DownloadCancelled(url)
+                    if chunk:
+                        f.write(chunk)
+                        done += len(chunk)
+                        if self.progress is not None:
+                            self.progress(path, done, total)
+        if total is not None and done < total:
+            raise requests.exceptions.ChunkedEncodingError('Connection closed at %d of %d bytes' % (done, total))
+
+    def download(self, url, path):
+        """
+        Downloads one file, retrying with exponential backoff
+
+        Args:
+            url (str): The url of the file
+            path (str): The full path and name of the file to be saved
+
+        Returns:
+            str: 'exists', 'downloaded', 'missing' (404 on the server), 'failed' or 'cancelled'
+        """
+
+        if os.path.exists(path):
+            return 'exists'
+        if self.cancelled.is_set():
+            return 'cancelled'
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        part = path + '.part'
+        for attempt in range(self.retries + 1):
+            try:
+                self._fetch(url, path, part)
+                os.replace(part, path)
+                return 'downloaded'
+            except FileNotFoundError:
+                return 'missing'
+            except DownloadCancelled:
+                return 'cancelled'
+            except (requests.exceptions.RequestException, OSError):
+                if attempt == self.retries or self.cancelled.is_set():
+                    return 'failed'
+                self.cancelled.wait(self.backoff * 2 ** attempt)
+        return 'failed'
+
+    def download_many(self, jobs, done=None):
+        """
+        Downloads files concurrently
+
+        Args:
+            jobs (list): (url, path) pairs
+            done (callable): Called as done(path, status) as each file finishes (default: None)
+
+        Returns:
+            dict: Status of each path, see download
+        """
+
+        jobs = list(jobs)
+        status = {}
+        # existing files never reach the pool
+        for url, path in jobs:
+            if os.path.exists(path):
+                status[path] = 'exists'
+                if done is not None:
+                    done(path, 'exists')
+        todo = [(url, path) for url, path in jobs if path not in status]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.download, url, path): path for url, path in todo}
+            for future in as_completed(futures):
+                path = futures[future]
+                status[path] = future.result()
+                if done is not None:
+                    done(path, status[path])
+        return status
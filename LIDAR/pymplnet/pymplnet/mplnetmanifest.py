@@ -0,0 +1,211 @@
+# mplnetmanifest.py
+# Local manifest of the files available on the MPLNET server
+# The server tree (year/month/day -> files and sizes) is cached to disk and refreshed
+# incrementally so selections and downloads only ever use files that exist
+
+import os
+import re
+import json
+import time
+import bs4
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from mplnetdownload import get_session
+from mplnetpytools import parse_year, parse_month, parse_day
+
+MPLNET_URL = 'https://mplnet.gsfc.nasa.gov/out/data/V3_partners/Appalachian_State/'
+
+# MPLNET_V3_L15_NRB_20230105_MPL44201_Appalachian_State.nc4
+FILE_PATTERN = re.compile(r'MPLNET_V3_(L\d+)_([A-Z]+)_(\d{4})(\d{2})(\d{2})_.+\.nc4')
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024**2, 'G': 1024**3}
+
+def parse_file_sizes(html):
+    """
+    Returns the files and their sizes from a day directory listing
+
+    Args:
+        html (str): The html for the mplnet day directory
+
+    Returns:
+        dict: File name -> size in bytes, None when the listing shows no size
+    """
+
+    soup = bs4.BeautifulSoup(html, 'html.parser')
+    files = {}
+    for a in soup.find_all('a', {'href': FILE_PATTERN}):
+        # size follows the link, either in the same table row or as trailing text
+        row = a.find_parent('tr')
+        text = row.get_text(' ') if row is not None else str(a.next_sibling or '')
+        text = text.replace(a.text, '')
+        size = re.search(r'(\d+(?:\.\d+)?)\s*([KMG]?)\s*$', text.strip())
+        files[a.text] = int(float(size.group(1)) * SIZE_UNITS[size.group(2)]) if size else None
+    return files
+
+class Manifest():
+    """
+    Cached tree of the files available on the MPLNET server
+
+    Attributes:
+        path (str): The json file the manifest is stored in
+        url (str): The url of the site directory on the server
+        tree (dict): year -> month -> day -> {file name: size in bytes}
+        refreshed (float): Time of the last refresh in seconds since the epoch
+
+    Methods:
+        load(): Reads the manifest from path
+        save(): Writes the manifest to path
+        refresh(workers): Adds new months from the server, returns the months read
+        entries(years, months, days, fileTypes, levels): The files matching a selection
+        options(field, ...): The values of one field available for a selection
+    """
+
+    def __init__(self, path='../data/mplnet_manifest.json', url=MPLNET_URL, session=None):
+        self.path = os.path.abspath(path)
+        self.url = url
+        self.session = session
+        self.tree = {}
+        self.refreshed = None
+        self.load()
+
+    def _get(self, url):
+        session = self.session if self.session is not None else get_session()
+        response = session.get(url, timeout=60)
+        response.raise_for_status()
+        return response.text
+
+    def load(self):
+        """
+        Reads the manifest from path, an empty manifest if the file does not exist
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get('url') == self.url:
+                self.tree = data['tree']
+                self.refreshed = data['refreshed']
+
+    def save(self):
+        """
+        Writes the manifest to path, replacing the old file in one step
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp = self.path + '.part'
+        with open(temp, 'w') as f:
+            json.dump({'url': self.url, 'refreshed': self.refreshed, 'tree': self.tree}, f)
+        os.replace(temp, self.path)
+
+    def _read_month(self, year, month):
+        base = self.url + 'Y' + year + '/M' + month + '/'
+        days = parse_day(self._get(base))
+        return {day: parse_file_sizes(self._get(base + 'D' + day + '/')) for day in days}
+
+    def refresh(self, workers=8):
+        """
+        Reads months from the server that are not in the manifest yet.
+        The latest cached month is read again as it may still be filling in.
+        If the server can not be reached the cached manifest is kept.
+
+        Args:
+            workers (int): Number of months read concurrently (default: 8)
+
+        Returns:
+            list: (year, month) read from the server
+        """
+
+        known = sorted((y, m) for y in self.tree for m in self.tree[y])
+        latest = known[-1] if known else None
+        try:
+            years = parse_year(self._get(self.url))
+            todo = []
+            for year in years:
+                # years before the latest cached month can not have new months
+                if latest is not None and year < latest[0]:
+                    continue
+                months = parse_month(self._get(self.url + 'Y' + year + '/'))
+                todo += [(year, m) for m in months if (year, m) not in known or (year, m) == latest]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                trees = list(pool.map(lambda ym: self._read_month(*ym), todo))
+        except requests.exceptions.RequestException as e:
+            print('Manifest refresh failed, using cached manifest: ' + str(e))
+            return []
+        for (year, month), days in zip(todo, trees):
+            self.tree.setdefault(year, {})[month] = days
+        self.refreshed = time.time()
+        self.save()
+        return todo
+
+    def entries(self, years=None, months=None, days=None, fileTypes=None, levels=None):
+        """
+        Returns the files in the manifest matching a selection, None selects everything
+
+        Args:
+            years (list): The list of years (default: None)
+            months (list): The list of months (default: None)
+            days (list): The list of days (default: None)
+            fileTypes (list): The list of file types (default: None)
+            levels (list): The list of levels (default: None)
+
+        Returns:
+            list: dicts with year, month, day, fileType, level, file, url and size, sorted by file date
+        """
+
+        out = []
+        for year in sorted(self.tree):
+            if years is not None and year not in years:
+                continue
+            for month in sorted(self.tree[year]):
+                if months is not None and month not in months:
+                    continue
+                for day in sorted(self.tree[year][month]):
+                    if days is not None and day not in days:
+                        continue
+                    for file, size in sorted(self.tree[year][month][day].items()):
+                        match = FILE_PATTERN.match(file)
+                        if match is None:
+                            continue
+                        level, fileType = match.group(1), match.group(2)
+                        if fileTypes is not None and fileType not in fileTypes:
+                            continue
+                        if levels is not None and level not in levels:
+                            continue
+                        out.append({'year': year, 'month': month, 'day': day, 'fileType': fileType,
+                                    'level': level, 'file': file, 'size': size,
+                                    'url': self.url + 'Y' + year + '/M' + month + '/D' + day + '/' + file})
+        return out
+
+    def options(self, field, **selection):
+        """
+        Returns the values of one field available for a selection, ex. the days
+        with data in the selected years and months
+
+        Args:
+            field (str): 'year', 'month', 'day', 'fileType' or 'level'
+            selection: Selection passed to entries
+
+        Returns:
+            list: Sorted unique values
+        """
+
+        return sorted({entry[field] for entry in self.entries(**selection)})
+
+if __name__ == '__main__':
+    manifest = Manifest()
+    months = manifest.refresh()
+    print('Read ' + str(len(months)) + ' months from the server')
+    entries = manifest.entries()
+    print(str(len(entries)) + ' files, ' + str(sum(e['size'] or 0 for e in entries) // 1024**2) + ' MB')
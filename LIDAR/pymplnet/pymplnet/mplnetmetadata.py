@@ -0,0 +1,173 @@
+# mplnetmetadata.py
+# Persistent cache of MPLNET file metadata
+# Variable names, dimensions and attributes are the same for every file of one
+# file type, level and product version, so each combination is read from one file and kept on disk
+# Shapes are not cached, the number of times and altitude bins differ between files
+
+import os
+import re
+import json
+import numpy as np
+import netCDF4 as nc
+
+# MPLNET_V3_L15_NRB_20230105_MPL44201_Appalachian_State.nc4
+METADATA_PATTERN = re.compile(r'MPLNET_(V\d+)_(L\d+)_([A-Z]+)_')
+
+def metadata_key(file):
+    """
+    Returns the cache key of a file from its name, ex. 'NRB/L15/V3'
+
+    Args:
+        file (str): file name or full path
+
+    Returns:
+        str: file type, level and product version, None if the name does not match
+    """
+
+    match = METADATA_PATTERN.match(os.path.basename(file))
+    if match is None:
+        return None
+    return '/'.join((match.group(3), match.group(2), match.group(1)))
+
+def json_value(value):
+    """
+    Returns an attribute value that json can store, numpy values become python values
+    """
+
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, bytes):
+        return value.decode(errors='replace')
+    return value
+
+def read_metadata(file):
+    """
+    Returns the metadata of every variable in a file, no data is read
+
+    Args:
+        file (str): full path of the netcdf file
+
+    Returns:
+        dict: variable name -> {'attributes': dict, 'dimensions': list}
+    """
+
+    with nc.Dataset(file, 'r') as f:
+        return {name: {'attributes': {k: json_value(var.getncattr(k)) for k in var.ncattrs()},
+                       'dimensions': list(var.dimensions)}
+                for name, var in f.variables.items()}
+
+def read_shape(file, variable):
+    """
+    Returns the shape of a variable in one file from the file header, no data is read
+
+    Args:
+        file (str): full path of the netcdf file
+        variable (str): name of variable
+
+    Returns:
+        tuple: shape of the variable
+    """
+
+    with nc.Dataset(file, 'r') as f:
+        return tuple(f.variables[variable].shape)
+
+class MetadataCache():
+    """
+    Variable metadata per file type, level and product version, kept in a json file between sessions
+
+    Attributes:
+        path (str): The json file the cache is stored in
+        entries (dict): key -> {'source': file the metadata was read from, 'variables': see read_metadata}
+
+    Methods:
+        load(): Reads the cache from path
+        save(): Writes the cache to path
+        get(file): The variable metadata of a file, read from the file only on the first access
+        forget(key): Drops one entry, or every entry, so it is read again
+    """
+
+    def __init__(self, path='../data/mplnet_metadata.json'):
+        self.path = os.path.abspath(path)
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        """
+        Reads the cache from path, an empty cache if the file does not exist or can not be read
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print('Metadata cache not read, starting empty: ' + str(e))
+                self.entries = {}
+
+    def save(self):
+        """
+        Writes the cache to path, replacing the old file in one step
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp = self.path + '.part'
+        with open(temp, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(temp, self.path)
+
+    def get(self, file):
+        """
+        Returns the variable metadata of a file. Files of a file type, level and product version
+        already in the cache are not opened, files with names outside the MPLNET pattern always are
+
+        Args:
+            file (str): full path of the netcdf file
+
+        Returns:
+            dict: variable name -> {'attributes', 'dimensions'}, see read_metadata
+        """
+
+        key = metadata_key(file)
+        if key is not None and key in self.entries:
+            return self.entries[key]['variables']
+        variables = read_metadata(file)
+        if key is not None:
+            self.entries[key] = {'source': os.path.basename(file), 'variables': variables}
+            self.save()
+        return variables
+
+    def forget(self, key=None):
+        """
+        Drops one entry, or every entry when key is None, so it is read from a file again
+
+        Args:
+            key (str): key of the entry, see metadata_key (default: None)
+
+        Returns:
+            None
+        """
+
+        if key is None:
+            self.entries = {}
+        else:
+            self.entries.pop(key, None)
+        self.save()
+
+if __name__ == '__main__':
+    cache = MetadataCache()
+    for key, entry in sorted(cache.entries.items()):
+        print(key + ': ' + str(len(entry['variables'])) + ' variables from ' + entry['source'])
@@ -0,0 +1,232 @@
+# mplnetpbl.py
+# Planetary boundary layer (mixed layer) height of every MPLNET profile
+# The gradient and Haar wavelet covariance methods run as moving window sums along the altitude
+# axis of a whole file of profiles at once, files are processed one at a time in a process pool
+
+import os
+import glob
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from mplnetpytools import read_variable, file_altitude, cloud_info
+
+def window_sums(values, axis):
+    """
+    Returns the cumulative sums of the valid values and of the number of valid values along an axis
+    with a leading zero, the sum over [i, j) is c[j] - c[i]
+
+    Args:
+        values (numpy.ndarray): 2D values, nan where missing
+        axis (int): axis to sum along
+
+    Returns:
+        sums (numpy.ndarray): cumulative sums of the values
+        counts (numpy.ndarray): cumulative number of valid values
+    """
+
+    valid = ~np.isnan(values)
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (1, 0)
+    sums = np.pad(np.cumsum(np.where(valid, values, 0), axis=axis), pad)
+    counts = np.pad(np.cumsum(valid, axis=axis), pad)
+    return sums, counts
+
+def smooth_time(values, window):
+    """
+    Returns the profiles averaged over a centered moving window of times, missing values are skipped
+    The window is shortened at the first and last profiles
+
+    Args:
+        values (numpy.ndarray): profiles with shape (times, bins)
+        window (int): number of profiles averaged, ex. 5 for 5 minutes
+
+    Returns:
+        numpy.ndarray: smoothed profiles
+    """
+
+    if window is None or window <= 1:
+        return values
+    n = len(values)
+    sums, counts = window_sums(values, 0)
+    lo = np.clip(np.arange(n) - window // 2, 0, n)
+    hi = np.clip(np.arange(n) + window - window // 2, 0, n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (sums[hi] - sums[lo]) / (counts[hi] - counts[lo])
+
+def haar_covariance(values, half):
+    """
+    Returns the Haar wavelet covariance transform of every profile
+    The wavelet is +1 over the half bins below and -1 over the half bins above each bin boundary,
+    so the transform peaks where the signal drops with height, ex. at the top of the mixed layer
+
+    Args:
+        values (numpy.ndarray): profiles with shape (times, bins)
+        half (int): number of bins in each half of the wavelet
+
+    Returns:
+        numpy.ndarray: transform at the boundary below each bin, nan where the wavelet
+            does not fit or covers a missing value
+    """
+
+    n = values.shape[1]
+    sums, counts = window_sums(values, 1)
+    b = np.arange(half, n - half + 1)
+    below = sums[:, b] - sums[:, b - half]
+    above = sums[:, b + half] - sums[:, b]
+    full = (counts[:, b + half] - counts[:, b - half]) == 2 * half
+    out = np.full(values.shape, np.nan)
+    out[:, b[:n - half]] = np.where(full, (below - above) / (2 * half), np.nan)[:, :n - half]
+    return out
+
+def negative_gradient(values, altitude, half):
+    """
+    Returns the negative vertical gradient of every profile after a moving average over 2 * half + 1 bins,
+    largest where the signal drops fastest with height
+
+    Args:
+        values (numpy.ndarray): profiles with shape (times, bins)
+        altitude (numpy.ndarray): altitude (km) of each bin
+        half (int): number of bins on each side of the moving average
+
+    Returns:
+        numpy.ndarray: -d(values)/d(altitude) of the smoothed profiles
+    """
+
+    n = values.shape[1]
+    sums, counts = window_sums(values, 1)
+    lo = np.clip(np.arange(n) - half, 0, n)
+    hi = np.clip(np.arange(n) + half + 1, 0, n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        smooth = (sums[:, hi] - sums[:, lo]) / (counts[:, hi] - counts[:, lo])
+    return -np.gradient(smooth, altitude, axis=1)
+
+def pbl_height(values, altitude, method='haar', dilation=0.3, min_height=0.15, max_height=4.0, smooth=None):
+    """
+    Returns the mixed layer height of every profile
+
+    Args:
+        values (numpy.ndarray): profiles with shape (times, bins), ex. nrb
+        altitude (numpy.ndarray): ascending altitude (km) of each bin
+        method (str): 'haar' for the Haar wavelet covariance transform or 'gradient' for the
+            largest negative gradient (default: 'haar')
+        dilation (float): width (km) of the wavelet or of the vertical smoothing (default: 0.3)
+        min_height (float): lowest height (km) above the first bin searched, skips the overlap region (default: 0.15)
+        max_height (float): highest height (km) above the first bin searched (default: 4.0)
+        smooth (int): number of profiles averaged in time before the retrieval (default: None)
+
+    Returns:
+        numpy.ndarray: mixed layer height (km, same reference as altitude), nan where no height is found
+    """
+
+    values = smooth_time(np.asarray(values, dtype=float), smooth)
+    altitude = np.asarray(altitude, dtype=float)
+    step = float(np.median(np.diff(altitude)))
+    half = max(int(round(dilation / step / 2)), 1)
+    if method == 'haar':
+        score = haar_covariance(values, half)
+        # the transform is centered on the boundary below each bin
+        heights = np.concatenate(([altitude[0]], (altitude[1:] + altitude[:-1]) / 2))
+    elif method == 'gradient':
+        score = negative_gradient(values, altitude, half)
+        heights = altitude
+    else:
+        raise ValueError("method must be 'haar' or 'gradient', not {}".format(method))
+
+    searched = (heights >= altitude[0] + min_height) & (heights <= altitude[0] + max_height)
+    score = np.where(searched[None, :] & ~np.isnan(score), score, -np.inf)
+    best = np.argmax(score, axis=1)
+    found = np.isfinite(score[np.arange(len(score)), best])
+    return np.where(found, heights[best], np.nan)
+
+def retrieve_file(file, variable='nrb', method='haar', dilation=0.3, min_height=0.15, max_height=4.0,
+                  smooth=None, below_cloud=False):
+    """
+    Returns the times and mixed layer heights of one file
+
+    Args:
+        file (str): full file path
+        variable (str): profile variable (default: 'nrb')
+        method, dilation, min_height, max_height, smooth: see pbl_height
+        below_cloud (bool): only search below the cloud base of the CLD file of the same day (default: False)
+
+    Returns:
+        times (numpy.ndarray): datetime64[s] times
+        heights (numpy.ndarray): mixed layer height (km) of each time
+    """
+
+    times, values = read_variable(file, variable)
+    altitude = file_altitude(file, variable)
+    if altitude is None:
+        raise ValueError('{} is not on the altitude dimension'.format(variable))
+    if below_cloud:
+        info = cloud_info(times, file)
+        if info is not None:
+            # the base is nan when clear, only bins at and above a cloud base are dropped
+            values = np.where(altitude[None, :] >= info[1][:, None], np.nan, values)
+    return times, pbl_height(values, altitude, method, dilation, min_height, max_height, smooth)
+
+def try_retrieve_file(file, *args):
+    """
+    Returns retrieve_file(file, *args), or None after printing the error if the file can not be read
+    """
+
+    try:
+        return retrieve_file(file, *args)
+    except Exception as e:
+        print(e)
+        print('Error reading file: {}'.format(file))
+        return None
+
+def pbl_series(files, variable='nrb', method='haar', dilation=0.3, min_height=0.15, max_height=4.0,
+               smooth=None, below_cloud=False, workers=4):
+    """
+    Returns the mixed layer height time series of many files, only one file per worker is held in memory
+
+    Args:
+        files (list): list of full file paths
+        variable, method, dilation, min_height, max_height, smooth, below_cloud: see retrieve_file
+        workers (int): number of files processed at once, 1 runs in this process (default: 4)
+
+    Returns:
+        Pandas DataFrame indexed by time with a pbl_height column (km)
+    """
+
+    files = [x for x in files if os.path.isfile(x)]
+    n = len(files)
+    args = [files] + [[x] * n for x in (variable, method, dilation, min_height, max_height, smooth, below_cloud)]
+    if workers == 1 or n <= 1:
+        parts = list(map(try_retrieve_file, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(try_retrieve_file, *args, chunksize=max(1, n // (4 * workers))))
+    parts = [p for p in parts if p is not None]
+    if not parts:
+        return pd.DataFrame(columns=['pbl_height'])
+    times = np.concatenate([p[0] for p in parts])
+    heights = np.concatenate([p[1] for p in parts])
+    times, first = np.unique(times, return_index=True)
+    return pd.DataFrame({'pbl_height': heights[first]},
+                        index=pd.DatetimeIndex(times.astype('datetime64[ns]'), name='time'))
+
+def pbl_summary(series, freq='h'):
+    """
+    Returns the mean, median, standard deviation, minimum, maximum and number of retrievals
+    of the mixed layer height in every time bin
+
+    Args:
+        series (Pandas DataFrame): see pbl_series
+        freq (str): 'h' for hourly or 'D' for daily bins (default: 'h')
+
+    Returns:
+        Pandas DataFrame indexed by time
+    """
+
+    return series['pbl_height'].resample(freq).agg(['mean', 'median', 'std', 'min', 'max', 'count'])
+
+if __name__ == '__main__':
+    files = sorted(glob.glob(os.path.join('..', 'data', '**', 'MPLNET_V3_*_NRB_*.nc4'), recursive=True))
+    series = pbl_series(files)
+    print(str(series['pbl_height'].count()) + ' PBL heights from ' + str(len(files)) + ' files')
+    series.to_csv('PBL_HEIGHT.csv')
+    pbl_summary(series, 'h').to_csv('HRAVG_PBL_HEIGHT.csv')
+    pbl_summary(series, 'D').to_csv('DAYAVG_PBL_HEIGHT.csv')
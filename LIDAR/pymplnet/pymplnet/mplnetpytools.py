@@ -5,15 +5,16 @@
 import numpy as np
 import pandas as pd
 #import matplotlib.pyplot as plt
-import requests
 import bs4
 import re
 import os
 import netCDF4 as nc
-from mplnetaccess import MPLNetAccess
+from mplnetdownload import DownloadManager, get_session
+from mplnetmetadata import read_metadata, read_shape
 import warnings
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
-# TODO Build into class to hold user/pass for needed access
 def get_mplnet_html(url):
     """
     Returns the html for the mplnet address given
@@ -27,21 +28,11 @@ def get_mplnet_html(url):
         requests.Response object: The html for the mplnet address given
     """
 
-    # Get username and password from encrypted file
-    key = MPLNetAccess()
-    key.getAccess()
-
-    # creates a requests session
-    s = requests.Session()
-
-    # authenticates the session
-    s.auth = (key.getUser(), key.getPass())
-
     # Consider just returning the text
-    # return s.get(url).text
+    # return get_session().get(url).text
 
-    # returns the html object for the data
-    return s.get(url)
+    # returns the html object for the data, the shared session holds the credentials
+    return get_session().get(url)
 
 def get_mplnet_data(url, file_path_name):
     """
@@ -55,33 +46,9 @@ def get_mplnet_data(url, file_path_name):
         Boolean value indicating if the file was downloaded and saved successfully
     """
 
-    # Download the file with request
-
-    # Get username and password from encrypted file
-    key = MPLNetAccess()
-    key.getAccess()
-
-    # creates a requests session
-    s = requests.Session()
-
-    # authenticates the session
-    s.auth = (key.getUser(), key.getPass())
-    response = s.get(url, stream=True)
-
-    if(response.status_code != 200):
-        return False
-
-    # If file already exists, return True, don't download again
-    if (os.path.exists(file_path_name)):
-        return True
-    else: 
-        with open(file_path_name, 'wb') as f:
-            for chunk in response.iter_content(chunk_size = 10 * 1024):
-                if chunk:
-                    f.write(chunk)
-
-    # Verify file was downloaded
-    return os.path.exists(file_path_name)
+    # If file already exists, return True without a request
+    status = DownloadManager(workers=1).download(url, file_path_name)
+    return status in ('exists', 'downloaded')
 
 def parse_year(html):
     """
@@ -312,6 +279,8 @@ class FileVariables():
         nextIter (int): The next file variable to be filled
         selectedFileType (str): The selected file type
         selectedFileVars (list): The selected file variables
+        metadata (MetadataCache): Cached variable metadata, None to read every file opened
+        file (str): The file the variables were listed from, shapes are read from it
         
     Methods:
         setFileTypes(ft): Store the file types from the downloaded files
@@ -322,6 +291,7 @@ class FileVariables():
             based upon the user input
         storeCurrent(value): Returns the current file variable to be filled
             based upon the user input
+        setMetadataCache(cache): Uses a metadata cache for the file variables
         setFileVars(file): Returns the file variables for the selected file type
         printSelected(var): Prints the selected file variable
     """
@@ -338,6 +308,10 @@ class FileVariables():
         # This will be netcdf variable
         self.selectedFileVars = ''
 
+        # Variable metadata shared by files of the same type, level and version
+        self.metadata = None
+        self.file = None
+
     def setFileTypes(self, ft):
         """
         Store the file types from the downloaded files
@@ -411,32 +385,44 @@ class FileVariables():
         else:
             return None
 
+    def setMetadataCache(self, cache):
+        """
+        Uses a metadata cache for the file variables, files of a file type, level and
+        product version already in the cache are not opened
+        
+        Args:
+            cache (MetadataCache): The metadata cache, None to read every file opened
+        
+        Returns:
+            None
+        """
+
+        self.metadata = cache
+
     def setFileVars(self, file):
         """
-        Opens the netcdf file and extracts the variables and populates
-        the filevars dictionary
+        Populates the filevars dictionary with the attributes and dimensions of
+        every variable, from the metadata cache if set or else from the netcdf file.
+        No data is read.
         
         Args:
-            files (str): A full path to the netcdf file to be opened
+            files (str): A full path to the netcdf file
         
         Returns:
             None
         """
         
-        # Open the netcdf file and extract the variables into a dictionary for use
-        with nc.Dataset(file, 'r') as ncFile:
-            for name, variable in ncFile.variables.items():
-                self.filevars[name] = {
-                    'attributes': {attr_name: getattr(variable, attr_name) for attr_name in variable.ncattrs()},
-                    'dimensions': variable.dimensions,
-                    'shape': variable.shape,
-                    'data': variable[:].copy()
-                }
+        variables = self.metadata.get(file) if self.metadata is not None else read_metadata(file)
+        self.filevars = {name: {'attributes': info['attributes'],
+                                'dimensions': tuple(info['dimensions'])}
+                         for name, info in variables.items()}
+        self.file = file
 
 
     def printSelected(self, var):
         """
-        Prints the selected file variable
+        Prints the selected file variable, the shape is read from the header of
+        the file the variables were listed from
 
         Args:
             var (str): The selected file variable
@@ -447,7 +433,7 @@ class FileVariables():
 
         return f'\nVariable: {var}\
                 \n  Dimensions: {self.filevars[var]["dimensions"]}\
-                \n  Shape: {self.filevars[var]["shape"]}'
+                \n  Shape: {read_shape(self.file, var)} in {os.path.basename(self.file)}'
 
 # Class to build and store selection variables
 class SelectionVariables():
@@ -466,9 +452,11 @@ class SelectionVariables():
         selectedFileTypes (list): The list of selected file types
         selectedLevel (list): The list of selected level
         nextIter (int): The next selection variable to be filled
+        manifest (Manifest): Cached list of the files on the server, None to build selections from the html
 
     Methods:
         getVars(html): Returns the years, months, days, and file types from the html
+        setManifest(manifest): Uses a manifest for the selection options and downloads
         next(): Returns the next selection variable to be filled
             based upon the user input
         peakNext(): Returns the next selection variable to be filled
@@ -492,6 +480,7 @@ class SelectionVariables():
         self.fileTypes = []
         self.level = []
         self.nextIter = 0
+        self.manifest = None
 
         # Initialize variables that hold user selected options
         self.selectedYears = [] 
@@ -515,6 +504,25 @@ class SelectionVariables():
         self.years = parse_year(html)
         self.months, self.days, self.fileTypes, self.level = buildSelectionList(self.years)
 
+    def setManifest(self, manifest):
+        """
+        Uses a manifest of the server files so that each selection only offers
+        values with data for the earlier selections and only existing files are downloaded
+        
+        Args:
+            manifest (Manifest): The manifest from mplnetmanifest
+            
+        Returns:
+            None    
+        """
+
+        self.manifest = manifest
+        self.years = manifest.options('year')
+        self.months = manifest.options('month')
+        self.days = manifest.options('day')
+        self.fileTypes = manifest.options('fileType')
+        self.level = manifest.options('level')
+
     def next(self):
         """
         Returns the next selection variable to be filled 
@@ -527,6 +535,20 @@ class SelectionVariables():
             The next selection variable to be filled or None
         """
 
+        # narrow the options to those with files for the earlier selections
+        if self.manifest is not None:
+            selection = {'years': self.selectedYears, 'months': self.selectedMonths,
+                         'days': self.selectedDays, 'fileTypes': self.selectedFileTypes}
+            if self.nextIter == 1:
+                self.months = self.manifest.options('month', years=selection['years'])
+            elif self.nextIter == 2:
+                self.days = self.manifest.options('day', years=selection['years'], months=selection['months'])
+            elif self.nextIter == 3:
+                self.fileTypes = self.manifest.options('fileType', years=selection['years'], months=selection['months'],
+                                                       days=selection['days'])
+            elif self.nextIter == 4:
+                self.level = self.manifest.options('level', **selection)
+
         if self.nextIter == 0:
             self.nextIter += 1
             return self.years
@@ -644,6 +666,16 @@ class SelectionVariables():
             Tuple of lists containing the urls, dirs, and, files to be downloaded
         """
 
+        # Only files that exist on the server when a manifest is set
+        if self.manifest is not None:
+            entries = self.manifest.entries(self.selectedYears, self.selectedMonths, self.selectedDays,
+                                            self.selectedFileTypes, self.selectedLevel)
+            path = get_data_path()
+            urls = [e['url'] for e in entries]
+            dirs = [path + '\\' + e['level'] + '\\Y' + e['year'] + '\\M' + e['month'] + '\\D' + e['day'] + '\\' for e in entries]
+            files = [e['file'] for e in entries]
+            return urls, dirs, files
+
         # Build list of files to be downloaded
         files = buildFileList(self.selectedYears, self.selectedMonths, self.selectedDays, self.selectedFileTypes, self.selectedLevel)
 
@@ -678,6 +710,23 @@ class SelectionVariables():
         else: 
             return file + ' download failed'
 
+    def downloadAll(self, done=None, progress=None, workers=4, cancelled=None):
+        """
+        Downloads all of the selected files concurrently, see download_files
+        
+        Args:
+            done (callable): Called with the file name and status text as each file finishes (default: None)
+            progress (callable): Called as progress(path, bytes_done, bytes_total) while downloading (default: None)
+            workers (int): Number of concurrent downloads (default: 4)
+            cancelled (threading.Event): Set to stop the downloads (default: None)
+        
+        Returns:
+            dict: Status of each file path
+        """
+
+        urls, dirs, files = self.prepDownload()
+        return download_files(urls, dirs, files, done, progress, workers, cancelled)
+
     def checkSelection(self):
         """
         Checks to make sure a selection is made in each category
@@ -691,6 +740,33 @@ class SelectionVariables():
 
         return (self.selectedYears and self.selectedMonths and self.selectedDays and self.selectedFileTypes and self.selectedLevel)
             
+def download_files(urls, dirs, files, done=None, progress=None, workers=4, cancelled=None):
+    """
+    Downloads files concurrently, see DownloadManager
+    
+    Args:
+        urls (list): url of each file
+        dirs (list): directory of each file
+        files (list): name of each file
+        done (callable): Called with the file name and status text as each file finishes (default: None)
+        progress (callable): Called as progress(path, bytes_done, bytes_total) while downloading (default: None)
+        workers (int): Number of concurrent downloads (default: 4)
+        cancelled (threading.Event): Set to stop the downloads (default: None)
+    
+    Returns:
+        dict: Status of each file path
+    """
+
+    for dir in set(dirs):
+        create_directory(dir)
+    text = {'exists': ' already exists', 'downloaded': ' download successful',
+            'missing': ' not on server', 'failed': ' download failed', 'cancelled': ' download cancelled'}
+    callback = None
+    if done is not None:
+        callback = lambda path, status: done(os.path.basename(path) + text[status])
+    manager = DownloadManager(workers=workers, progress=progress, cancelled=cancelled)
+    return manager.download_many([(url, dir + file) for url, dir, file in zip(urls, dirs, files)], callback)
+
 def buildFileList(years, months, days, fileTypes, levels):
     """
     Returns a list of files to be downloaded based upon the user input
@@ -716,6 +792,23 @@ def buildFileList(years, months, days, fileTypes, levels):
 
     return files
 
+def get_data_path(data_path = '../data/'):
+    """
+    Creates the data folder, changes to it and returns its full path
+    
+    Args:
+        data_path (str): The path to the data folder (default: '../data/')
+            This is the path relative to the current working directory
+    
+    Returns:
+        str: The full path of the data folder
+    """
+
+    # change to data folder from cwd
+    create_directory(data_path)
+    os.chdir(data_path)
+    return os.getcwd()
+
 def buildDirList(years, months, days, fileType, levels, data_path = '../data/'):
     """
     Returns a list of directories to be used for downloading the files
@@ -733,10 +826,7 @@ def buildDirList(years, months, days, fileType, levels, data_path = '../data/'):
     """
 
     # Create directories for the files
-    # change to data folder from cwd
-    create_directory(data_path)
-    os.chdir(data_path)
-    path = os.getcwd()
+    path = get_data_path(data_path)
         
     # Create list of directories
     dirs = []
@@ -779,127 +869,384 @@ def buildURLList(years, months, days, fileTypes, levels):
 
     return urls
 
-def export(filename, files, variable):
+def variable_layout(var):
     """
-    Export data to csv file
-    Uses current data directory to save csv file
+    Returns the index that reads a netCDF variable without the wavelength dimension
+    Wavelength data is omitted as it is static, always 532 nm (green)
+    
+    Args:
+        var (netCDF4.Variable): The variable to be read
+    
+    Returns:
+        key (tuple): Index selecting the first wavelength
+        dims (list): The dimensions left after the wavelength is removed
+    """
+
+    dims = list(var.dimensions)
+    key = tuple(0 if dim == 'wavelength' and len(dims) > 1 else slice(None) for dim in dims)
+    return key, [dim for dim, k in zip(dims, key) if not isinstance(k, int)]
+
+def variable_altitude(f, variable):
+    """
+    Returns the altitude (km) of the bins of a variable in an open file
+    
+    Args:
+        f (netCDF4.Dataset): The open file
+        variable (str): name of variable
+    
+    Returns:
+        numpy.ndarray: altitudes, None if the variable is not a profile (time and altitude dimensions)
+    """
+
+    if 'altitude' not in f.variables:
+        return None
+    altitude = f.variables['altitude']
+    dims = f.variables[variable].dimensions
+    if altitude.dimensions[0] not in dims or 'time' not in dims:
+        return None
+    return np.ma.filled(np.ma.asarray(altitude[:], dtype=float), np.nan).ravel()
+
+def file_altitude(file, variable):
+    """
+    Returns the altitude (km) of the bins of a variable in one file, see variable_altitude
+    """
+
+    with nc.Dataset(file, 'r') as f:
+        return variable_altitude(f, variable)
+
+def common_grid(files, variable):
+    """
+    Returns the altitude grid of the first file holding a variable on the altitude dimension
+    Used as the common grid when none is given
     
     Args:
-        filename (str): name of output csv file
         files (list): list of full file paths
-        variable (str): name of variable to export
+        variable (str): name of variable
+    
+    Returns:
+        numpy.ndarray: altitudes (km), None if the variable is not a profile
+    """
+
+    for file in files:
+        try:
+            return file_altitude(file, variable)
+        except (OSError, KeyError):
+            continue
+    return None
+
+def same_grid(altitude, grid):
+    """
+    Returns True if two altitude grids are the same
+    """
+
+    return altitude is not None and grid is not None and len(altitude) == len(grid) and np.allclose(altitude, grid)
+
+def interpolate(lower, upper, weight):
+    """
+    Returns lower * (1 - weight) + upper * weight, grid points on a bin take its value even if the other bin is nan
+    """
+
+    with np.errstate(invalid='ignore'):
+        out = lower * (1 - weight) + upper * weight
+    return np.where(weight >= 1, upper, np.where(weight <= 0, lower, out))
+
+def regrid(values, altitude, grid):
+    """
+    Linearly interpolates profiles onto a common altitude grid, all profiles at once
+    Grid points outside the profile altitudes are nan
+    
+    Args:
+        values (numpy.ndarray): profiles with shape (profiles, bins)
+        altitude (numpy.ndarray): ascending altitudes of the bins, shape (bins,) shared by
+            every profile or (profiles, bins) with one grid per profile
+        grid (numpy.ndarray): ascending altitudes to interpolate to
+    
+    Returns:
+        numpy.ndarray: profiles with shape (profiles, len(grid))
+    """
+
+    values = np.asarray(values, dtype=float)
+    altitude = np.asarray(altitude, dtype=float)
+    grid = np.asarray(grid, dtype=float)
+    n, m = values.shape
+    if altitude.ndim == 1:
+        if same_grid(altitude, grid):
+            return values
+        upper = np.clip(np.searchsorted(altitude, grid), 1, m - 1)
+        lower = upper - 1
+        weight = (grid - altitude[lower]) / (altitude[upper] - altitude[lower])
+        out = interpolate(values[:, lower], values[:, upper], weight[None, :])
+        out[:, (grid < altitude[0]) | (grid > altitude[-1])] = np.nan
+        return out
+
+    # one search over every profile, each row is offset so rows do not overlap
+    span = max(np.nanmax(altitude), grid.max()) - min(np.nanmin(altitude), grid.min()) + 1
+    offset = np.arange(n)[:, None] * span
+    position = np.searchsorted((altitude + offset).ravel(), (grid[None, :] + offset).ravel()).reshape(n, -1)
+    upper = np.clip(position - np.arange(n)[:, None] * m, 1, m - 1)
+    lower = upper - 1
+    a0, a1 = np.take_along_axis(altitude, lower, 1), np.take_along_axis(altitude, upper, 1)
+    weight = (grid[None, :] - a0) / (a1 - a0)
+    out = interpolate(np.take_along_axis(values, lower, 1), np.take_along_axis(values, upper, 1), weight)
+    out[(grid[None, :] < altitude[:, :1]) | (grid[None, :] > altitude[:, -1:])] = np.nan
+    return out
+
+def altitude_labels(grid):
+    """
+    Returns the column headers of profile data, ex. '1.155 km'
+    """
+
+    return ['{:.3f}'.format(x) + ' km' for x in grid]
+
+def scan_file(file, variable):
+    """
+    Returns the shape of a variable in one file as it will be stacked,
+    time first if time is the second dimension
+    
+    Args:
+        file (str): full file path
+        variable (str): name of variable
+    
+    Returns:
+        rows (int): number of rows, the length of the time dimension when present
+        columns (int): number of columns
+        dims (list): dimensions after the wavelength is removed
+        dtype (numpy.dtype): data type of the variable
+        altitude (numpy.ndarray): altitudes of the bins, None if the variable is not a profile
+    """
+
+    with nc.Dataset(file, 'r') as f:
+        var = f.variables[variable]
+        key, dims = variable_layout(var)
+        shape = [n for n, k in zip(var.shape, key) if not isinstance(k, int)]
+        dtype = var.dtype
+        altitude = variable_altitude(f, variable)
+    if len(dims) > 1 and dims[1] == 'time':
+        shape = shape[::-1]
+    return shape[0], int(np.prod(shape[1:])), dims, dtype, altitude
+
+def read_into(file, variable, out, times, start, grid=None):
+    """
+    Reads a variable from one file into rows of a preallocated array
+    Masked values are filled with nan
+    
+    Args:
+        file (str): full file path
+        variable (str): name of variable
+        out (numpy.ndarray): output array with shape (rows, columns)
+        times (numpy.ndarray): output time array, None if the variable has no time dimension
+        start (int): first row for this file
+        grid (numpy.ndarray): altitude grid of the output, profiles on another grid are regridded (default: None)
     
     Returns:
         None
     """
 
+    with nc.Dataset(file, 'r') as f:
+        var = f.variables[variable]
+        key, dims = variable_layout(var)
+        data = var[key]
+        if len(dims) > 1 and dims[1] == 'time':
+            data = data.T
+        rows = data.shape[0]
+        block = out[start:start + rows]
+        altitude = variable_altitude(f, variable) if grid is not None else None
+        if altitude is not None and not same_grid(altitude, grid):
+            block[...] = regrid(np.ma.filled(np.ma.asarray(data, dtype=float), np.nan).reshape(rows, -1), altitude, grid)
+        else:
+            # copy straight into the output rows, then blank the masked values
+            block[...] = np.ma.getdata(data).reshape(rows, -1)
+            if np.ma.is_masked(data):
+                block[np.ma.getmaskarray(data).reshape(rows, -1)] = np.nan
+        if times is not None:
+            times[start:start + rows] = np.ma.filled(f.variables['time'][:].astype(float), np.nan)
+
+def read_shared(file, variable, name, shape, dtype, timed, start, grid=None):
+    """
+    Reads a variable from one file into rows of an array in shared memory
+    Used by read_files to fill the output from worker processes
+    
+    Args:
+        file (str): full file path
+        variable (str): name of variable
+        name (str): name of the shared memory block
+        shape (tuple): shape of the output array
+        dtype (numpy.dtype): data type of the output array
+        timed (bool): True if the time array follows the output array in the block
+        start (int): first row for this file
+        grid (numpy.ndarray): altitude grid of the output (default: None)
+    
+    Returns:
+        Boolean value indicating if the file was read successfully
+    """
+
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        out = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        times = np.ndarray(shape[0], dtype=float, buffer=shm.buf, offset=out.nbytes) if timed else None
+        read_into(file, variable, out, times, start, grid)
+        del out, times
+        return True
+    except Exception as e:
+        print(e)
+        print('Error exporting file: {}'.format(file))
+        return False
+    finally:
+        shm.close()
+
+def read_files(files, variable, workers=4, grid=None, progress=None):
+    """
+    Returns a pandas DataFrame with a variable from all files
+    The time dimension of every file is scanned first so that a single output array
+    is allocated, then worker processes read the files into it through shared memory
+    (the HDF5 library behind netCDF4 is not safe to call from several threads)
+    
+    Args:
+        files (list): list of full file paths
+        variable (str): name of variable
+        workers (int): number of files read at once, 1 reads in this process (default: 4)
+        grid (numpy.ndarray): altitude grid (km) profiles are regridded onto (default: None, the first file's altitude)
+        progress (callable): Called with the file path as each file is read, an exception it raises
+            stops the files not started yet (default: None)
+    
+    Returns:
+        Pandas DataFrame indexed by time (julian days) when the variable has a time dimension,
+        one column per bin for 2D data or one column named after the variable,
+        the altitude of the bins of profile data is in df.attrs['altitude']
+    """
+
     # test if all files in files exist
     # if not, remove from list
     files = [x for x in files if os.path.isfile(x)]
 
-    # handle case if file already exists
-    if os.path.isfile(filename):
-        # remove file
-        os.remove(filename)
-
-    # create empty dataframe
-    df = pd.DataFrame()
-
-    # loop through files
-    # TODO: Error handling for variables that do not include time
+    # scan the files for their size along time
+    layout = {}
     for file in files:
         try:
-            # open file
-            f = nc.Dataset(file, 'r')
-            # get time
-            time = f.variables['time'][:]
-            # get altitude
-            altitude = f.variables['altitude'][:]
-
-            # get data
-            data = None
-            # Omit wavelength data as it is static, always 532 nm (green)
-            # Check if wavelength data is present
-            dims = list(f.variables[variable].dimensions)
-            if len(dims) == 3:
-                for num, dim in enumerate(dims):
-                    if dim == 'wavelength':
-                        if num == 0:
-                            data = f.variables[variable][0, :, :]
-                            dims = dims[1:]
-                        elif num == 1:
-                            data = f.variables[variable][:, 0, :]
-                            dims = dims[0] + dims[2:]
-                        elif num == 2:
-                            data = f.variables[variable][:, :, 0]
-                            dims = dims[:-1]
-                    else:
-                        if data is None:
-                            data = f.variables[variable][:]
-            elif len(dims) == 2:
-                for num, dim in enumerate(dims):
-                    if dim == 'wavelength':
-                        if num == 0:
-                            data = f.variables[variable][0, :]
-                            dims.pop(0)
-                        if num == 1:
-                            data = f.variables[variable][:, 0]
-                            dims.pop(1)
-                    else: 
-                        if data is None:
-                            data = f.variables[variable][:]
-            else: # only 1 diminsion
-                data = f.variables[variable][:]
-
-            # column naming
-            if (len(data.shape) == 2):
-                column_names = [str(x) for x in range(data.shape[1])]
-            else:
-                column_names = [variable]
-
-            # add to dataframe
-            if (df.empty == True):
-                # only assign time if time if time is present
-                if 'time' == dims[0]:
-                    df = pd.DataFrame(data=data, index=time, columns=column_names)
-                else:
-                    df = pd.DataFrame(data=data, columns=column_names)
-            else:
-                if 'time' == dims[0]:
-                    temp = pd.DataFrame(data=data, index=time, columns=column_names)
-                    df = pd.concat([df, temp])
-                else:
-                    temp = pd.DataFrame(data=data, columns=column_names)
-                    df = pd.concat([df, temp])
-
+            layout[file] = scan_file(file, variable)
         except Exception as e:
             print(e)
             print('Error exporting file: {}'.format(file))
-            continue
+    if not layout:
+        return pd.DataFrame()
+
+    # profiles are regridded onto the common grid, other data must agree with the first file on the number of columns
+    first = next(iter(layout.values()))
+    _, columns, dims, dtype, altitude = first
+    if altitude is not None:
+        grid = np.asarray(grid, dtype=float) if grid is not None else altitude
+        columns = len(grid)
+    else:
+        grid = None
+    for file, (_, n, _, _, alt) in list(layout.items()):
+        if (alt is None) != (grid is None) or (grid is None and n != columns):
+            print('Error exporting file: {} has {} columns, expected {}'.format(file, n, columns))
+            del layout[file]
+    files = list(layout)
+    starts = np.concatenate(([0], np.cumsum([layout[file][0] for file in files])))
+
+    # preallocate the output, integer data is stored as float so masked values can be nan
+    dtype = np.dtype(dtype if np.issubdtype(dtype, np.floating) else np.float64)
+    shape = (int(starts[-1]), columns)
+    timed = 'time' in dims[:2]
+    if workers == 1 or len(files) == 1:
+        out = np.full(shape, np.nan, dtype=dtype)
+        times = np.full(shape[0], np.nan) if timed else None
+        ok = []
+        for file, start in zip(files, starts):
+            try:
+                read_into(file, variable, out, times, start, grid)
+                ok.append(True)
+            except Exception as e:
+                print(e)
+                print('Error exporting file: {}'.format(file))
+                ok.append(False)
+            if progress is not None:
+                progress(file)
+    else:
+        size = shape[0] * columns * dtype.itemsize + (shape[0] * 8 if timed else 0)
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            shared = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            shared.fill(np.nan)
+            if timed:
+                np.ndarray(shape[0], dtype=float, buffer=shm.buf, offset=shared.nbytes).fill(np.nan)
+            n = len(files)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(read_shared, files, [variable] * n, [shm.name] * n, [shape] * n,
+                                   [dtype] * n, [timed] * n, starts[:-1], [grid] * n)
+                ok = []
+                try:
+                    for file, result in zip(files, results):
+                        ok.append(result)
+                        if progress is not None:
+                            progress(file)
+                except BaseException:
+                    # do not start the remaining files, ex. when progress cancels the read
+                    pool.shutdown(cancel_futures=True)
+                    raise
+            # copy out of shared memory before it is released
+            out = shared.copy()
+            times = np.ndarray(shape[0], dtype=float, buffer=shm.buf, offset=shared.nbytes).copy() if timed else None
+            del shared
         finally:
-            f.close()
-
-    # rename index
-    if dims[0] == 'time':
-        df.index.rename('time', inplace=True)
-    # if dims[1] is time flip data
-    # TODO more testing
-    if len(dims) > 1 and dims[1] == 'time':
-        df = df.transpose()
-        df.set_index(time, inplace=True)
+            shm.close()
+            shm.unlink()
+
+    # drop the rows of files that failed to read
+    if not all(ok):
+        keep = np.repeat(ok, np.diff(starts))
+        out = out[keep]
+        times = times[keep] if times is not None else None
+
+    # column naming
+    column_names = [str(x) for x in range(columns)] if len(dims) > 1 else [variable]
+    df = pd.DataFrame(data=out, index=times, columns=column_names)
+    if times is not None:
         df.index.rename('time', inplace=True)
+    if grid is not None:
+        df.attrs['altitude'] = grid
+    return df
 
+def export(filename, files, variable, grid=None):
+    """
+    Export data to csv file, or to a netCDF4 file if filename ends in .nc4 (see write_netcdf)
+    Uses current data directory to save csv file
+    
+    Args:
+        filename (str): name of output csv file
+        files (list): list of full file paths
+        variable (str): name of variable to export
+        grid (numpy.ndarray): altitude grid (km) profiles are regridded onto (default: None, the first file's altitude)
+    
+    Returns:
+        None
+    """
+
+    # handle case if file already exists
+    if os.path.isfile(filename):
+        # remove file
+        os.remove(filename)
 
     # export to csv
-    df.to_csv(filename, header=True)
+    if os.path.splitext(filename)[1] in ('.nc4', '.nc'):
+        df = read_files(files, variable, grid=grid)
+        if df.index.name == 'time':
+            df.index = pd.DatetimeIndex(julian_to_datetime(df.index).astype('datetime64[ns]'), name='time')
+        if 'altitude' in df.attrs:
+            df.columns = altitude_labels(df.attrs['altitude'])
+        write_netcdf(df, filename, files, variable)
+    else:
+        read_files(files, variable, grid=grid).to_csv(filename, header=True)
 
-def create_export_name(selectedVars, variable):
+def create_export_name(selectedVars, variable, fmt='csv'):
     """
     Create name for export file
     
     Args:
         selectedVars (object): object containing selected variables
         variable (str): name of variable to export
+        fmt (str): file extension, 'csv' or 'nc4' (default: 'csv')
 
     Returns:
         filename (str): name of export file
@@ -927,11 +1274,11 @@ def create_export_name(selectedVars, variable):
 
     level_range = selectedVars.selectedLevel[0]
     # create filename
-    filename = '{}_{}_{}_{}_{}.csv'.format(variable.upper(), level_range, year_range, month_range, day_range)
+    filename = '{}_{}_{}_{}_{}.{}'.format(variable.upper(), level_range, year_range, month_range, day_range, fmt)
 
     return filename
 
-def returnDF(filename, files, variable):
+def returnDF(filename, files, variable, grid=None, progress=None):
     """
     Returns pandas DataFrame wtih data from all files
     
@@ -939,111 +1286,22 @@ def returnDF(filename, files, variable):
         filename (str): name of output csv file
         files (list): list of full file paths
         variable (str): name of variable to export
-    
+        grid (numpy.ndarray): altitude grid (km) profiles are regridded onto (default: None, the first file's altitude)
+        progress (callable): Called with the file path as each file is read (default: None)
+
     Returns:
         Pandas DataFrame
     """
 
-    # test if all files in files exist
-    # if not, remove from list
-    files = [x for x in files if os.path.isfile(x)]
-
     # handle case if file already exists
     if os.path.isfile(filename):
         # remove file
         os.remove(filename)
 
-    # create empty dataframe
-    df = pd.DataFrame()
-
-    # loop through files
-    # TODO: Error handling for variables that do not include time
-    for file in files:
-        try:
-            # open file
-            f = nc.Dataset(file, 'r')
-            # get time
-            time = f.variables['time'][:]
-            # get altitude
-            altitude = f.variables['altitude'][:]
-
-            # get data
-            data = None
-            # Omit wavelength data as it is static, always 532 nm (green)
-            # Check if wavelength data is present
-            dims = list(f.variables[variable].dimensions)
-            if len(dims) == 3:
-                for num, dim in enumerate(dims):
-                    if dim == 'wavelength':
-                        if num == 0:
-                            data = f.variables[variable][0, :, :]
-                            dims = dims[1:]
-                        elif num == 1:
-                            data = f.variables[variable][:, 0, :]
-                            dims = dims[0] + dims[2:]
-                        elif num == 2:
-                            data = f.variables[variable][:, :, 0]
-                            dims = dims[:-1]
-                    else:
-                        if data is None:
-                            data = f.variables[variable][:]
-            elif len(dims) == 2:
-                for num, dim in enumerate(dims):
-                    if dim == 'wavelength':
-                        if num == 0:
-                            data = f.variables[variable][0, :]
-                            dims.pop(0)
-                        if num == 1:
-                            data = f.variables[variable][:, 0]
-                            dims.pop(1)
-                    else: 
-                        if data is None:
-                            data = f.variables[variable][:]
-            else: # only 1 diminsion
-                data = f.variables[variable][:]
-
-            # column naming
-            if (len(data.shape) == 2):
-                column_names = [str(x) for x in range(data.shape[1])]
-            else:
-                column_names = [variable]
-
-            # add to dataframe
-            if (df.empty == True):
-                # only assign time if time if time is present
-                if 'time' == dims[0]:
-                    df = pd.DataFrame(data=data, index=time, columns=column_names)
-                else:
-                    df = pd.DataFrame(data=data, columns=column_names)
-            else:
-                if 'time' == dims[0]:
-                    temp = pd.DataFrame(data=data, index=time, columns=column_names)
-                    df = pd.concat([df, temp])
-                else:
-                    temp = pd.DataFrame(data=data, columns=column_names)
-                    df = pd.concat([df, temp])
-
-        except Exception as e:
-            print(e)
-            print('Error exporting file: {}'.format(file))
-            continue
-        finally:
-            f.close()
-
-    # rename index
-    if dims[0] == 'time':
-        df.index.rename('time', inplace=True)
-    # if dims[1] is time flip data
-    # TODO more testing
-    if len(dims) > 1 and dims[1] == 'time':
-        df = df.transpose()
-        df.set_index(time, inplace=True)
-        df.index.rename('time', inplace=True)
-
     # return the dataframe
-    return df
+    return read_files(files, variable, grid=grid, progress=progress)
 
-def MinuteAvg(filename, files, variable):
+def MinuteAvg(filename, files, variable, grid=None, progress=None):
     """
     Returns initial dataframe formatted the same as the hr and day avg dataframes as data is already in minute bins.
     If the data is 3D/altitude based the column headers are the altitudes in km.
@@ -1053,38 +1311,439 @@ def MinuteAvg(filename, files, variable):
         filename (str): name of output csv file of the data
         files (str): list of full file paths
         variable (str): name of the variable selected
+        grid (numpy.ndarray): altitude grid (km) profiles are regridded onto (default: None, the first file's altitude)
+        progress (callable): Called with the file path as each file is read (default: None)
 
     Returns:
         Pandas DataFrame
     """
     #create a dataframe of the data
-    df = returnDF(filename, files, variable)
-
-    #Makes an array of the altitudes 
-    alt_arr = np.linspace(1.1549481, 31.059248, 400)
-    alt_arr_str = ['']*400
+    df = returnDF(filename, files, variable, grid, progress)
 
     #convert julian time indeces to pandas datetime rounded to the second
     time_min = pd.to_datetime(df.index, unit = 'D', origin = 'julian').round(freq='s')
     if (variable == 'cloud_base' or variable == 'cloud_top'): 
         #if cld_base or cld_top, change to a 1 column array of 1s and 0s, 1 if there is a cloud and 0 if there is not a cloud.
-        df = df.drop(df.iloc[:, 1:], axis=1)
-        df.loc[~df['0'].isna(), '0'] = 1
-        df.loc[df['0'].isna(), '0'] = 0
-        df.columns = [variable]
-    elif len(df.columns) == 400:
-        #if the dataframe is instead 400 columns this indicates 3D data with altitude bins at each time.
-        #This just makes an array of altitude strings for the column headers
-        for i in range(len(alt_arr)):
-            alt_arr_str[i] = '{:.3f}'.format(alt_arr[i])+' km'
-        df.columns = alt_arr_str
+        df = pd.DataFrame({variable: df.iloc[:, 0].notna().to_numpy(dtype=float)}, index=df.index)
+    elif 'altitude' in df.attrs:
+        #profile data has an altitude bin at each time, the column headers are the altitudes of the grid
+        df.columns = altitude_labels(df.attrs['altitude'])
         
     df.set_index(time_min, inplace=True) #sets the index to the time
     df.index.rename('time', inplace=True) #renames index header to "time"
-    df.dropna(how='all', axis = 'columns', inplace = True) #drops all empty columns
-    return df
+    return drop_empty_columns(df)
+    
+def drop_empty_columns(df):
+    """
+    Drops the columns without any values, df.attrs['altitude'] keeps the altitude of the remaining profile columns
+    
+    Args:
+        df (Pandas DataFrame): The data, profile columns labeled by altitude ('1.155 km')
+    
+    Returns:
+        Pandas DataFrame
+    """
+
+    keep = df.notna().any(axis=0).to_numpy()
+    profile = np.array([str(c).endswith(' km') for c in df.columns], dtype=bool)
+    altitude = df.attrs.get('altitude')
+    out = df.loc[:, keep]
+    if altitude is not None and len(altitude) == profile.sum():
+        out.attrs['altitude'] = np.asarray(altitude)[keep[profile]]
+    else:
+        out.attrs.pop('altitude', None)
+    return out
+
+def write_netcdf(df, filename, files, variable, chunk_times=1440, complevel=4):
+    """
+    Writes an exported DataFrame to a chunked, compressed netCDF4 file
+    Time and altitude are coordinate variables, the attributes of the variable and of the
+    altitude in the first source file are copied, so slices can be read lazily with netCDF4 or xarray
+    Profile columns are written as one (time, altitude) variable, other columns as time series
+    
+    Args:
+        df (Pandas DataFrame): The data indexed by time, see MinuteAvg, HrAvg and DayAvg
+        filename (str): name of output netCDF4 file
+        files (list): list of full file paths the data was read from
+        variable (str): name of the variable exported
+        chunk_times (int): number of times in one chunk, one day of minutes by default (default: 1440)
+        complevel (int): zlib compression level from 1 to 9 (default: 4)
+    
+    Returns:
+        None
+    """
+
+    if not isinstance(df.index, pd.DatetimeIndex):
+        raise ValueError('Only data indexed by time can be written to netCDF4, {} has no time dimension'.format(variable))
+    source = next((x for x in files if os.path.isfile(x)), None)
+    attrs, alt_attrs = {}, {}
+    if source is not None:
+        with nc.Dataset(source, 'r') as f:
+            # values are written as unpacked floats with nan as the fill value
+            skip = ('_FillValue', 'missing_value', 'scale_factor', 'add_offset')
+            if variable in f.variables:
+                attrs = {k: f.variables[variable].getncattr(k) for k in f.variables[variable].ncattrs() if k not in skip}
+            if 'altitude' in f.variables:
+                alt_attrs = {k: f.variables['altitude'].getncattr(k) for k in f.variables['altitude'].ncattrs() if k not in skip}
+
+    profile = [c for c in df.columns if str(c).endswith(' km')]
+    altitude = df.attrs.get('altitude')
+    if profile and (altitude is None or len(altitude) != len(profile)):
+        altitude = np.array([float(str(c).split()[0]) for c in profile])
+    seconds = (df.index.to_numpy().astype('datetime64[s]') - np.datetime64('1970-01-01T00:00:00', 's')).astype(np.int64)
+    chunk = max(min(chunk_times, len(df)), 1)
+
+    # handle case if file already exists
+    if os.path.isfile(filename):
+        os.remove(filename)
+    with nc.Dataset(filename, 'w', format='NETCDF4') as f:
+        f.setncattr('Conventions', 'CF-1.8')
+        f.setncattr('title', 'MPLNET ' + variable + ' export')
+        f.setncattr('source', ', '.join(os.path.basename(x) for x in files))
+
+        f.createDimension('time', len(df))
+        time = f.createVariable('time', 'i8', ('time',), zlib=True, complevel=complevel, chunksizes=(chunk,))
+        time.setncattr('units', 'seconds since 1970-01-01 00:00:00')
+        time.setncattr('standard_name', 'time')
+        time[:] = seconds
+
+        if profile:
+            f.createDimension('altitude', len(profile))
+            alt = f.createVariable('altitude', 'f4', ('altitude',))
+            alt.setncatts(alt_attrs)
+            alt.setncattr('units', alt_attrs.get('units', 'km'))
+            alt[:] = altitude
+            var = f.createVariable(variable, 'f4', ('time', 'altitude'), zlib=True, shuffle=True,
+                                   complevel=complevel, chunksizes=(chunk, len(profile)), fill_value=np.float32(np.nan))
+            var.setncatts(attrs)
+            var[:] = df[profile].to_numpy(dtype=np.float32)
+
+        for column in df.columns:
+            if column in profile:
+                continue
+            name = str(column)
+            var = f.createVariable(name, 'f4', ('time',), zlib=True, shuffle=True,
+                                   complevel=complevel, chunksizes=(chunk,), fill_value=np.float32(np.nan))
+            if name == variable:
+                var.setncatts(attrs)
+            var[:] = df[column].to_numpy(dtype=np.float32)
+
+def save_export(df, filename, files, variable):
+    """
+    Writes an exported DataFrame, the format follows the extension of filename:
+    .nc4 or .nc for netCDF4 (see write_netcdf), anything else for csv
+    
+    Args:
+        df (Pandas DataFrame): The data indexed by time
+        filename (str): name of output file
+        files (list): list of full file paths the data was read from
+        variable (str): name of the variable exported
+    
+    Returns:
+        None
+    """
+
+    if os.path.splitext(filename)[1] in ('.nc4', '.nc'):
+        write_netcdf(df, filename, files, variable)
+    else:
+        df.to_csv(filename, header=True)
+
+def julian_to_datetime(jd):
+    """
+    Converts julian days to datetimes rounded to the second
+    Same result as pd.to_datetime(jd, unit='D', origin='julian').round(freq='s') without building a DatetimeIndex
+    
+    Args:
+        jd (numpy.ndarray): julian days
+    
+    Returns:
+        numpy.ndarray of datetime64[s]
+    """
+
+    # 2440587.5 is the julian day of the unix epoch
+    return np.round((np.asarray(jd, dtype=float) - 2440587.5) * 86400).astype('datetime64[s]')
+
+def read_variable(file, variable):
+    """
+    Returns the times and values of a variable in one file, time first
+    Masked values are nan and the wavelength dimension is removed
     
-def HrAvg(filename, files, variable):
+    Args:
+        file (str): full file path
+        variable (str): name of variable
+    
+    Returns:
+        times (numpy.ndarray): datetime64[s] times, None if the variable has no time dimension
+        values (numpy.ndarray): float values with shape (rows, columns)
+    """
+
+    with nc.Dataset(file, 'r') as f:
+        var = f.variables[variable]
+        key, dims = variable_layout(var)
+        data = var[key]
+        if len(dims) > 1 and dims[1] == 'time':
+            data = data.T
+        values = np.ma.filled(np.ma.asarray(data, dtype=float), np.nan).reshape(data.shape[0], -1)
+        times = None
+        if 'time' in dims[:2]:
+            times = julian_to_datetime(np.ma.filled(f.variables['time'][:].astype(float), np.nan))
+    return times, values
+
+def read_altitude(file):
+    """
+    Returns the altitude (km) of each bin in one file, None if the file has no altitude variable
+    """
+
+    with nc.Dataset(file, 'r') as f:
+        if 'altitude' not in f.variables:
+            return None
+        return np.ma.filled(np.ma.asarray(f.variables['altitude'][:], dtype=float), np.nan).ravel()
+
+def cloud_file(file, fileType='CLD'):
+    """
+    Returns the path of the file of another type for the same day, ex. the CLD file of a NRB file
+    """
+
+    folder, name = os.path.split(file)
+    parts = name.split('_')
+    parts[3] = fileType
+    return os.path.join(folder, '_'.join(parts))
+
+def cloud_info(times, file, mask_variable='cloud_base', fileType='CLD'):
+    """
+    Returns which profiles have a cloud and the lowest cloud base of each profile,
+    read from the cloud file of the same day
+    Profiles are matched to the cloud retrieval within 30 seconds, unmatched profiles count as cloudy
+    
+    Args:
+        times (numpy.ndarray): datetime64 times of the profiles
+        file (str): full path of the data file
+        mask_variable (str): 'cloud_base' or 'cloud_top' where any valid value marks a cloud,
+            or 'cloud_mask' where any bin above 0 is cloud (default: 'cloud_base')
+        fileType (str): file type holding the cloud variable (default: 'CLD')
+    
+    Returns:
+        cloudy (numpy.ndarray): True for the profiles with a cloud
+        base (numpy.ndarray): lowest cloud base (km), nan when clear and -inf when unmatched
+        None if the cloud file does not exist
+    """
+
+    path = cloud_file(file, fileType)
+    if not os.path.isfile(path):
+        return None
+    cloud_times, cloud = read_variable(path, mask_variable)
+    if mask_variable == 'cloud_mask':
+        flagged = np.nan_to_num(cloud) > 0
+        cloudy = flagged.any(axis=1)
+        altitude = read_altitude(path)
+        base = np.where(cloudy, altitude[np.argmax(flagged, axis=1)], np.nan)
+    else:
+        cloudy = (~np.isnan(cloud)).any(axis=1)
+        base = np.where(cloudy, np.nanmin(np.where(np.isnan(cloud), np.inf, cloud), axis=1), np.nan)
+
+    order = np.argsort(cloud_times)
+    cloud_times, cloudy, base = cloud_times[order], cloudy[order], base[order]
+    # nearest cloud retrieval, either the one before or the one after each profile
+    after = np.clip(np.searchsorted(cloud_times, times), 0, len(cloud_times) - 1)
+    before = np.clip(after - 1, 0, len(cloud_times) - 1)
+    i = np.where(np.abs(cloud_times[before] - times) < np.abs(cloud_times[after] - times), before, after)
+    matched = np.abs(cloud_times[i] - times) <= np.timedelta64(30, 's')
+    return ~matched | cloudy[i], np.where(matched, base[i], -np.inf)
+
+def reduce_file(file, variable, freq, clear_sky=None, grid=None, mask_variable='cloud_base'):
+    """
+    Returns the sum and count of a variable in every time bin for one file
+    cloud_base and cloud_top become 1 for a cloud and 0 for no cloud so the mean is the cloud fraction
+    
+    Args:
+        file (str): full file path
+        variable (str): name of variable
+        freq (str): 'h' for hourly or 'D' for daily bins
+        clear_sky (str): None to average every minute, 'profile' to drop cloudy minutes or
+            'below_base' to drop the bins at and above the cloud base, cloud data is read
+            from the CLD file of the same day (default: None)
+        grid (numpy.ndarray): altitude grid (km) profiles are regridded onto (default: None, as stored)
+        mask_variable (str): cloud variable marking the cloudy minutes, see cloud_info (default: 'cloud_base')
+    
+    Returns:
+        bins (numpy.ndarray): start of each time bin as datetime64[s]
+        sums (numpy.ndarray): sum of the valid values with shape (bins, columns)
+        counts (numpy.ndarray): number of valid values with shape (bins, columns)
+            with clear_sky the last column holds the clear minutes (sum) of all minutes (count)
+    """
+
+    times, values = read_variable(file, variable)
+    if times is None:
+        raise ValueError('{} has no time dimension'.format(variable))
+
+    if variable == 'cloud_base' or variable == 'cloud_top':
+        values = (~np.isnan(values[:, :1])).astype(float)
+
+    if clear_sky is not None:
+        info = cloud_info(times, file, mask_variable)
+        if info is None:
+            raise FileNotFoundError('No cloud file for {}'.format(file))
+        cloudy, base = info
+        if clear_sky == 'profile':
+            values[cloudy] = np.nan
+        elif clear_sky == 'below_base':
+            altitude = file_altitude(file, variable)
+            if altitude is None:
+                raise ValueError("clear_sky='below_base' needs a profile variable, {} has no altitude dimension".format(variable))
+            values[altitude[None, :values.shape[1]] >= base[:, None]] = np.nan
+        else:
+            raise ValueError("clear_sky must be None, 'profile' or 'below_base'")
+
+    if grid is not None:
+        altitude = file_altitude(file, variable)
+        if altitude is not None:
+            values = regrid(values, altitude, grid)
+
+    if clear_sky is not None:
+        values = np.column_stack([values, (~cloudy).astype(float)])
+
+    # sum each bin with one pass over the rows sorted by bin
+    bins = times.astype('datetime64[' + freq + ']').astype('datetime64[s]')
+    order = np.argsort(bins, kind='stable')
+    bins, values = bins[order], values[order]
+    starts = np.flatnonzero(np.concatenate(([True], bins[1:] != bins[:-1])))
+    valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(valid, values, 0), starts, axis=0)
+    counts = np.add.reduceat(valid.astype(np.int64), starts, axis=0)
+    return bins[starts], sums, counts
+
+def merge_reductions(parts):
+    """
+    Merges the per file sums and counts from reduce_file
+    
+    Args:
+        parts (list): (bins, sums, counts) tuples
+    
+    Returns:
+        bins (numpy.ndarray): sorted unique bins
+        sums (numpy.ndarray): summed sums
+        counts (numpy.ndarray): summed counts
+    """
+
+    bins = np.concatenate([p[0] for p in parts])
+    bins, inverse = np.unique(bins, return_inverse=True)
+    sums = np.zeros((len(bins), parts[0][1].shape[1]))
+    counts = np.zeros((len(bins), parts[0][1].shape[1]), dtype=np.int64)
+    np.add.at(sums, inverse, np.concatenate([p[1] for p in parts]))
+    np.add.at(counts, inverse, np.concatenate([p[2] for p in parts]))
+    return bins, sums, counts
+
+def try_reduce_file(file, variable, freq, clear_sky=None, grid=None, mask_variable='cloud_base'):
+    """
+    Returns reduce_file(file, variable, freq, clear_sky, grid, mask_variable), or None after printing the error if the file can not be read
+    """
+
+    try:
+        return reduce_file(file, variable, freq, clear_sky, grid, mask_variable)
+    except Exception as e:
+        print(e)
+        print('Error exporting file: {}'.format(file))
+        return None
+
+def stream_average(files, variable, freq, workers=4, clear_sky=None, grid=None, progress=None, mask_variable='cloud_base'):
+    """
+    Returns a time averaged pandas DataFrame, reading one file at a time
+    Each file is reduced to sums and counts per time bin and altitude bin so memory
+    grows with the number of output bins, not the number of minutes
+    
+    Args:
+        files (list): list of full file paths
+        variable (str): name of the variable selected
+        freq (str): 'h' for hourly or 'D' for daily averages
+        workers (int): number of files reduced at once, 1 reduces in this process (default: 4)
+        clear_sky (str): None, 'profile' or 'below_base', see reduce_file (default: None)
+        grid (numpy.ndarray): altitude grid (km) profiles are regridded onto (default: None, the first file's altitude)
+        progress (callable): Called with the file path as each file is reduced, an exception it raises
+            stops the files not started yet (default: None)
+        mask_variable (str): 'cloud_base', 'cloud_top' or 'cloud_mask', see cloud_info (default: 'cloud_base')
+    
+    Returns:
+        Pandas DataFrame indexed by time with every bin between the first and last,
+        with clear_sky a 'clear_sky_fraction' column holds the fraction of clear minutes in each bin
+    
+    Raises:
+        ValueError: for an unknown clear_sky or mask_variable, or 'below_base' on a variable that is not a profile
+    """
+
+    # check the screening before any file is reduced, errors in the workers only skip the file
+    if clear_sky not in (None, 'profile', 'below_base'):
+        raise ValueError("clear_sky must be None, 'profile' or 'below_base'")
+    if mask_variable not in ('cloud_base', 'cloud_top', 'cloud_mask'):
+        raise ValueError("mask_variable must be 'cloud_base', 'cloud_top' or 'cloud_mask'")
+
+    # test if all files in files exist
+    # if not, remove from list
+    files = [x for x in files if os.path.isfile(x)]
+
+    # profiles on other grids are regridded onto the common grid
+    altitude = common_grid(files, variable)
+    if clear_sky == 'below_base' and files and altitude is None:
+        raise ValueError("clear_sky='below_base' needs a profile variable, {} has no altitude dimension".format(variable))
+    grid = np.asarray(grid, dtype=float) if grid is not None else altitude
+    args = (files, [variable] * len(files), [freq] * len(files), [clear_sky] * len(files), [grid] * len(files),
+            [mask_variable] * len(files))
+    parts = []
+    if workers == 1 or len(files) <= 1:
+        for file, part in zip(files, map(try_reduce_file, *args)):
+            parts.append(part)
+            if progress is not None:
+                progress(file)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            try:
+                for file, part in zip(files, pool.map(try_reduce_file, *args)):
+                    parts.append(part)
+                    if progress is not None:
+                        progress(file)
+            except BaseException:
+                # do not start the remaining files, ex. when progress cancels the average
+                pool.shutdown(cancel_futures=True)
+                raise
+    parts = [p for p in parts if p is not None]
+    if not parts:
+        return pd.DataFrame()
+
+    # files that disagree with the first on the number of columns are skipped
+    columns = parts[0][1].shape[1]
+    parts = [p for p in parts if p[1].shape[1] == columns]
+    bins, sums, counts = merge_reductions(parts)
+
+    # every bin from the first to the last as resample would return
+    step = np.timedelta64(1, freq).astype('timedelta64[s]')
+    index = np.arange(bins[0], bins[-1] + step, step)
+    mean = np.full((len(index), columns), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean[((bins - bins[0]) // step).astype(int)] = np.where(counts > 0, sums / counts, np.nan)
+
+    # the clear minute fraction rides along as the last column
+    clear = None
+    if clear_sky is not None:
+        clear, mean, columns = mean[:, -1], mean[:, :-1], columns - 1
+
+    #the column headers of profile data are the altitudes of the grid
+    altitude = None
+    if (variable == 'cloud_base' or variable == 'cloud_top') or columns == 1:
+        column_names = [variable]
+    elif grid is not None and len(grid) == columns:
+        column_names = altitude_labels(grid)
+        altitude = grid
+    else:
+        column_names = [str(x) for x in range(columns)]
+
+    df = pd.DataFrame(mean, index=pd.DatetimeIndex(index.astype('datetime64[ns]'), name='time'), columns=column_names)
+    if altitude is not None:
+        df.attrs['altitude'] = altitude
+    df = drop_empty_columns(df) #drops all empty columns
+    if clear is not None:
+        df.insert(0, 'clear_sky_fraction', clear)
+    return df
+
+def HrAvg(filename, files, variable, grid=None, progress=None):
     """
     Returns an hourly averaged pandas DataFrame with the time as the index.
     If the data is 3D/altitude based the column headers are the altitudes in km.
@@ -1094,47 +1753,16 @@ def HrAvg(filename, files, variable):
         filename (str): name of output csv file of the data
         files (str): list of full file paths
         variable (str): name of the variable selected
+        grid (numpy.ndarray): altitude grid (km) profiles are regridded onto (default: None, the first file's altitude)
+        progress (callable): Called with the file path as each file is read (default: None)
 
     Returns:
         Pandas DataFrame
     """
-    #create a dataframe of the data
-    df = returnDF(filename, files, variable)
-
-    #Makes an array of the altitudes
-    alt_arr = np.linspace(1.1549481, 31.059248, 400)
-    alt_arr_str = ['']*400
-
-    #create array of Julian Day Numbers incremented by 1 hour starting at Midnight of the first selected day ending at 23:00 of final day
-    #might not need this line as the resample function might do it for you
-    df['Datetime'] = pd.to_datetime(df.index, unit = 'D', origin = 'julian').round(freq='s')
-
-    #makes the index of the dataframe the datetimes
-    df = df.set_index('Datetime')
-    if (variable == 'cloud_base' or variable == 'cloud_top'):
-        #if cld_base or cld_top, change to a 1 column array of 1s and 0s, 1 if there is a cloud and 0 if there is not a cloud. 
-        #hourly average will then show cloud density for that hour from 0-1
-        df = df.drop(df.iloc[:, 1:], axis=1)
-        df.loc[~df['0'].isna(), '0'] = 1
-        df.loc[df['0'].isna(), '0'] = 0
-        df.columns = [variable] #makes column header cloud base or cloud top
-    elif len(df.columns) == 400:
-        #if the dataframe is instead 400 columns this indicates 3D data with altitude bins at each time.
-        #This just makes an array of altitude strings for the column headers
-        for i in range(len(alt_arr)):
-            alt_arr_str[i] = '{:.3f}'.format(alt_arr[i])+' km'
-        df.columns = alt_arr_str
-    else:
-        #if neither of these things indicating non altitude based data and therefore 2d data, make the column header the variable
-        df.columns = [variable]
-
-    df = df.resample('h').mean() #take an hourly mean of the whole dataframe
-
-    df.index.rename('time', inplace=True) #renames the df index header to time
-    df.dropna(how='all', axis = 'columns', inplace = True) #drops all empty columns
-    return df
+    # accumulate hourly sums and counts file by file
+    return stream_average(files, variable, 'h', grid=grid, progress=progress)
 
-def DayAvg(filename, files, variable):
+def DayAvg(filename, files, variable, grid=None, progress=None):
     """
     Returns a daily averaged pandas DataFramewith the time as the index in pandas DateTime format.
     If the data is 3D/altitude based the column headers are the altitudes in km.
@@ -1144,41 +1772,35 @@ def DayAvg(filename, files, variable):
         filename (str): name of output csv file of the data
         files (str): list of full file paths
         variable (str): name of the variable selected
+        grid (numpy.ndarray): altitude grid (km) profiles are regridded onto (default: None, the first file's altitude)
+        progress (callable): Called with the file path as each file is read (default: None)
 
     Returns:
         Pandas DataFrame
     """
-    #create a dataframe of the data
-    df = returnDF(filename, files, variable)
-
-    #create an array of the altitudes to use as the headers of the final dataframe
-    alt_arr = np.linspace(1.1549481, 31.059248, 400)
-    alt_arr_str = ['']*400
-
-    #converts the julian day times to pandas datetime objects
-    df['Datetime'] = pd.to_datetime(df.index, unit = 'D', origin = 'julian').round(freq='s')
-
-    #create a dataframe with the first column of the dataframe as the datetimes
-    df = df.set_index('Datetime')
-    if (variable == 'cloud_base' or variable == 'cloud_top'):
-        #if cld_base or cld_top, change to a 1 column array of 1s and 0s, 1 if there is a cloud and 0 if there is not a cloud. 
-        #daily average will then show cloud density for that day from 0-1
-        df = df.drop(df.iloc[:, 1:], axis=1)
-        df.loc[~df['0'].isna(), '0'] = 1
-        df.loc[df['0'].isna(), '0'] = 0
-        df.columns = [variable]
-    elif len(df.columns) == 400:
-        #if the dataframe is instead 400 columns this indicates 3D data with altitude bins at each time.
-        #This just makes an array of altitude strings for the column headers
-        for i in range(len(alt_arr)):
-            alt_arr_str[i] = '{:.3f}'.format(alt_arr[i])+' km'
-        df.columns = alt_arr_str
-    else:
-        #if neither of these things indicating non altitude based data and therefore 2d data, make the column header the variable
-        df.columns = [variable]
+    # accumulate daily sums and counts file by file
+    return stream_average(files, variable, 'D', grid=grid, progress=progress)
 
-    df = df.resample('D').mean() #take a daily average of the whole dataframe
-     
-    df.index.rename('time', inplace=True) #rename the index header to 'time'
-    df.dropna(how='all', axis = 'columns', inplace = True) #drop all empty columns
-    return df
+def ClearSkyAvg(filename, files, variable, freq='h', clear_sky='profile', grid=None, progress=None, mask_variable='cloud_base'):
+    """
+    Returns a cloud screened average pandas DataFrame with the time as the index.
+    Cloudy minutes (or the bins at and above the cloud base) are left out using the CLD file
+    of each day and the fraction of clear minutes is reported for each time bin.
+    If the data is 3D/altitude based the column headers are the altitudes in km.
+    
+    Args:
+        filename (str): name of output csv file of the data
+        files (str): list of full file paths
+        variable (str): name of the variable selected
+        freq (str): 'h' for hourly or 'D' for daily averages (default: 'h')
+        clear_sky (str): 'profile' or 'below_base', see reduce_file (default: 'profile')
+        grid (numpy.ndarray): altitude grid (km) profiles are regridded onto (default: None, the first file's altitude)
+        progress (callable): Called with the file path as each file is read (default: None)
+        mask_variable (str): 'cloud_base', 'cloud_top' or 'cloud_mask', see cloud_info (default: 'cloud_base')
+
+    Returns:
+        Pandas DataFrame
+    """
+    # accumulate clear sky sums and counts file by file
+    return stream_average(files, variable, freq, clear_sky=clear_sky, grid=grid, progress=progress,
+                          mask_variable=mask_variable)
@@ -0,0 +1,260 @@
+# mplnetstats.py
+# Online masked mean, standard deviation and count of MPLNET altitude profiles
+# Welford accumulators (count, mean, M2) are kept per altitude bin and per grouping key
+# (season, month, hour of day) so multi-year climatologies are built in one streaming pass
+
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from mplnetpytools import read_variable, cloud_info, file_altitude, common_grid, regrid, altitude_labels
+
+SEASONS = np.array(['DJF', 'DJF', 'MAM', 'MAM', 'MAM', 'JJA', 'JJA', 'JJA', 'SON', 'SON', 'SON', 'DJF'])
+
+def group_keys(times, by):
+    """
+    Returns the grouping key of every time
+
+    Args:
+        times (numpy.ndarray): datetime64 times
+        by (str or list): 'season' (DJF, MAM, JJA, SON), 'month', 'hour', 'year' or 'all',
+            a list combines keys, ex. ['season', 'hour']
+
+    Returns:
+        list: one key per time, a tuple when by is a list
+    """
+
+    times = np.asarray(times, dtype='datetime64[s]')
+    parts = []
+    for b in ([by] if isinstance(by, str) else by):
+        if b == 'season':
+            parts.append(SEASONS[times.astype('datetime64[M]').astype(int) % 12])
+        elif b == 'month':
+            parts.append(times.astype('datetime64[M]').astype(int) % 12 + 1)
+        elif b == 'hour':
+            parts.append(times.astype('datetime64[h]').astype(int) % 24)
+        elif b == 'year':
+            parts.append(times.astype('datetime64[Y]').astype(int) + 1970)
+        elif b == 'all':
+            parts.append(np.full(len(times), 'all'))
+        else:
+            raise ValueError("by must be 'season', 'month', 'hour', 'year' or 'all', not {}".format(b))
+    if isinstance(by, str):
+        return parts[0].tolist()
+    return list(zip(*[p.tolist() for p in parts]))
+
+class ProfileStats():
+    """
+    Welford accumulators of masked profile statistics per grouping key
+
+    Attributes:
+        by (str or list): grouping of the profiles, see group_keys
+        columns (list): altitude bin labels, set by the first update
+        count (dict): key -> number of valid values per bin
+        mean (dict): key -> running mean per bin
+        m2 (dict): key -> running sum of squared differences from the mean per bin
+
+    Methods:
+        update(times, values, mask): Adds a batch of profiles
+        merge(other): Adds the accumulators of another ProfileStats
+        profiles(ddof): Returns the mean, standard deviation and count profiles
+    """
+
+    def __init__(self, by='season', columns=None):
+        self.by = by
+        self.columns = columns
+        self.count = {}
+        self.mean = {}
+        self.m2 = {}
+
+    def _combine(self, key, n_b, mean_b, m2_b):
+        # Chan et al. parallel form of Welford's update, exact for any batch size
+        if key not in self.count:
+            self.count[key], self.mean[key], self.m2[key] = n_b, mean_b, m2_b
+            return
+        n_a, mean_a = self.count[key], self.mean[key]
+        n = n_a + n_b
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = np.where(n_b > 0, mean_b - mean_a, 0)
+            frac = np.where(n > 0, n_b / n, 0)
+        self.mean[key] = np.where(n_a > 0, mean_a + delta * frac, mean_b)
+        self.m2[key] = np.where(n_a > 0, self.m2[key] + m2_b + delta**2 * n_a * frac, m2_b)
+        self.count[key] = n
+
+    def update(self, times, values, mask=None):
+        """
+        Adds a batch of profiles, nan values are skipped
+
+        Args:
+            times (numpy.ndarray): datetime64 time of each profile
+            values (numpy.ndarray): profiles with shape (times, bins)
+            mask (numpy.ndarray): True where a profile (shape (times,)) or value (shape (times, bins))
+                is excluded, ex. cloudy profiles (default: None)
+
+        Returns:
+            None
+        """
+
+        values = np.asarray(values, dtype=float).reshape(len(values), -1)
+        valid = ~np.isnan(values)
+        if mask is not None:
+            mask = np.asarray(mask, dtype=bool)
+            valid &= ~(mask[:, None] if mask.ndim == 1 else mask)
+        if self.columns is None:
+            self.columns = list(range(values.shape[1]))
+        codes, keys = pd.factorize(pd.Series(group_keys(times, self.by), dtype=object))
+        for g, key in enumerate(keys):
+            rows = codes == g
+            v, ok = values[rows], valid[rows]
+            n_b = ok.sum(axis=0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean_b = np.where(n_b > 0, np.where(ok, v, 0).sum(axis=0) / n_b, 0)
+            m2_b = np.where(ok, (v - mean_b)**2, 0).sum(axis=0)
+            self._combine(key, n_b, mean_b, m2_b)
+
+    def merge(self, other):
+        """
+        Adds the accumulators of another ProfileStats, ex. from a parallel worker
+
+        Args:
+            other (ProfileStats): statistics with the same grouping and bins
+
+        Returns:
+            ProfileStats: self
+        """
+
+        if self.columns is None:
+            self.columns = other.columns
+        for key in other.count:
+            self._combine(key, other.count[key], other.mean[key], other.m2[key])
+        return self
+
+    def profiles(self, ddof=1):
+        """
+        Returns the statistics as DataFrames indexed by grouping key with one column per bin
+
+        Args:
+            ddof (int): delta degrees of freedom of the standard deviation,
+                1 matches pandas std, 0 matches numpy std (default: 1)
+
+        Returns:
+            mean (Pandas DataFrame): mean profiles
+            std (Pandas DataFrame): standard deviation profiles
+            count (Pandas DataFrame): number of values in each bin
+        """
+
+        keys = sorted(self.count)
+        if not keys:
+            # nothing accumulated, ex. no file could be read
+            empty = pd.DataFrame(index=pd.Index([], name=self.by if isinstance(self.by, str) else None),
+                                 columns=self.columns if self.columns is not None else [], dtype=float)
+            return empty, empty.copy(), empty.copy()
+        index = pd.MultiIndex.from_tuples(keys, names=self.by) if keys and isinstance(keys[0], tuple) \
+            else pd.Index(keys, name=self.by)
+        count = np.array([self.count[k] for k in keys]).reshape(len(keys), -1)
+        mean = np.array([self.mean[k] for k in keys]).reshape(len(keys), -1)
+        m2 = np.array([self.m2[k] for k in keys]).reshape(len(keys), -1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.where(count > ddof, np.sqrt(m2 / (count - ddof)), np.nan)
+        mean = np.where(count > 0, mean, np.nan)
+        return (pd.DataFrame(mean, index=index, columns=self.columns),
+                pd.DataFrame(std, index=index, columns=self.columns),
+                pd.DataFrame(count, index=index, columns=self.columns))
+
+def cloud_mask(times, file, mask_variable='cloud_base', fileType='CLD'):
+    """
+    Returns True for the profiles with a cloud, from the cloud file of the same day
+
+    Args:
+        times (numpy.ndarray): datetime64 times of the profiles
+        file (str): full path of the data file
+        mask_variable (str): cloud variable, see cloud_info (default: 'cloud_base')
+        fileType (str): file type holding the cloud variable (default: 'CLD')
+
+    Returns:
+        numpy.ndarray: boolean mask, None if the cloud file does not exist
+    """
+
+    info = cloud_info(times, file, mask_variable, fileType)
+    return info[0] if info is not None else None
+
+def accumulate_file(file, variable, by='season', mask_variable='cloud_base', valid_min=None, columns=None, grid=None):
+    """
+    Returns the ProfileStats of one file
+
+    Args:
+        file (str): full file path
+        variable (str): name of variable
+        by (str or list): grouping of the profiles, see group_keys (default: 'season')
+        mask_variable (str): cloud variable used to exclude cloudy profiles, None for no cloud mask (default: 'cloud_base')
+        valid_min (float): values at or below this are excluded, ex. -1 for NRB (default: None)
+        columns (list): altitude bin labels (default: None)
+        grid (numpy.ndarray): altitude grid (km) profiles are regridded onto (default: None, as stored)
+
+    Returns:
+        ProfileStats, None if the file or its cloud file can not be read
+    """
+
+    try:
+        times, values = read_variable(file, variable)
+        mask = None
+        if mask_variable is not None:
+            mask = cloud_mask(times, file, mask_variable)
+            if mask is None:
+                print('No cloud file for {}, skipped'.format(file))
+                return None
+        if valid_min is not None:
+            values = np.where(values > valid_min, values, np.nan)
+        if grid is not None:
+            altitude = file_altitude(file, variable)
+            if altitude is not None:
+                values = regrid(values, altitude, grid)
+        stats = ProfileStats(by, columns)
+        stats.update(times, values, mask)
+        return stats
+    except Exception as e:
+        print(e)
+        print('Error reading file: {}'.format(file))
+        return None
+
+def climatology(files, variable, by='season', mask_variable='cloud_base', valid_min=None, workers=4, ddof=1, grid=None):
+    """
+    Returns climatological mean and standard deviation profiles over many files in one pass
+    Each worker process accumulates its files and the partial results are merged
+
+    Args:
+        files (list): list of full file paths
+        variable (str): name of variable
+        by (str or list): grouping of the profiles, see group_keys (default: 'season')
+        mask_variable (str): cloud variable used to exclude cloudy profiles, None for no cloud mask (default: 'cloud_base')
+        valid_min (float): values at or below this are excluded (default: None)
+        workers (int): number of processes, 1 runs in this process (default: 4)
+        ddof (int): delta degrees of freedom of the standard deviation (default: 1)
+        grid (numpy.ndarray): altitude grid (km) profiles are regridded onto (default: None, the first file's altitude)
+
+    Returns:
+        mean, std, count (Pandas DataFrames), see ProfileStats.profiles
+    """
+
+    files = [x for x in files if os.path.isfile(x)]
+    n = len(files)
+    grid = np.asarray(grid, dtype=float) if grid is not None else common_grid(files, variable)
+    args = (files, [variable] * n, [by] * n, [mask_variable] * n, [valid_min] * n, [None] * n, [grid] * n)
+    stats = ProfileStats(by)
+    if workers == 1 or n <= 1:
+        for part in map(accumulate_file, *args):
+            if part is not None:
+                stats.merge(part)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(accumulate_file, *args, chunksize=max(1, n // (4 * workers))):
+                if part is not None:
+                    stats.merge(part)
+
+    # altitude labels as in the exported csv files
+    mean, std, count = stats.profiles(ddof)
+    if grid is not None and mean.shape[1] == len(grid):
+        mean.columns = std.columns = count.columns = altitude_labels(grid)
+    elif mean.shape[1] == 1:
+        mean.columns = std.columns = count.columns = [variable]
+    return mean, std, count
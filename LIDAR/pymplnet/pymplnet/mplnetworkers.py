@@ -0,0 +1,155 @@
+# mplnetworkers.py
+# Background jobs for the MPLNET GUI
+# Downloads and exports run on a QThreadPool so the window stays responsive,
+# per-file progress is sent back to the GUI thread with Qt signals
+
+import threading
+import traceback
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job when it is cancelled
+    """
+
+class JobSignals(QObject):
+    """
+    Signals of a Job, emitted from the worker thread and delivered on the GUI thread
+
+    Attributes:
+        progress (pyqtSignal): Progress text, ex. one line per file
+        finished (pyqtSignal): Text returned by the job when it completes
+        cancelled (pyqtSignal): Name of the job when it stops after a cancel
+        failed (pyqtSignal): Error text when the job raises
+    """
+
+    progress = pyqtSignal(str)
+    finished = pyqtSignal(str)
+    cancelled = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+class Job(QRunnable):
+    """
+    One queued operation, fn(job) runs on a pool thread
+
+    Attributes:
+        name (str): Name shown in the progress text
+        fn (callable): Called as fn(job), returns the text of the finished signal
+        signals (JobSignals): Signals of the job
+        cancel_event (threading.Event): Set when the job is cancelled
+
+    Methods:
+        report(text): Emits progress text
+        check(): Raises JobCancelled if the job was cancelled
+        cancel(): Cancels the job, a queued job never starts
+    """
+
+    def __init__(self, name, fn):
+        super().__init__()
+        # the queue keeps the reference, Qt must not delete the python object
+        self.setAutoDelete(False)
+        self.name = name
+        self.fn = fn
+        self.signals = JobSignals()
+        self.cancel_event = threading.Event()
+
+    def report(self, text):
+        self.signals.progress.emit(text)
+
+    def check(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.name)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            self.check()
+            result = self.fn(self)
+            self.check()
+            self.signals.finished.emit(result if result is not None else self.name + ' finished')
+        except JobCancelled:
+            self.signals.cancelled.emit(self.name)
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.failed.emit(self.name + ' failed: ' + str(e))
+
+class JobQueue(QObject):
+    """
+    Runs jobs in the order they are submitted on a QThreadPool
+
+    Attributes:
+        pool (QThreadPool): Threads the jobs run on, one by default so jobs queue behind each other
+        jobs (list): Jobs submitted and not yet done
+        message (pyqtSignal): Progress and completion text of every job
+        idle (pyqtSignal): Emitted when the last job is done
+
+    Methods:
+        submit(name, fn, finished, stopped): Queues fn(job), returns the Job
+        cancel(): Cancels the running and queued jobs
+        wait(): Blocks until every job is done
+    """
+
+    message = pyqtSignal(str)
+    idle = pyqtSignal()
+
+    def __init__(self, threads=1):
+        super().__init__()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(threads)
+        self.jobs = []
+
+    def submit(self, name, fn, finished=None, stopped=None):
+        """
+        Queues a job, it starts once the jobs before it are done
+
+        Args:
+            name (str): Name shown in the progress text
+            fn (callable): Called as fn(job) on a pool thread, see Job
+            finished (callable): Called on the GUI thread with the text of the finished job (default: None)
+            stopped (callable): Called on the GUI thread with the text of a cancelled or failed job (default: None)
+
+        Returns:
+            Job: The queued job
+        """
+
+        # connect before the job starts so no signal is missed
+        job = Job(name, fn)
+        if finished is not None:
+            job.signals.finished.connect(finished)
+        if stopped is not None:
+            job.signals.cancelled.connect(stopped)
+            job.signals.failed.connect(stopped)
+        job.signals.progress.connect(self.message)
+        job.signals.finished.connect(self.message)
+        job.signals.failed.connect(self.message)
+        job.signals.cancelled.connect(lambda name: self.message.emit(name + ' cancelled'))
+        for signal in (job.signals.finished, job.signals.failed, job.signals.cancelled):
+            signal.connect(lambda _, job=job: self._done(job))
+        self.jobs.append(job)
+        if len(self.jobs) > 1:
+            self.message.emit(name + ' queued behind ' + str(len(self.jobs) - 1) + ' job(s)')
+        self.pool.start(job)
+        return job
+
+    def _done(self, job):
+        if job in self.jobs:
+            self.jobs.remove(job)
+        if not self.jobs:
+            self.idle.emit()
+
+    def cancel(self):
+        """
+        Cancels the running job and every queued job
+        """
+
+        for job in self.jobs:
+            job.cancel()
+
+    def wait(self):
+        """
+        Blocks until every job is done
+        """
+
+        self.pool.waitForDone()
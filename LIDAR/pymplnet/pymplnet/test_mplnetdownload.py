@@ -0,0 +1,133 @@
+# test_mplnetdownload.py
+# DownloadManager against a local HTTP server that supports Range requests
+# Run with pytest from this folder, no MPLNET credentials are needed
+
+import os
+import threading
+import pytest
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from mplnetdownload import DownloadManager
+
+DATA = bytes(range(256)) * 40
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    Serves DATA at every path, /truncated closes the connection halfway through
+    the first response and /missing returns 404
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(DATA)))
+        self.end_headers()
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('Range')))
+        if self.path == '/missing':
+            self.send_error(404)
+            return
+        start = 0
+        if self.headers.get('Range'):
+            start = int(self.headers['Range'].split('=')[1].split('-')[0])
+        if start >= len(DATA):
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */%d' % len(DATA))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = DATA[start:]
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, len(DATA) - 1, len(DATA)))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.path == '/truncated' and not self.server.truncated:
+            self.server.truncated = True
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    httpd.requests = []
+    httpd.truncated = False
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def url(server, path):
+    return 'http://127.0.0.1:%d%s' % (server.server_address[1], path)
+
+def manager(**kwargs):
+    return DownloadManager(session=requests.Session(), backoff=0, **kwargs)
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def test_existing_file_is_skipped(server, tmp_path):
+    path = str(tmp_path / 'file.nc4')
+    with open(path, 'wb') as f:
+        f.write(b'old')
+    assert manager().download(url(server, '/file'), path) == 'exists'
+    assert read(path) == b'old'
+    assert server.requests == []
+
+def test_part_file_is_resumed(server, tmp_path):
+    path = str(tmp_path / 'file.nc4')
+    with open(path + '.part', 'wb') as f:
+        f.write(DATA[:1000])
+    assert manager().download(url(server, '/file'), path) == 'downloaded'
+    assert read(path) == DATA
+    assert not os.path.exists(path + '.part')
+    assert server.requests == [('/file', 'bytes=1000-')]
+
+def test_complete_part_file_is_kept_on_416(server, tmp_path):
+    path = str(tmp_path / 'file.nc4')
+    with open(path + '.part', 'wb') as f:
+        f.write(DATA)
+    assert manager().download(url(server, '/file'), path) == 'downloaded'
+    assert read(path) == DATA
+    assert len(server.requests) == 1
+
+def test_stale_part_file_is_restarted_on_416(server, tmp_path):
+    path = str(tmp_path / 'file.nc4')
+    with open(path + '.part', 'wb') as f:
+        f.write(DATA + b'stale')
+    assert manager().download(url(server, '/file'), path) == 'downloaded'
+    assert read(path) == DATA
+    assert server.requests == [('/file', 'bytes=%d-' % (len(DATA) + 5)), ('/file', None)]
+
+def test_truncated_response_is_retried(server, tmp_path):
+    path = str(tmp_path / 'file.nc4')
+    # small chunks so the half that arrived is on disk and the retry resumes from it
+    assert manager(chunk_size=1024).download(url(server, '/truncated'), path) == 'downloaded'
+    assert read(path) == DATA
+    assert server.requests == [('/truncated', None), ('/truncated', 'bytes=%d-' % (len(DATA) // 2))]
+
+def test_missing_file(server, tmp_path):
+    path = str(tmp_path / 'file.nc4')
+    assert manager().download(url(server, '/missing'), path) == 'missing'
+    assert not os.path.exists(path)
+
+def test_cancel_keeps_part_file(server, tmp_path):
+    path = str(tmp_path / 'file.nc4')
+    cancelled = threading.Event()
+    # cancel once the first chunk is written
+    m = manager(chunk_size=1024, cancelled=cancelled, progress=lambda p, done, total: cancelled.set())
+    assert m.download(url(server, '/file'), path) == 'cancelled'
+    assert not os.path.exists(path)
+    assert read(path + '.part') == DATA[:1024]
+
+    # a new manager resumes from the kept .part file
+    assert manager().download(url(server, '/file'), path) == 'downloaded'
+    assert read(path) == DATA
+    assert server.requests[-1] == ('/file', 'bytes=1024-')
@@ -12,19 +12,12 @@ from scipy.stats import linregress, pearsonr
 import matplotlib.pyplot as plt
 from scipy.optimize import least_squares as LSfit
 from AQS_ACSM_plot import line_call, hist_call,scat_call, box_call
+from fileLoader import load_files
 
 
 def AQS_CSVs_for_Reindexing(files,freq='W'):
-    aqs = pd.DataFrame()
-    for i in range(len(files)): #read in AQS files and combine
-        f = files[i]
-        file =pd.read_csv(f) #read in AQS file
-        file=file.set_index("Date(UTC)") #Set index
-        if i == 0:
-            aqs = file
-        else:
-            aqs = pd.concat([aqs,file])
-    aqs.index = pd.to_datetime(aqs.index)
+    #read in AQS files in parallel, rows are unique per date and site, overlaps keep the newest file
+    aqs, conflicts = load_files(files, "Date(UTC)", key_cols=['Position'])
     specs = ['NH4/total','EC/total','OC/total','SO4/total','NO3/total', 'Org/total']
     locs = aqs['Location'].unique()
     aqs['Org/total'] = aqs['OC/total']*2
@@ -54,16 +47,8 @@ def AQS_CSVs_for_Reindexing(files,freq='W'):
     return AQS_tot,specs
 
 def PM25_data(files,freq='W'):
-    aqs = pd.DataFrame()
-    for i in range(len(files)): #read in AQS files and combine
-        f = files[i]
-        file =pd.read_csv(f) #read in AQS file
-        file=file.set_index("Date(UTC)") #Set index
-        if i == 0:
-            aqs = file
-        else:
-            aqs = pd.concat([aqs,file])
-    aqs.index = pd.to_datetime(aqs.index)
+    #read in AQS files in parallel, rows are unique per date and site, overlaps keep the newest file
+    aqs, conflicts = load_files(files, "Date(UTC)", key_cols=['Position'])
     specs = ['PM2.5 [ug/m3 STP]']
     aqs = aqs[specs]
     aqs.columns = aqs.columns.str.replace('[ug/m3 STP]', '[ug/m3] AQS')
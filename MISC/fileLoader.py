@@ -0,0 +1,112 @@
+"""
+Date: 10/19/26
+Purpose: Shared multi-file csv loader. Files are read in parallel and concatenated once, time
+ranges that overlap between files are detected and duplicate timestamps are resolved by a
+declared rule so yearly or re-exported files never double count in a resample.
+"""
+
+"""IMPORTS"""
+import numpy as np
+import pandas as pd
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+rules = ['newest', 'average', 'error']
+
+def _read(f, index_cols, index_name):
+    file = pd.read_csv(f)
+    for idx in index_cols:
+        if idx in file.columns:
+            file = file.set_index(idx)
+            break
+    else:
+        raise KeyError(f'{f} has none of the index columns {index_cols}')
+    file.index = pd.to_datetime(file.index, format='mixed')
+    file.index = file.index.rename(index_name)
+    return file
+
+def load_files(files, index_cols, key_cols=None, rule='newest', workers=None, report=True):
+    '''
+    Reads csv files in parallel and returns one time sorted frame with a unique index.
+    Rows sharing a timestamp (and key_cols) are resolved by rule:
+    'newest' keeps the row from the most recently modified file (later in files on ties),
+    'average' averages the numeric columns and keeps the newest non numeric values,
+    'error' raises ValueError on any duplicate.
+    ----------
+
+    Parameters
+    ++++++++++
+    files : [list of str] Paths to csv files
+    index_cols : [str or list of str] Time column, or candidates tried in order; the index takes the first name
+    key_cols : [list of str] Columns that together with time identify a row, ex. ['Position'] (default = None)
+    rule : [str] 'newest', 'average' or 'error' (default = 'newest')
+    workers : [int] Number of reader threads (default = None)
+    report : [bool] Print the overlapping files and duplicate counts (default = True)
+
+    Returns
+    ++++++++++
+    data : [DataFrame] Combined data sorted by time, unique on time and key_cols
+    conflicts : [DataFrame] One row per overlapping pair of files with the overlap range and number of duplicates
+    '''
+    if rule not in rules:
+        raise ValueError(f'rule must be one of {rules}')
+    index_cols = [index_cols] if isinstance(index_cols, str) else list(index_cols)
+    key_cols = list(key_cols or [])
+    files = list(files)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        frames = list(pool.map(_read, files, [index_cols]*len(files), [index_cols[0]]*len(files)))
+
+    # file priority, newest modification time wins, list order breaks ties
+    mtimes = np.array([os.path.getmtime(f) for f in files])
+    priority = np.empty(len(files), dtype=int)
+    priority[np.lexsort((np.arange(len(files)), mtimes))] = np.arange(len(files))
+
+    # overlapping time ranges from each file's min/max
+    lo = np.array([fr.index.min() if len(fr) else pd.NaT for fr in frames], dtype='datetime64[ns]')
+    hi = np.array([fr.index.max() if len(fr) else pd.NaT for fr in frames], dtype='datetime64[ns]')
+    a, b = np.triu_indices(len(files), k=1)
+    over = (lo[a] <= hi[b]) & (lo[b] <= hi[a])
+    a, b = a[over], b[over]
+
+    data = pd.concat(frames)
+    name = data.index.name
+    # time, keys, source file and file priority of every row, kept apart from the data columns
+    keys = pd.DataFrame({name: data.index}).join(data[key_cols].reset_index(drop=True))
+    file_id = np.repeat(np.arange(len(frames)), [len(fr) for fr in frames])
+    dup = keys.duplicated(keep=False).to_numpy()
+
+    # duplicates per pair of files, counted on the first and last file holding each key
+    counts = {}
+    if dup.any():
+        pair = keys[dup].assign(_file=file_id[dup]).groupby(list(keys.columns))['_file'].agg(['min', 'max'])
+        counts = pair.groupby(['min', 'max']).size().to_dict()
+    conflicts = pd.DataFrame({'file_a': [files[i] for i in a], 'file_b': [files[j] for j in b],
+                              'overlap_start': np.maximum(lo[a], lo[b]), 'overlap_end': np.minimum(hi[a], hi[b]),
+                              'duplicates': [counts.get((i, j), 0) for i, j in zip(a, b)]})
+    within = sum(n for (i, j), n in counts.items() if i == j)
+    if report and (len(conflicts) or within):
+        for _, c in conflicts.iterrows():
+            print(f"Overlap {c['overlap_start']} to {c['overlap_end']}: {c['file_a']} and {c['file_b']}, "
+                  f"{c['duplicates']} duplicate timestamps, resolved by '{rule}'")
+        if within:
+            print(f"{within} timestamps duplicated within a single file, resolved by '{rule}'")
+
+    if dup.any() and rule == 'error':
+        raise ValueError(f'{int(dup.sum())} rows share a timestamp, see the conflicts printed above')
+
+    # sort by time and keys, lowest priority first so the newest file is last in every group
+    sort_by = [keys[c].to_numpy() for c in reversed(keys.columns)]
+    order = np.lexsort([priority[file_id]] + sort_by)
+    data, keys = data.iloc[order], keys.iloc[order]
+    if dup.any() and rule == 'newest':
+        data = data[~keys.duplicated(keep='last').to_numpy()]
+    elif dup.any():
+        cols = list(data.columns)
+        num = [c for c in data.select_dtypes('number').columns if c not in key_cols]
+        other = [c for c in cols if c not in num and c not in key_cols]
+        grouped = data.groupby([data.index] + [data[k] for k in key_cols], sort=True)
+        mean = grouped[num].mean()
+        data = (mean.join(grouped[other].last()) if other else mean).reset_index(level=key_cols)
+        data.index.name = name
+        data = data[cols]
+    return data, conflicts
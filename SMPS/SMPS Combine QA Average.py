@@ -16,6 +16,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 from pathlib import Path
 from datetime import datetime
+from smpsRollup import numeric_columns, build_pyramid, save_pyramid
 
 def main():
     
@@ -201,8 +202,7 @@ def AverageFile(DataDF,FilePath):
 
         #Takes the statistics, raw, and corrected data columns from the data to then be averaged
         #we do this so that you arnt trying to average N/A data, or text data
-        AllColumns = list(dataRaw.columns)                                      #lists all the columns
-        StatsHeaders = AllColumns[32:40] + AllColumns[41:500]                   #selects statistics columns, raw, and corrected data from the list
+        StatsHeaders = numeric_columns(dataRaw)                                 #selects every numeric column: statistics, raw, and corrected data
         print(StatsHeaders)
         dataRaw =  dataRaw[StatsHeaders]                                        #uses just the previously selected columns
         dataRaw.index = pd.to_datetime(dataRaw.index)                           #turn the index back into a date time object (this was undone some how previously)
@@ -218,9 +218,7 @@ def AverageFile(DataDF,FilePath):
 
                         #Takes the statistics, raw, and corrected data columns from the data to then be averaged
                         #we do this so that you arnt trying to average N/A data, or text data
-                        AllColumns = list(dataRaw.columns)                      #lists all the columns
-                        #StatsHeaders.append('DateTime Sample Averaged')        #COLUMNS NEED TO SHIFT OVER BY 1 ONCE WE ADD ERROR READING BAR IN QA
-                        StatsHeaders = AllColumns[33:41] + AllColumns[42:500]   #selects statistics columns, raw, and corrected data from the list
+                        StatsHeaders = numeric_columns(dataRaw)                 #selects every numeric column: statistics, raw, and corrected data
                         StatsHeaders.append('DateTime Sample Start')            #add the time stamps to the lis
                         dataRaw =  dataRaw[StatsHeaders]                        #uses just the previously selected columns   
                         dataRaw = dataRaw.set_index('DateTime Sample Start')    #now use the datetime object as the new index, this sorts the data by date
@@ -228,7 +226,13 @@ def AverageFile(DataDF,FilePath):
     #averages the data based on a user inputted time step                     
     StepSize = input('\nEnter a time step for the averaging.\n'                 #user inputs the desired time step
                      'To format the time step include a number followed by the unit of time, ex. 5h = 5 hours time step\n'
-                     's = seconds, min = minutes, h = hours, d = days, W = weeks, M = months\n')
+                     's = seconds, min = minutes, h = hours, d = days, W = weeks, M = months\n'
+                     'Enter rollup to save 5min, hourly, daily and monthly averages with counts all at once\n')
+    if StepSize == 'rollup':                                                    #build every level from one pass over the scans
+        folder = Path(input('\nEnter the folder to save the rollup files to.\n')) if FilePath == 'N' else FilePath.parent
+        stem = input('\nEnter the name prefix for the rollup files. DO NOT INCLUDE .CSV:\n')
+        save_pyramid(build_pyramid(dataRaw, cols=list(dataRaw.columns)), folder, stem, dataRaw.index.max())
+        return
     dataRaw = dataRaw.resample(StepSize).mean()                                 #averages the data over the designated time step
     print(dataRaw)                                                              #displays data so you can check its the timestep you wanted
 
@@ -1,39 +1,22 @@
 
-from ebas.io.file import nasa_ames
 from nilutility.datatypes import DataObject
-from ebas.domain.basic_domain_logic.time_period import estimate_period_code, \
-    estimate_resolution_code, estimate_sample_duration_code
+from SMPS_AMES_writer import read_metadata, write_yearly
 import datetime
-from ebas.io.ebasmetadata import DatasetCharacteristicList
 import pandas as pd
-import numpy
-def testnan(val):
-    if val * 0. == 0:
-        return val
-    else:
-        return None
+
 #INPUT DATA-VALUES
-#f = r'InputData_for_lev2.txt'
+f = r'InputData_for_lev2.txt'
 first_column=1 #(first column with variable to process) 
 last_column=217 # (last column to process)
 index_flag_col=218 #(nb column with flag data)
 tresol=60 #sample duration
-df=pd.read_csv(f, delimiter=',', header=0, engine='python')  #Specify nb_lines of header, delimiter etc
-df = df.where((pd.notnull(df)), None) #Replace nan values with None
-start_times_df=pd.to_datetime(df['DateTime'],format='%Y-%m-%d %H:%M:%S') #Specify format of datetime column to read. The column in called by the header name
-names=list(df.columns.values) 
-numb_col=df.shape[1]
 
-#INPUT METADATA_VARIABLES !!!! METADATA and INPUT FILES MUST HAVE THE SAME NUMBER OF COLUMNS AND IN THE SAME ORDER AND POSITION!!
+#INPUT METADATA_VARIABLES, data columns are matched to the metadata columns by name (or by position if the names differ)
 f_metadata=r'metadata_level2.csv'
-df_metadata=pd.read_csv(f_metadata, delimiter=',', header=0)
 
 #OUTPUT FOLDER
 destdir_out='.'
 
-
-
-
 __version__ = '1.00.00'
 
 def set_fileglobal_metadata(nas):
@@ -183,177 +166,25 @@ def set_fileglobal_metadata(nas):
     nas.metadata.acknowledgements='Request acknowledgment details from data originator'#not ready
     nas.metadata.comment='none'#not ready
 
-def set_time_axes(nas):
-    """
-    Set the time axes and related metadata for the EbasNasaAmes file object.
-
-    Parameters:
-        nas    EbasNasaAmes file object
-    Returns:
-        None
-    """
-    # define start and end times for all samples
-    start_times_list=start_times_df.tolist()
-    start_times_dt_list=[start_times_list[i].to_pydatetime()for i in range(len(start_times_list))]
-    end_times_df=start_times_df+datetime.timedelta(minutes=tresol)
-    end_times_list=end_times_df.tolist()
-    end_times_dt_list=[end_times_list[i].to_pydatetime()for i in range(len(start_times_list))]
-    nas.sample_times=list(zip(start_times_dt_list,end_times_dt_list))
-    #nas.sample_times = \
-    #    [(datetime.datetime(2008, 1, 1, 0, 0), datetime.datetime(2008, 1, 1, 1, 0)),
-    #     (datetime.datetime(2008, 1, 1, 1, 0), datetime.datetime(2008, 1, 1, 2, 0)),
-    #     (datetime.datetime(2008, 1, 1, 2, 0), datetime.datetime(2008, 1, 1, 3, 0)),
-    #     (datetime.datetime(2008, 1, 1, 3, 0), datetime.datetime(2008, 1, 1, 4, 0)),
-    #     (datetime.datetime(2008, 1, 1, 4, 0), datetime.datetime(2008, 1, 1, 5, 0)),
-    #     (datetime.datetime(2008, 1, 1, 5, 0), datetime.datetime(2008, 1, 1, 6, 0)),
-    #     (datetime.datetime(2008, 1, 1, 6, 0), datetime.datetime(2008, 1, 1, 7, 0)),
-    #     (datetime.datetime(2008, 1, 1, 7, 0), datetime.datetime(2008, 1, 1, 8, 0))]
-
-    #
-    # Generate metadata that are related to the time axes:
-    #
-
-    # period code is an estimate of the current submissions period, so it should
-    # always be calculated from the actual time axes, like this:
-    nas.metadata.period = estimate_period_code(nas.sample_times[0][0],
-                                               nas.sample_times[-1][1])
-
-    # Sample duration can be set automatically
-    nas.metadata.duration = estimate_sample_duration_code(nas.sample_times)
-    # or set it hardcoded:
-    # nas.metadata.duration = '3mo'
-
-    # Resolution code can be set automatically
-    # But be aware that resolution code is an identifying metadata element.
-    # That means, several submissions of data (multiple years) will
-    # only be stored as the same dataset if the resolution code is the same
-    # for all submissions!
-    # That might be a problem for time series with varying resolution code
-    # (sometimes 2 months, sometimes 3 months, sometimes 9 weeks, ...). You
-    # might consider using a fixed resolution code for those time series.
-    # Automatic calculation (will work from ebas.io V.3.0.7):
-    nas.metadata.resolution = estimate_resolution_code(nas.sample_times)
-    # or set it hardcoded:
-    # nas.metadata.resolution = '3mo'
-
-    # It's a good practice to use Jan 1st of the year of the first sample
-    # endtime as the file reference date (zero point of time axes).
-    nas.metadata.reference_date = \
-        datetime.datetime(nas.sample_times[0][1].year, 1, 1)
-
-def set_variables(nas, data):
+def ebas_genfile(path, data, df_metadata=None, workers=None):
     """
-    Set metadata and data for all variables for the EbasNasaAmes file object.
+    Main program for ebas_flatcsv. Writes one NasaAmes file per year of data,
+    years are written in parallel.
 
     Parameters:
-        nas    EbasNasaAmes file object
+        path          output folder
+        data          DataFrame with a DateTime column (or datetime index),
+                      the variable columns and the flag column
+        df_metadata   DataFrame of variable metadata (default None, read from f_metadata)
+        workers       number of processes (default None, cpu count)
     Returns:
-        None
+        list of years written
     """
-    
-    
-    x=first_column
-    while x < last_column+1:                                                  
-        col=df.take([x],axis=1)
-        values=col.values.T.tolist()[0]
-        values=numpy.array(values, dtype=numpy.float)
-        values=[ round(elem,6) for elem in values]
-        values=list(map(testnan, values))
-        col_metadata=df_metadata.take([x],axis=1)
-        col_flag=df.take([index_flag_col],axis=1).astype(int)
-        flags=col_flag.values.tolist() 
-        metadata = DataObject()
-        metadata.comp_name = col_metadata[0:1].values.T.tolist()[0][0]
-       
-        #Unit metadata
-        metadata.unit = col_metadata[1:2].values.T.tolist()[0][0]
-        if metadata.unit!=metadata.unit:
-            metadata.unit = None
-        else:
-            metadata.unit = metadata.unit
-                  
-        metadata.matrix=col_metadata[2:3].values.T.tolist()[0][0]
-        metadata.title=col_metadata[3:4].values.T.tolist()[0][0]   
-        
-        #Statistics metadata
-        metadata.statistics=col_metadata[4:5].values.T.tolist()[0][0]
-        if metadata.statistics!=metadata.statistics:
-            metadata.statistics = None
-        else:
-            metadata.statistics = metadata.statistics
-            
-        #Uncertainity metadata    
-        uncertainty_value=col_metadata[5:6].values.T.tolist()[0][0]
-        uncertainty_unit=col_metadata[6:7].values.T.tolist()[0][0]
-        if uncertainty_value!=uncertainty_value:
-            metadata.uncertainty = None
-        else:
-            metadata.uncertainty = (int(uncertainty_value), uncertainty_unit)
-            
-        
-
-        #Characteristics    
-        if col_metadata[7:8].values.T.tolist()[0][0]=='None':
-            nas.variables.append(DataObject(values_=values, flags=flags, flagcol=True,
-                                    metadata=metadata))
-        else:
-            metadata.characteristics = DatasetCharacteristicList()
-            Characteristic_type=col_metadata[7:8].values.T.tolist()[0][0]
-            Value=col_metadata[8:9].values.T.tolist()[0][0]
-            Instrument_type=col_metadata[9:10].values.T.tolist()[0][0]
-            metadata.characteristics.add_parse(Characteristic_type, Value, Instrument_type, metadata.comp_name)  
-            nas.variables.append(DataObject(values_=values, flags=flags, flagcol=True,
-                                metadata=metadata))
-
-            
-        #nas.variables.append(DataObject(values_=values, flags=flags, flagcol=True,
-                                    #metadata=metadata))
-                                    #
-        x+=1    
-    
-
-def ebas_genfile(path, data, date):
-    """
-    Main program for ebas_flatcsv
-    Created for lexical scoping.
-
-    Parameters:
-        None
-    Returns:
-        none
-    """
-
-    # Create an EbasNasaAmes file object
-    nas = nasa_ames.EbasNasaAmes()
-
-    # Set file global metadata
-    set_fileglobal_metadata(nas)
-
-    # Set the time axes and related metadata
-    set_time_axes(nas, date)
-
-    # Set metadata and data for all variables
-    set_variables(nas, data)
-
-    # write the file:
-    nas.write(createfiles=True,destdir=path)
-    # createfiles=True
-    #     Actually creates output files, else the output would go to STDOUT.
-    # You can also specify:
-    #     destdir='path/to/directory'
-    #         Specify a specific relative or absolute path to a directory the
-    #         files should be written to
-    #     flags=FLAGS_COMPRESS
-    #         Compresses the file size by reducing flag columns.
-    #         Flag columns will be less explicit and thus less intuitive for
-    #         humans to read.
-    #     flags=FLAGS_ALL
-    #         Always generate one flag column per variable. Very intuitive to
-    #         read, but increases filesize.
-    #     The default for flags is: Generate one flag column per file if the
-    #     flags are the same for all variables in the file. Else generate one
-    #     flag column per variable.
-    #     This is a trade-off between the advantages and disadvantages of the
-    #     above mentioned approaches.
-
-
+    if df_metadata is None:
+        df_metadata = read_metadata(f_metadata)
+    return write_yearly(data, df_metadata, set_fileglobal_metadata, path, first_column,
+                        last_column, index_flag_col, tresol, workers=workers)
+
+if __name__ == '__main__':
+    df = pd.read_csv(f, delimiter=',', header=0) #Specify nb_lines of header, delimiter etc
+    ebas_genfile(destdir_out, df)
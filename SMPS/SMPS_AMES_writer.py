@@ -0,0 +1,206 @@
+"""
+Date: 10/19/26
+Purpose: Shared NASA AMES (EBAS) writer for the SMPS level 1 and level 2 exports. All variables
+are prepared from one 2-D float array (vectorized rounding and non-finite -> missing), every variable
+shares a single flag column, variable metadata comes from the metadata csv and multi-year input
+is split into yearly files that are written in parallel.
+"""
+
+from ebas.io.file import nasa_ames
+from nilutility.datatypes import DataObject
+from ebas.domain.basic_domain_logic.time_period import estimate_period_code, \
+    estimate_resolution_code, estimate_sample_duration_code
+from ebas.io.ebasmetadata import DatasetCharacteristicList
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import numpy as np
+import pandas as pd
+
+def read_metadata(f_metadata):
+    """
+    Reads the variable metadata csv. Each column describes the data column with the
+    same name, rows are comp_name, unit, matrix, title, statistics, uncertainty value,
+    uncertainty unit, characteristic type, characteristic value and instrument type.
+
+    Parameters:
+        f_metadata    path to the metadata csv
+    Returns:
+        df_metadata   DataFrame of variable metadata
+    """
+    return pd.read_csv(f_metadata, delimiter=',', header=0)
+
+def _isnan(val):
+    return val != val
+
+def variable_metadata(df_metadata, first_column, last_column):
+    """
+    Builds the EBAS metadata object for every variable column of the metadata csv.
+
+    Parameters:
+        df_metadata    DataFrame of variable metadata
+        first_column   first metadata column with a variable
+        last_column    last metadata column with a variable
+    Returns:
+        list of (column name, DataObject) pairs
+    """
+    metas = []
+    for name in df_metadata.columns[first_column:last_column+1]:
+        col = df_metadata[name].tolist()
+        metadata = DataObject()
+        metadata.comp_name = col[0]
+        metadata.unit = None if _isnan(col[1]) else col[1]
+        metadata.matrix = col[2]
+        metadata.title = col[3]
+        metadata.statistics = None if _isnan(col[4]) else col[4]
+        metadata.uncertainty = None if _isnan(col[5]) else (int(col[5]), col[6])
+        if len(col) > 7 and col[7] != 'None' and not _isnan(col[7]):
+            metadata.characteristics = DatasetCharacteristicList()
+            metadata.characteristics.add_parse(col[7], col[8], col[9], metadata.comp_name)
+        metas.append((name, metadata))
+    return metas
+
+def prepare_values(data):
+    """
+    Rounds all variables to 6 decimals and converts NaN and +/-inf to None (EBAS missing
+    value) in one pass over the 2-D array.
+
+    Parameters:
+        data    2-D float array w/ shape (n_samples, n_variables)
+    Returns:
+        list of value lists, one per variable
+    """
+    data = np.asarray(data, dtype=float)
+    values = np.round(data, 6).astype(object)
+    values[~np.isfinite(data)] = None
+    return values.T.tolist()
+
+def set_time_axes(nas, start_times, tresol):
+    """
+    Set the time axes and related metadata for the EbasNasaAmes file object.
+
+    Parameters:
+        nas            EbasNasaAmes file object
+        start_times    DatetimeIndex of sample start times (UTC)
+        tresol         sample duration in minutes
+    Returns:
+        None
+    """
+    start_times = pd.DatetimeIndex(start_times)
+    end_times = start_times + datetime.timedelta(minutes=tresol)
+    nas.sample_times = list(zip(start_times.to_pydatetime(), end_times.to_pydatetime()))
+
+    # period code is an estimate of the current submissions period, so it should
+    # always be calculated from the actual time axes
+    nas.metadata.period = estimate_period_code(nas.sample_times[0][0],
+                                               nas.sample_times[-1][1])
+    nas.metadata.duration = estimate_sample_duration_code(nas.sample_times)
+    nas.metadata.resolution = estimate_resolution_code(nas.sample_times)
+
+    # It's a good practice to use Jan 1st of the year of the first sample
+    # endtime as the file reference date (zero point of time axes).
+    nas.metadata.reference_date = \
+        datetime.datetime(nas.sample_times[0][1].year, 1, 1)
+
+def split_input(df, df_metadata, first_column, last_column, index_flag_col, time_col='DateTime'):
+    """
+    Pulls the sample times, the variable array and the shared flag column out of the
+    input data. Variables are matched to the metadata csv by column name, or by position
+    when the names differ.
+
+    Parameters:
+        df               input data, time in time_col or the index
+        df_metadata      DataFrame of variable metadata
+        first_column     first column with a variable
+        last_column      last column with a variable
+        index_flag_col   column with the flag data
+        time_col         name of the time column (default 'DateTime')
+    Returns:
+        start times, 2-D float array of variables, flag list
+    """
+    if time_col in df.columns:
+        times = pd.to_datetime(df[time_col], format='%Y-%m-%d %H:%M:%S')
+        table = df
+    else:
+        times = pd.to_datetime(df.index)
+        table = df.reset_index()
+    names = list(df_metadata.columns[first_column:last_column+1])
+    if all(n in table.columns for n in names):
+        data = table[names].to_numpy(dtype=float)
+    else:
+        data = table.iloc[:, first_column:last_column+1].to_numpy(dtype=float)
+    flag_name = df_metadata.columns[index_flag_col] if index_flag_col < len(df_metadata.columns) else None
+    if flag_name in table.columns:
+        flag = table[flag_name]
+    elif index_flag_col < table.shape[1]:
+        flag = table.iloc[:, index_flag_col]
+    else:
+        flag = pd.Series(0, index=table.index)
+    flags = pd.to_numeric(flag, errors='coerce').fillna(0).astype(int).to_numpy()[:, None].tolist()
+    return pd.DatetimeIndex(times), data, flags
+
+def ebas_genfile(df, df_metadata, set_fileglobal_metadata, destdir, first_column, last_column,
+                 index_flag_col, tresol, time_col='DateTime'):
+    """
+    Writes one NASA AMES file from the input data.
+
+    Parameters:
+        df                        input data
+        df_metadata               DataFrame of variable metadata
+        set_fileglobal_metadata   function setting the level specific global metadata
+        destdir                   output folder
+        first_column              first column with a variable
+        last_column               last column with a variable
+        index_flag_col            column with the flag data
+        tresol                    sample duration in minutes
+        time_col                  name of the time column (default 'DateTime')
+    Returns:
+        None
+    """
+    nas = nasa_ames.EbasNasaAmes()
+    set_fileglobal_metadata(nas)
+
+    times, data, flags = split_input(df, df_metadata, first_column, last_column, index_flag_col, time_col)
+    set_time_axes(nas, times, tresol)
+
+    # every variable shares the same flag list
+    for values, (_, metadata) in zip(prepare_values(data), variable_metadata(df_metadata, first_column, last_column)):
+        nas.variables.append(DataObject(values_=values, flags=flags, flagcol=True,
+                                        metadata=metadata))
+    nas.write(createfiles=True, destdir=destdir)
+
+def _write_year(args):
+    # worker for the process pool, one year of data per call
+    ebas_genfile(*args[0], **args[1])
+    return args[2]
+
+def write_yearly(df, df_metadata, set_fileglobal_metadata, destdir, first_column, last_column,
+                 index_flag_col, tresol, time_col='DateTime', workers=None):
+    """
+    Splits multi-year input into calendar years and writes one NASA AMES file per year,
+    in parallel when there is more than one year.
+
+    Parameters:
+        df                        input data
+        df_metadata               DataFrame of variable metadata
+        set_fileglobal_metadata   function setting the level specific global metadata
+        destdir                   output folder
+        first_column              first column with a variable
+        last_column               last column with a variable
+        index_flag_col            column with the flag data
+        tresol                    sample duration in minutes
+        time_col                  name of the time column (default 'DateTime')
+        workers                   number of processes (default None, cpu count)
+    Returns:
+        list of years written
+    """
+    if time_col in df.columns:
+        years = pd.to_datetime(df[time_col], format='%Y-%m-%d %H:%M:%S').dt.year.to_numpy()
+    else:
+        years = pd.to_datetime(df.index).year.to_numpy()
+    jobs = [((df[years == year], df_metadata, set_fileglobal_metadata, destdir, first_column,
+              last_column, index_flag_col, tresol), {'time_col': time_col}, int(year))
+            for year in np.unique(years)]
+    if workers == 1 or len(jobs) <= 1:
+        return [_write_year(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_write_year, jobs))
@@ -14,31 +14,31 @@ import smps
 import os
 import requests
 from pathlib import Path
+from csvIndex import update_index, read_range
+from smpsBins import size_bins
 
 
-def main(): #skipping i rows for correct data range (3948 for June 2025 onward)
-    import pandas as pd
+def main(): #reads June 2025 onward straight from the csv index instead of skipping rows
 
     # Load the CSV file into a DataFrame
     file_path = 'C:\\Users\\ze_ba\\OneDrive\\Desktop\\AppalAIR\SMPS-Data\\testing\whisker\\SMPS_NumberSizeDist_2025_1hr.csv'  # Replace with your CSV file path
-    df = pd.read_csv(file_path, skiprows = 3948)
+    index = update_index(file_path)                                     # builds the sidecar index on first use, extends it when rows are appended
 
-    # Define the range of columns to sum
-    # Assuming your columns are named 'col_1', 'col_2', ..., 'col_500'
-    start_col_index = 160  # Index of the first column (9 for 13.47) (121 for 100nm) (160 for 200nm)
-    end_col_index = 236  # Index of the last column (e.g., 'col_500')
+    # Select the size bins to sum by diameter (13.47, 100 or 200 nm and up)
+    min_dp = 200
+    bin_cols, dp = size_bins(list(index['columns']))
+    columns_to_sum = [c for c, d in zip(bin_cols, dp) if d >= min_dp]
 
-    # Select the columns within the specified range
-    # Using iloc for integer-location based indexing
-    columns_to_sum = df.iloc[:, start_col_index : end_col_index + 1]
+    # Seek straight to the rows from June 2025 on, reading only the needed columns
+    df = read_range(file_path, start='2025-06-01', columns=columns_to_sum, index=index)
 
     # Sum the values across the selected columns for each row
     # axis=1 specifies summing across columns (row-wise)
-    df['summed_columns'] = columns_to_sum.sum(axis=1)
-    df['DateTime Sample Start'] = pd.to_datetime(df.iloc[:, 0])
+    df['summed_columns'] = df[columns_to_sum].sum(axis=1)
+    df['DateTime Sample Start'] = df.index
     # Display the DataFrame with the new summed column
     print(df['summed_columns'])
-    df.plot(x = 'DateTime Sample Start', y = 'summed_columns', title='Number of particles from 100nm to 800nm from June 2025 through October 2025',
+    df.plot(x = 'DateTime Sample Start', y = 'summed_columns', title=f'Number of particles from {min_dp}nm to 800nm from June 2025 through October 2025',
             xlabel='Time', ylabel='#',
             color='skyblue')
     plt.show()
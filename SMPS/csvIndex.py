@@ -0,0 +1,227 @@
+"""
+Date: 10/19/26
+Purpose: Sidecar row index for large SMPS and CCN csv archives. The index maps every row's
+timestamp to its byte offsets in the file and every column name to its position, so a time
+range and column subset can be read by seeking straight to the rows instead of parsing the
+whole file. The index is built once and extended when rows are appended to the csv.
+"""
+
+"""IMPORTS"""
+import numpy as np
+import pandas as pd
+import os
+from io import BytesIO
+from pathlib import Path
+
+# time columns of the combined SMPS files and the processed CCN files
+time_cols = ['DateTime Sample Start', 'Datetime(UTC)', 'Datetime UTC',
+             'Date String (YYYY-MM-DD hh:mm:ss) UTC', 'DateTime']
+
+chunk_bytes = 1 << 24 # bytes read at a time while scanning for line starts
+
+def index_path(path):
+    """
+    Path of the sidecar index for a csv file, ex. data.csv -> data.csv.idx.npz
+    """
+    path = Path(path)
+    return path.with_name(path.name + '.idx.npz')
+
+def _find_header(path, encoding):
+    # raw AIM exports have metadata lines above the header, combined files start with it
+    offset = 0
+    with open(path, 'rb') as f:
+        for n, line in enumerate(f):
+            first = line.decode(encoding, errors='replace').split(',')[0].strip().strip('"')
+            if first in time_cols or first == 'Scan Number':
+                return offset, line
+            offset += len(line)
+            if n > 60:
+                break
+        f.seek(0)
+        return 0, f.readline()
+
+def _line_offsets(path, begin, end):
+    # start and stop byte of every non-empty line between begin and end
+    starts = [np.array([begin], dtype=np.int64)]
+    with open(path, 'rb') as f:
+        f.seek(begin)
+        pos = begin
+        while pos < end:
+            buf = f.read(min(chunk_bytes, end - pos))
+            if not buf:
+                break
+            nl = np.flatnonzero(np.frombuffer(buf, dtype=np.uint8) == 10)
+            starts.append(nl.astype(np.int64) + pos + 1)
+            pos += len(buf)
+    starts = np.concatenate(starts)
+    stops = np.append(starts[1:], end)
+    starts = starts[starts < end]
+    stops = stops[:len(starts)]
+    keep = (stops - starts) > 2 # drops blank lines ('\n' or '\r\n')
+    return starts[keep], stops[keep]
+
+def _parse_times(raw, header, time_col, encoding, dayfirst):
+    times = pd.read_csv(BytesIO(header + raw), usecols=[time_col], encoding=encoding)[time_col]
+    times = pd.to_datetime(times, format='mixed', dayfirst=dayfirst, errors='coerce')
+    return times.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+def _scan(path, begin, end, header, time_col, encoding, dayfirst):
+    starts, stops = _line_offsets(path, begin, end)
+    with open(path, 'rb') as f:
+        f.seek(begin)
+        raw = f.read(end - begin)
+    times = _parse_times(raw, header, time_col, encoding, dayfirst)
+    if len(times) != len(starts):
+        raise ValueError(f'{path}: {len(times)} rows parsed but {len(starts)} lines found, '
+                         'quoted newlines are not supported')
+    return starts, stops, times
+
+def _signature(path, size):
+    # last bytes already indexed, used to tell an append from a rewrite
+    with open(path, 'rb') as f:
+        f.seek(max(size - 64, 0))
+        return np.frombuffer(f.read(min(size, 64)), dtype=np.uint8)
+
+def _save(path, index):
+    with open(index_path(path), 'wb') as f:
+        np.savez(f, **{k: np.asarray(v) for k, v in index.items()})
+
+def build_index(path, time_col=None, encoding='utf-8', dayfirst=False):
+    """
+    Scans a csv file once and writes its sidecar index
+    ----------
+    Paramaters
+    ++++++++++
+    path : [str/path-like] Path to the csv file
+    time_col : [str] Time column (default = None, first of time_cols found in the header)
+    encoding : [str] File encoding, 'ISO-8859-1' for raw AIM exports (default = 'utf-8')
+    dayfirst : [bool] Parse day first dates (default = False)
+
+    Returns
+    ++++++++++
+    index : [dict] Column names, header bytes, row start/stop offsets and times (int64 ns)
+    """
+    path = Path(path)
+    header_at, header = _find_header(path, encoding)
+    columns = pd.read_csv(BytesIO(header), encoding=encoding).columns.to_numpy(dtype=str)
+    if time_col is None:
+        time_col = next((c for c in time_cols if c in columns), columns[0])
+    size = os.path.getsize(path)
+    starts, stops, times = _scan(path, header_at + len(header), size, header, time_col, encoding, dayfirst)
+    index = {'columns': columns, 'time_col': time_col, 'header': np.frombuffer(header, dtype=np.uint8),
+             'encoding': encoding, 'dayfirst': dayfirst, 'size': size, 'signature': _signature(path, size),
+             'starts': starts, 'stops': stops, 'times': times}
+    _save(path, index)
+    return index
+
+def load_index(path):
+    """
+    Reads the sidecar index of a csv file as written, or None if it does not exist
+    """
+    f = index_path(path)
+    if not f.is_file():
+        return None
+    with np.load(f) as z:
+        index = {k: z[k] for k in z.files}
+    for k in ('time_col', 'encoding'):
+        index[k] = str(index[k])
+    index['dayfirst'] = bool(index['dayfirst'])
+    index['size'] = int(index['size'])
+    return index
+
+def update_index(path, **kwargs):
+    """
+    Returns an up to date index for a csv file. Rows appended since the last update are
+    scanned and added; a missing index or a rewritten file is indexed from scratch.
+    ----------
+    Paramaters
+    ++++++++++
+    path : [str/path-like] Path to the csv file
+    kwargs : passed to build_index when the index has to be built
+
+    Returns
+    ++++++++++
+    index : [dict] Index of the whole file
+    """
+    index = load_index(path)
+    size = os.path.getsize(path)
+    if index is None:
+        return build_index(path, **kwargs)
+    if size == index['size'] and np.array_equal(_signature(path, size), index['signature']):
+        return index
+    old = index['size']
+    if size < old or not np.array_equal(_signature(path, old), index['signature']) \
+            or _signature(path, old)[-1:].tobytes() != b'\n':
+        return build_index(path, time_col=index['time_col'], encoding=index['encoding'], dayfirst=index['dayfirst'])
+    starts, stops, times = _scan(path, old, size, index['header'].tobytes(), index['time_col'],
+                                 index['encoding'], index['dayfirst'])
+    index['starts'] = np.concatenate([index['starts'], starts])
+    index['stops'] = np.concatenate([index['stops'], stops])
+    index['times'] = np.concatenate([index['times'], times])
+    index['size'] = size
+    index['signature'] = _signature(path, size)
+    _save(path, index)
+    return index
+
+def column_positions(index):
+    """
+    Column name to position lookup of an indexed file
+    """
+    return {c: i for i, c in enumerate(index['columns'])}
+
+def read_range(path, start=None, end=None, columns=None, index=None):
+    """
+    Reads the rows of an indexed csv with start <= time < end, seeking straight to them.
+    Rows are returned in time order even if the file is not sorted.
+    ----------
+    Paramaters
+    ++++++++++
+    path : [str/path-like] Path to the csv file
+    start : [str/datetime] First time to include (default = None, beginning of file)
+    end : [str/datetime] Time to stop before (default = None, end of file)
+    columns : [list of str] Columns to read besides the time column (default = None, all)
+    index : [dict] Index from update_index (default = None, updated here)
+
+    Returns
+    ++++++++++
+    data : [Pandas DataFrame] Selected rows and columns indexed by the time column
+    """
+    if index is None:
+        index = update_index(path)
+    time_col = index['time_col']
+    if columns is not None:
+        positions = column_positions(index)
+        missing = [c for c in columns if c not in positions]
+        if missing:
+            raise KeyError(f'Columns not in {path}: {missing}')
+        columns = [time_col] + [c for c in columns if c != time_col]
+
+    times = index['times']
+    order = np.argsort(times, kind='stable')
+    sorted_t = times[order]
+    nat = np.iinfo(np.int64).min
+    lo = np.searchsorted(sorted_t, nat, side='right') if start is None else \
+        np.searchsorted(sorted_t, pd.Timestamp(start).value, side='left')
+    hi = len(sorted_t) if end is None else np.searchsorted(sorted_t, pd.Timestamp(end).value, side='left')
+    rows = np.sort(order[lo:hi])
+
+    # contiguous runs of rows are read with one seek each
+    parts = []
+    if len(rows):
+        breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+        with open(path, 'rb') as f:
+            for run in np.split(rows, breaks):
+                f.seek(index['starts'][run[0]])
+                chunk = f.read(index['stops'][run[-1]] - index['starts'][run[0]])
+                parts.append(chunk if chunk.endswith(b'\n') else chunk + b'\n')
+    data = pd.read_csv(BytesIO(index['header'].tobytes() + b''.join(parts)), usecols=columns,
+                       encoding=index['encoding'])
+    data[time_col] = pd.to_datetime(data[time_col], format='mixed', dayfirst=index['dayfirst'])
+    return data.set_index(time_col).sort_index(kind='stable')
+
+if __name__ == '__main__':
+    filepath = Path(input("\nEnter full path of the csv file you would like to index.\n"))
+    index = update_index(filepath)
+    t = pd.to_datetime(index['times'][index['times'] != np.iinfo(np.int64).min])
+    print(f'{len(index["starts"])} rows, {len(index["columns"])} columns, {t.min()} to {t.max()}')
+    print(f'Index written to {index_path(filepath)}')
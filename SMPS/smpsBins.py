@@ -0,0 +1,67 @@
+"""
+Date: 10/19/26
+Purpose: Shared helpers for finding the size bin columns of combined SMPS csv files
+"""
+
+"""IMPORTS"""
+import numpy as np
+import pandas as pd
+
+stat_cols = ['Median (nm)','Mean (nm)','Geo. Mean (nm)','Mode (nm)','Geo. Std. Dev','Total Concentration (#/cm³)']
+
+def size_bins(columns):
+    """
+    Finds the size bin columns (named by their midpoint diameter, ex. '13.6') and sorts
+    them numerically
+    ----------
+    Paramaters
+    ++++++++++
+    columns : [list of str] Column names of an SMPS dataframe
+
+    Returns
+    ++++++++++
+    bin_cols : [list of str] Size bin column names sorted by diameter
+    dp : [ndarray] Bin midpoint diameters in nm
+    """
+    bin_cols = [s for s in columns if isinstance(s, str) and (s.count('.') == 1) and (s.split('.')[0].isdigit()) and (s.split('.')[-1].isdigit())]
+    # IMPORTANT: sort numerically
+    bin_cols = sorted(bin_cols, key=lambda x: float(x))
+    return bin_cols, np.array([float(n) for n in bin_cols])
+
+def dlogdp(dp):
+    """
+    Log10 bin widths from midpoint diameters, inner edges halfway between midpoints
+    ----------
+    Paramaters
+    ++++++++++
+    dp : [array-like] Bin midpoint diameters in nm
+
+    Returns
+    ++++++++++
+    dlogdp : [ndarray] Bin widths in log10 space
+    """
+    logdp = np.log10(np.asarray(dp, dtype=float))
+    mids = (logdp[1:] + logdp[:-1]) / 2
+    edges = np.concatenate(([2*logdp[0] - mids[0]], mids, [2*logdp[-1] - mids[-1]]))
+    return np.diff(edges)
+
+def read_scans(files, index = 'DateTime Sample Start'):
+    """
+    Reads one or more combined SMPS csv files (metadata removed) into a single
+    time indexed dataframe
+    ----------
+    Paramaters
+    ++++++++++
+    files : [str/path-like or list] Path(s) to combined SMPS files
+    index : [str] Time column (default = 'DateTime Sample Start')
+
+    Returns
+    ++++++++++
+    data : [Pandas DataFrame] SMPS scans sorted by time
+    """
+    if not isinstance(files, (list, tuple)):
+        files = [files]
+    data = pd.concat([pd.read_csv(f) for f in files])
+    data[index] = pd.to_datetime(data[index], format = 'mixed')
+    data = data.set_index(index).sort_index()
+    return data
@@ -15,54 +15,26 @@ import smps
 import os
 import requests
 from pathlib import Path
+from smpsSummary import folder_summaries, box_stats
 
 def main():
 
-    dataTotal = pd.DataFrame()
-    dateTotal = pd.DataFrame()
-    dataType = input('Enter the type of data you would like to display (Geo. Mean (nm), Geo. Std. Dev, Total Concentration (#/cmÂ³)): ')
-    fileNames = []
-    csvpath = Path(input("\nInput the full path of the csv youd like to access:\n"))
-    
-    
-    
-    #directory = (r'C:\Users\aydan\VS Code\AppalAIR Code\Raw Data\Compiled')                                                 #opens the compiled folder
-    for entry in os.listdir(csvpath):                                                                                     #looks at each item in the folder
-        file = os.path.join(csvpath, entry)                                                                               #selects one item
-        if os.path.isfile(file):                                                                                            #if the item is a file it:
-                    print(file)                                                                                             #prints the file name
-                    dataJoin = pd.DataFrame()                                                                               #initializes an empty data frame for joining
-                    dateJoin = pd.DataFrame()
-                    dataRaw = pd.read_table(                                                                                #reads in the data, skipping over the metaDataLines
-                        file,
-                        delimiter = ','
-                    )
-
-                    file = file.split('\\')                                                                                 #formats the name of the file to be just one number
-                    file = file[-1]
-                    file = file.split('.')
-                    file = file[0]
-                    file = file.split('_')
-                    file = file[0]
-
-                    fileNames.append(file)                                                                                  #adds file names to a list
-                    dateJoin[file] = dataRaw['DateTime Sample Start']
-                    
-                    dataJoin[file] = dataRaw[11:263].sum()                  #was dataJoin[file] = dataRaw[dataType]
-                                                                      #puts current file data of dataType into dataJoin data frame
-                    
-                    dataTotal = dataTotal.join(dataJoin, how = 'outer')                                                     
-                    #joins dataTotal with dataJoin, fixes truncation of data to first item issue
-                    dateTotal = dateTotal.join(dateJoin, how = 'outer')
-
-    fileNames = fileNames[3:] + fileNames[:3]
-    
-    dataTotal.plot(x = dataTotal,  y = dateTotal, color='blue', linestyle='--', marker='o', label='My Line')                   
-    #changing was dataTotal.boxplot(column = fileNames)
-    
-    plt.xlabel('Month_Year')
+    dataType = input('Enter the type of data you would like to display (Geo. Mean (nm), Geo. Std. Dev, Total Concentration (#/cm³), Size Bin Sum): ')
+    dataType = dataType.replace('Â³', '³')
+    csvpath = Path(input("\nInput the full path of the folder youd like to access:\n"))
+
+    #each file is reduced once to a cached summary (folder/summaries), later runs only read the summaries
+    summaries = folder_summaries(csvpath)
+    summaries = [s for s in summaries if ('sketch', dataType) in s]                                     #skips files without the selected column
+    stats = box_stats(summaries, dataType)                                                              #quartiles and 5-95% whiskers from the quantile sketches
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.bxp(stats, showfliers=False)
+    plt.xticks(rotation=45)
+    plt.xlabel('File')
     plt.ylabel(dataType)
-    plt.title('App_SMPS' + dataType)
+    plt.title('App_SMPS ' + dataType)
+    plt.tight_layout()
     plt.show()
 
 #returns the line count of the meta data
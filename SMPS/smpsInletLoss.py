@@ -0,0 +1,139 @@
+"""
+Date: 10/19/26
+Purpose: Size dependent diffusion loss correction for the SMPS sampling line. The penetration
+of every size bin is computed once per inlet configuration and applied to the whole scan
+matrix as a single broadcast divide. The correction is opt-in: it is applied only when asked
+for (SMPS_Create_Ames, ccnClosure, comb_SMPS_CCN) and only with measured inlet values, scans
+not covered by a configuration raise an error instead of being corrected with made up numbers.
+"""
+
+"""IMPORTS"""
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from pathlib import Path
+from smpsBins import size_bins, read_scans
+
+k_B = 1.380649e-23 # Boltzmann constant J/K
+
+# Measured sampling line configurations, keyed by the date they took effect (UTC), each one
+# applies until the next. length [m], flow [lpm], T [K], P [hPa]
+# ex. '2024-01-01': {'length': ..., 'flow': ..., 'T': ..., 'P': ...},
+# Left empty until the station's inlet values are entered, correct_losses refuses to run without them.
+inlet_configs = {
+}
+
+def diffusion_coefficient(dp, T=293.15, P=1013.25):
+    """
+    Particle diffusion coefficient from Stokes-Einstein with the Cunningham slip correction
+    ----------
+    Paramaters
+    ++++++++++
+    dp : [array-like] Particle diameters in nm
+    T : [float] Temperature in K (default = 293.15)
+    P : [float] Pressure in hPa (default = 1013.25)
+
+    Returns
+    ++++++++++
+    D : [ndarray] Diffusion coefficient in m2/s
+    """
+    d = np.asarray(dp, dtype=float)*1e-9
+    mu = 1.8203e-5*(T/293.15)**1.5*(293.15 + 110.4)/(T + 110.4) # Sutherland air viscosity Pa s
+    mfp = 66.5e-9*(1013.25/P)*(T/293.15)*(1 + 110.4/293.15)/(1 + 110.4/T) # air mean free path m
+    Kn = 2*mfp/d
+    Cc = 1 + Kn*(1.142 + 0.558*np.exp(-0.999/Kn))
+    return k_B*T*Cc/(3*np.pi*mu*d)
+
+def tube_penetration(dp, length, flow, T=293.15, P=1013.25):
+    """
+    Penetration through a straight tube in laminar flow (Gormley and Kennedy, 1949)
+    ----------
+    Paramaters
+    ++++++++++
+    dp : [array-like] Particle diameters in nm
+    length : [float] Sampling line length in m
+    flow : [float] Sample flow in lpm
+    T : [float] Temperature in K (default = 293.15)
+    P : [float] Pressure in hPa (default = 1013.25)
+
+    Returns
+    ++++++++++
+    pen : [ndarray] Fraction of particles transmitted, 0-1
+    """
+    Q = flow/60000 # lpm to m3/s
+    mu = np.pi*diffusion_coefficient(dp, T, P)*length/Q
+    low = 1 - 2.56*mu**(2/3) + 1.2*mu + 0.1767*mu**(4/3)
+    high = 0.819*np.exp(-3.657*mu) + 0.097*np.exp(-22.3*mu) + 0.032*np.exp(-57*mu)
+    return np.clip(np.where(mu < 0.02, low, high), 0, 1)
+
+@lru_cache(maxsize=32)
+def _penetration_cached(dp, length, flow, T, P):
+    pen = tube_penetration(np.array(dp), length, flow, T, P)
+    pen.setflags(write=False)
+    return pen
+
+def penetration(dp, config):
+    """
+    Penetration vector for one inlet configuration. Results are cached so the vector
+    is only recomputed when the bins or the configuration change.
+    ----------
+    Paramaters
+    ++++++++++
+    dp : [array-like] Bin midpoint diameters in nm
+    config : [dict] Inlet configuration with 'length', 'flow', 'T' and 'P'
+
+    Returns
+    ++++++++++
+    pen : [ndarray] Read only penetration per bin
+    """
+    return _penetration_cached(tuple(np.asarray(dp, dtype=float)), float(config['length']), float(config['flow']),
+                               float(config.get('T', 293.15)), float(config.get('P', 1013.25)))
+
+def correct_losses(data, configs=inlet_configs, total_col='Total Concentration (#/cm³)'):
+    """
+    Takes in a dataframe of SMPS scans and divides every size bin by its penetration.
+    Scans are matched to the inlet configuration in effect at their start time so the
+    correction is one (n_configs x n_bins) table gathered by row. The total concentration
+    column is rescaled by the same ratio as the bin sum. Raises a ValueError when there are
+    no configurations or scans start before the first one.
+    ----------
+    Paramaters
+    ++++++++++
+    data : [Pandas DataFrame] SMPS scans indexed by scan time
+    configs : [dict] Inlet configurations keyed by start date (default = inlet_configs)
+    total_col : [str] Total concentration column to rescale (default = 'Total Concentration (#/cm³)')
+
+    Returns
+    ++++++++++
+    data : [Pandas DataFrame] Copy of data with loss corrected size bins
+    """
+    if not configs:
+        raise ValueError('No inlet configurations, enter the measured sampling line values in inlet_configs')
+    bin_cols, dp = size_bins(data.columns)
+    starts = pd.to_datetime(list(configs.keys()))
+    order = np.argsort(starts)
+    starts = starts[order]
+    table = np.vstack([penetration(dp, list(configs.values())[i]) for i in order])
+
+    # index of the configuration in effect for each scan
+    times = pd.to_datetime(data.index)
+    if len(times) and times.min() < starts[0]:
+        raise ValueError(f'No inlet configuration covers scans before {starts[0].date()}, first scan is {times.min()}')
+    seg = np.searchsorted(starts.to_numpy(), times.to_numpy(), side='right') - 1
+    raw = data[bin_cols].to_numpy(dtype=float)
+    cor = raw/table[seg]
+
+    data = data.copy()
+    data[bin_cols] = cor
+    if total_col in data.columns:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.nansum(cor, axis=1)/np.nansum(raw, axis=1)
+        data[total_col] = data[total_col].to_numpy()*np.where(np.isfinite(scale), scale, 1)
+    return data
+
+if __name__ == '__main__':
+    filepath = Path(input("\nEnter full path of the combined SMPS file you would like to loss correct.\n"))
+    data = correct_losses(read_scans(filepath))
+    name = input('\nEnter the desired name of your corrected file and include the file type .csv:\n' \
+                 '(This will place the corrected file in the same folder that held the original file)\n')
+    data.to_csv(filepath.parent / name)
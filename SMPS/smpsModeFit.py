@@ -0,0 +1,212 @@
+"""
+Date: 10/19/26
+Purpose: Fit 1-3 lognormal modes (nucleation/Aitken/accumulation) to every SMPS scan.
+Scans are fit in time order with each scan warm started from the previous solution,
+days are fit in parallel and results are cached by scan timestamp.
+"""
+
+"""IMPORTS"""
+import numpy as np
+import pandas as pd
+import os
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from scipy.optimize import least_squares
+from smpsBins import size_bins, dlogdp, read_scans
+
+guess_dg = [20.0, 60.0, 180.0] #cold start mode diameters [nm]
+guess_sg = [1.5, 1.6, 1.6]     #cold start geometric standard deviations
+
+def lognormal_modes(dp, params):
+    """
+    Sum of lognormal modes in dN/dlogDp form
+    ----------
+    Paramaters
+    ++++++++++
+    dp : [array-like] Bin midpoint diameters in nm
+    params : [array-like] Flat (N, log10 Dg, log10 sg) triplets, one per mode
+
+    Returns
+    ++++++++++
+    dNdlogdp : [ndarray] Modelled dN/dlogDp at dp
+    """
+    p = np.asarray(params, dtype=float).reshape(-1, 3)
+    logdp = np.log10(np.asarray(dp, dtype=float))[:, None]
+    N, logdg, logsg = p[:, 0], p[:, 1], p[:, 2]
+    modes = N/(np.sqrt(2*np.pi)*logsg)*np.exp(-(logdp - logdg)**2/(2*logsg**2))
+    return modes.sum(axis=1)
+
+def cold_start(dp, y, n_modes):
+    """
+    Initial guess when there is no previous scan to warm start from. Splits the
+    total concentration evenly over the default mode diameters.
+    ----------
+    Paramaters
+    ++++++++++
+    dp : [array-like] Bin midpoint diameters in nm
+    y : [array-like] dN/dlogDp of the scan
+    n_modes : [int] Number of modes
+
+    Returns
+    ++++++++++
+    p0 : [ndarray] Flat (N, log10 Dg, log10 sg) triplets
+    """
+    total = np.nansum(np.clip(y, 0, None)*dlogdp(dp))
+    if n_modes == 1:
+        dg, sg = [dp[np.nanargmax(y)]], [1.8]
+    else:
+        dg, sg = guess_dg[-n_modes:], guess_sg[-n_modes:]
+    p0 = []
+    for d, s in zip(dg, sg):
+        p0.extend([max(total, 1.0)/n_modes, np.log10(d), np.log10(s)])
+    return np.array(p0)
+
+def fit_scan(dp, y, n_modes, p0=None):
+    """
+    Bounded least squares fit of n lognormal modes to one scan. Modes are kept in
+    order of increasing Dg so mode 1 is always the smallest.
+    ----------
+    Paramaters
+    ++++++++++
+    dp : [array-like] Bin midpoint diameters in nm
+    y : [array-like] dN/dlogDp of the scan
+    n_modes : [int] Number of modes
+    p0 : [array-like] Starting point, cold start if None (default = None)
+
+    Returns
+    ++++++++++
+    params : [ndarray] Fitted (N, log10 Dg, log10 sg) triplets
+    diag : [dict] Fit diagnostics (rmse, r2, bic, nfev, success)
+    """
+    logdp = np.log10(dp)
+    if p0 is None:
+        p0 = cold_start(dp, y, n_modes)
+    lo = np.tile([0, logdp[0] - 0.3, np.log10(1.05)], n_modes)
+    hi = np.tile([np.inf, logdp[-1] + 0.3, np.log10(3.0)], n_modes)
+    p0 = np.clip(p0, lo, hi)
+    scale = max(np.nanmax(y), 1.0)
+
+    def resid(p):
+        return (lognormal_modes(dp, p) - y)/scale
+
+    res = least_squares(resid, p0, bounds=(lo, hi), method='trf', x_scale='jac')
+    params = res.x.reshape(-1, 3)
+    params = params[np.argsort(params[:, 1])].ravel()
+    rss = float(np.sum((res.fun*scale)**2))
+    n = len(y)
+    tss = float(np.sum((y - np.mean(y))**2))
+    diag = {'rmse': np.sqrt(rss/n),
+            'r2': 1 - rss/tss if tss > 0 else np.nan,
+            'bic': n*np.log(max(rss, 1e-12)/n) + 3*n_modes*np.log(n),
+            'nfev': res.nfev,
+            'success': bool(res.success)}
+    return params, diag
+
+def fit_series(dp, scans, max_modes=3, warm=None):
+    """
+    Fits every scan in time order. Each scan starts from the previous scan's solution
+    for the same number of modes; the mode count with the lowest BIC is kept.
+    ----------
+    Paramaters
+    ++++++++++
+    dp : [array-like] Bin midpoint diameters in nm
+    scans : [ndarray] dN/dlogDp w/ shape (n_scans, n_bins)
+    max_modes : [int] Maximum number of modes to try (default = 3)
+    warm : [dict] Starting solutions keyed by number of modes (default = None)
+
+    Returns
+    ++++++++++
+    rows : [list of dict] One result per scan
+    warm : [dict] Last solution for each number of modes
+    """
+    warm = dict(warm or {})
+    rows = []
+    for y in scans:
+        good = np.isfinite(y)
+        if good.sum() < 3*max_modes + 1 or np.nanmax(y) <= 0:
+            rows.append({'n_modes': 0})
+            continue
+        best = None
+        for n in range(1, max_modes + 1):
+            params, diag = fit_scan(dp[good], y[good], n, warm.get(n))
+            if diag['success']:
+                warm[n] = params
+            if best is None or diag['bic'] < best[2]['bic']:
+                best = (n, params, diag)
+        n, params, diag = best
+        row = {'n_modes': n}
+        p = params.reshape(-1, 3)
+        for m in range(max_modes):
+            if m < n:
+                row[f'N{m+1}'] = p[m, 0]
+                row[f'Dg{m+1}'] = 10**p[m, 1]
+                row[f'sg{m+1}'] = 10**p[m, 2]
+            else:
+                row[f'N{m+1}'], row[f'Dg{m+1}'], row[f'sg{m+1}'] = np.nan, np.nan, np.nan
+        row.update(diag)
+        rows.append(row)
+    return rows, warm
+
+def _fit_day(args):
+    # worker for the process pool, one day of scans per call
+    times, dp, scans, max_modes = args
+    rows, _ = fit_series(dp, scans, max_modes)
+    return times, rows
+
+def fit_modes(data, max_modes=3, cache=None, workers=None):
+    """
+    Takes in a dataframe of SMPS scans and fits 1 to max_modes lognormal modes to
+    every scan's dN/dlogDp. Days are independent and are fit across a process pool;
+    within a day scans are warm started from the previous scan. Scans already in the
+    cache are not refit. The cache holds fits for every max_modes used, only the rows
+    for this max_modes are read and replaced.
+    ----------
+    Paramaters
+    ++++++++++
+    data : [Pandas DataFrame] SMPS scans indexed by scan time
+    max_modes : [int] Maximum number of modes to try, 1-3 (default = 3)
+    cache : [str/path-like] csv cache of previous fits keyed by scan time (default = None)
+    workers : [int] Number of processes, 1 runs in this process (default = None, cpu count)
+
+    Returns
+    ++++++++++
+    fits : [Pandas DataFrame] Per scan mode N [#/cm3], Dg [nm], sg and fit diagnostics for the scans in data
+    """
+    bin_cols, dp = size_bins(data.columns)
+    scans = data[bin_cols]
+    done = pd.DataFrame()
+    others = pd.DataFrame() # cached fits for other max_modes, written back unchanged
+    if cache is not None and os.path.isfile(cache):
+        done = pd.read_csv(cache, index_col=0, parse_dates=True)
+        if 'max_modes' in done.columns:
+            others = done[done['max_modes'] != max_modes]
+            done = done[done['max_modes'] == max_modes]
+        scans = scans[~scans.index.isin(done.index)]
+
+    jobs = [(day.index, dp, day.to_numpy(dtype=float), max_modes)
+            for _, day in scans.groupby(scans.index.normalize()) if len(day)]
+    results = []
+    if workers == 1 or len(jobs) <= 1:
+        results = [_fit_day(job) for job in jobs]
+    elif jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_fit_day, jobs))
+
+    new = [pd.DataFrame(rows, index=times) for times, rows in results]
+    fits = pd.concat([done] + new) if new else done
+    if not fits.empty:
+        fits['max_modes'] = max_modes
+        fits = fits[~fits.index.duplicated(keep='last')].sort_index()
+        fits.index.names = [data.index.name or 'DateTime Sample Start']
+    if cache is not None and new:
+        pd.concat([others, fits]).sort_index(kind='stable').to_csv(cache)
+    # the cache can hold other scans, only the scans of data are returned
+    return fits[fits.index.isin(data.index)] if not fits.empty else fits
+
+if __name__ == '__main__':
+    filepath = Path(input("\nEnter full path of the combined SMPS file you would like to fit.\n"))
+    data = read_scans(filepath)
+    cache = filepath.parent / (filepath.stem + '_modefit.csv')
+    fits = fit_modes(data, cache=cache)
+    print(fits.describe())
+    print(f'Mode fits written to {cache}')
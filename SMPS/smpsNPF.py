@@ -0,0 +1,181 @@
+"""
+Date: 10/19/26
+Purpose: Detect new particle formation (NPF) "banana" events in the SMPS record and estimate
+growth and formation rates for every event day. All days are classified at once from a
+(day x time of day x size bin) array instead of plotting days one at a time.
+"""
+
+"""IMPORTS"""
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from smpsBins import size_bins, dlogdp, read_scans
+
+def daily_cube(data, step='10min', utc_offset=-5):
+    """
+    Regrids SMPS scans onto a regular time step and stacks them by local day
+    ----------
+    Paramaters
+    ++++++++++
+    data : [Pandas DataFrame] SMPS scans indexed by UTC scan time
+    step : [str] Regular time step for the grid (default = '10min')
+    utc_offset : [float] Local time offset from UTC in hours (default = -5, EST)
+
+    Returns
+    ++++++++++
+    cube : [ndarray] dN/dlogDp w/ shape (n_days, n_slots, n_bins), nan where missing
+    days : [DatetimeIndex] Local dates for axis 0
+    hours : [ndarray] Local hour of day for axis 1
+    dp : [ndarray] Bin midpoint diameters in nm
+    """
+    bin_cols, dp = size_bins(data.columns)
+    grid = data[bin_cols].astype(float)
+    grid.index = grid.index + pd.Timedelta(hours=utc_offset) #to local time so days split at local midnight
+    grid = grid.resample(step).mean()
+    start = grid.index[0].normalize()
+    end = grid.index[-1].normalize() + pd.Timedelta(days=1)
+    times = pd.date_range(start, end, freq=step, inclusive='left')
+    grid = grid.reindex(times)
+    n_slots = int(pd.Timedelta(days=1)/pd.Timedelta(step))
+    cube = grid.to_numpy().reshape(-1, n_slots, len(dp))
+    days = pd.date_range(start, end, freq='D', inclusive='left')
+    hours = np.arange(n_slots)*pd.Timedelta(step).total_seconds()/3600
+    return cube, days, hours, dp
+
+def masked_linfit(x, y, mask):
+    """
+    Least squares line through the masked points of every row at once
+    ----------
+    Paramaters
+    ++++++++++
+    x : [ndarray] Independent variable w/ shape (n_slots,) or (n_rows, n_slots)
+    y : [ndarray] Dependent variable w/ shape (n_rows, n_slots)
+    mask : [ndarray of bool] Points to use w/ shape (n_rows, n_slots)
+
+    Returns
+    ++++++++++
+    slope : [ndarray] Fitted slope per row (nan if fewer than 3 points)
+    r2 : [ndarray] Coefficient of determination per row
+    """
+    x = np.broadcast_to(x, y.shape)
+    w = mask & np.isfinite(y)
+    n = w.sum(axis=1)
+    xm = np.where(w, x, 0).sum(axis=1)/np.maximum(n, 1)
+    ym = np.where(w, y, 0).sum(axis=1)/np.maximum(n, 1)
+    dx = np.where(w, x - xm[:, None], 0)
+    dy = np.where(w, y - ym[:, None], 0)
+    sxx, syy, sxy = (dx**2).sum(axis=1), (dy**2).sum(axis=1), (dx*dy).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where((n >= 3) & (sxx > 0), sxy/sxx, np.nan)
+        r2 = np.where((n >= 3) & (sxx > 0) & (syy > 0), sxy**2/(sxx*syy), np.nan)
+    return slope, r2
+
+def classify_days(cube, hours, dp, d_nuc=25, bg_hours=(3, 7), day_hours=(7, 17),
+                  jump_ratio=3.0, jump_min=1000, growth_hours=6, d_growth_max=60, min_r2=0.5, min_coverage=0.6):
+    """
+    Classifies every day as 'event', 'undefined', 'non-event' or 'bad data'. A day has a nucleation
+    burst when the daytime nucleation mode concentration jumps jump_ratio times above the
+    early morning background; it is an event when the mode diameter then grows steadily.
+    ----------
+    Paramaters
+    ++++++++++
+    cube : [ndarray] dN/dlogDp w/ shape (n_days, n_slots, n_bins)
+    hours : [ndarray] Local hour of day for each slot
+    dp : [ndarray] Bin midpoint diameters in nm
+    d_nuc : [float] Upper diameter of the nucleation mode in nm (default = 25)
+    bg_hours : [tuple] Local hours used for the background concentration (default = (3, 7))
+    day_hours : [tuple] Local hours searched for the burst (default = (7, 17))
+    jump_ratio : [float] Required peak/background ratio (default = 3.0)
+    jump_min : [float] Required absolute increase in #/cm3 (default = 1000)
+    growth_hours : [float] Hours after the burst used for the growth fit (default = 6)
+    d_growth_max : [float] Largest mode diameter included in the growth fit in nm (default = 60)
+    min_r2 : [float] Required r2 of the growth fit for an event (default = 0.5)
+    min_coverage : [float] Required fraction of daytime slots with data (default = 0.6)
+
+    Returns
+    ++++++++++
+    events : [dict of ndarray] Per day class and event parameters
+    """
+    dt_h = hours[1] - hours[0]
+    N = cube*dlogdp(dp) # bin concentration #/cm3
+    nuc = dp <= d_nuc
+    N_nuc = np.where(np.isnan(cube[:, :, nuc]).all(axis=2), np.nan, np.nansum(N[:, :, nuc], axis=2))
+
+    # diameter of the largest dN/dlogDp below d_growth_max tracks the growing mode
+    small = dp <= d_growth_max
+    sub = cube[:, :, small]
+    empty = np.isnan(sub).all(axis=2)
+    d_mode = np.where(empty, np.nan, dp[small][np.argmax(np.where(np.isnan(sub), -np.inf, sub), axis=2)])
+
+    bg_slots = (hours >= bg_hours[0]) & (hours < bg_hours[1])
+    day_slots = (hours >= day_hours[0]) & (hours < day_hours[1])
+    coverage = np.isfinite(N_nuc[:, day_slots]).mean(axis=1)
+    with np.errstate(all='ignore'):
+        bg = np.nanmedian(np.where(bg_slots, N_nuc, np.nan), axis=1)
+    day_nuc = np.where(day_slots, N_nuc, -np.inf)
+    day_nuc = np.where(np.isnan(day_nuc), -np.inf, day_nuc)
+    peak_slot = np.argmax(day_nuc, axis=1)
+    rows = np.arange(cube.shape[0])
+    peak = N_nuc[rows, peak_slot]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = peak/np.maximum(bg, 1.0)
+    burst = (coverage >= min_coverage) & (ratio >= jump_ratio) & (peak - bg >= jump_min)
+
+    # burst start is the first daytime slot above half way from background to peak
+    half = (bg + peak)/2
+    above = day_slots[None, :] & (N_nuc >= half[:, None])
+    start_slot = np.where(above.any(axis=1), np.argmax(above, axis=1), peak_slot)
+
+    # growth rate from the mode diameter after the burst starts
+    slot = np.arange(len(hours))[None, :]
+    window = (slot >= start_slot[:, None]) & (slot < (start_slot + growth_hours/dt_h)[:, None])
+    GR, GR_r2 = masked_linfit(hours, d_mode, window & (d_mode <= d_growth_max))
+    event = burst & (GR > 0) & (GR_r2 >= min_r2)
+
+    # formation rate J = dN_nuc/dt + GR/(d_nuc - dp_min) * N_nuc over the rising phase,
+    # coagulation loss is not included so J is a lower estimate
+    dNdt = np.gradient(N_nuc, dt_h*3600, axis=1)
+    growth_out = (GR[:, None]/3600)/(d_nuc - dp[0])*N_nuc
+    rising = (slot >= start_slot[:, None]) & (slot <= peak_slot[:, None])
+    J_all = np.where(rising, dNdt + np.where(np.isfinite(growth_out), growth_out, 0), np.nan)
+    with np.errstate(all='ignore'):
+        J = np.nanmean(J_all, axis=1)
+        d_start = d_mode[rows, start_slot]
+        d_end = np.nanmax(np.where(window, d_mode, np.nan), axis=1)
+
+    cls = np.where(event, 'event', np.where(burst, 'undefined', 'non-event'))
+    cls = np.where(coverage < min_coverage, 'bad data', cls)
+    return {'class': cls, 'coverage': coverage, 'N_nuc_bg': bg, 'N_nuc_peak': peak, 'jump_ratio': ratio,
+            'start_hour': hours[start_slot], 'peak_hour': hours[peak_slot],
+            'GR(nm/h)': np.where(burst, GR, np.nan), 'GR_r2': np.where(burst, GR_r2, np.nan),
+            'J(cm-3s-1)': np.where(event, J, np.nan),
+            'D_mode_start(nm)': np.where(burst, d_start, np.nan), 'D_mode_end(nm)': np.where(burst, d_end, np.nan)}
+
+def find_events(data, step='10min', utc_offset=-5, **kwargs):
+    """
+    Takes in a dataframe of SMPS scans and returns the NPF classification of every day
+    ----------
+    Paramaters
+    ++++++++++
+    data : [Pandas DataFrame] SMPS scans indexed by UTC scan time
+    step : [str] Regular time step for the grid (default = '10min')
+    utc_offset : [float] Local time offset from UTC in hours (default = -5, EST)
+    kwargs : thresholds passed to classify_days
+
+    Returns
+    ++++++++++
+    events : [Pandas DataFrame] One row per local day, hours are local time
+    """
+    cube, days, hours, dp = daily_cube(data, step=step, utc_offset=utc_offset)
+    events = pd.DataFrame(classify_days(cube, hours, dp, **kwargs), index=days)
+    events.index.names = ['Date(local)']
+    return events
+
+if __name__ == '__main__':
+    filepath = Path(input("\nEnter full path of the combined SMPS file you would like to search for NPF events.\n"))
+    data = read_scans(filepath)
+    events = find_events(data)
+    print(events['class'].value_counts())
+    out = filepath.parent / (filepath.stem + '_NPF_events.csv')
+    events.to_csv(out)
+    print(f'Event table written to {out}')
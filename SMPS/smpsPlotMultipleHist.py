@@ -15,43 +15,22 @@ import numpy as np
 from datetime import datetime
 import smps
 import requests
+from pathlib import Path
+from smpsSummary import file_summary, mean_distribution
 
 def main():
 
     #pulls in file of name f and reads in number of meta lines
     f = r'C:\Users\aydan\VS Code\AppalAIR Code\Raw Data\SMPS_3082002329005_20240611.csv' #test file 1
     f1 = r'C:\Users\aydan\VS Code\AppalAIR Code\Raw Data\SMPS_3082002329005_20240612.csv' #test file 2
-    metaDataLines = _get_linecount(f, keyword = 'Scan Number')  #returns the linecount of metadata
-
-    #saves meta data into list meta
-    meta = pd.read_table(   #reads in the metadata into a df 'meta'
-        f, 
-        nrows=metaDataLines, 
-        delimiter=',', 
-        header=None, 
-        encoding='ISO-8859-1',
-        on_bad_lines='warn',
-        index_col = 0
-    ).T.iloc[0,:].to_dict()
-
-    #works with test file 1 to grab the necessary data to display, dataConc and bins
-    dataRaw = pd.read_table(                                                                        #reads in the data, skipping over the metaDataLines
-        f,
-        skiprows = metaDataLines,
-        delimiter = ','
-    )
-    dataConc = dataRaw.get(dataRaw.columns[range(42, 156)])                                         #gets the concentration data from the raw data. assumes 114 columns of concentration data
-    SMPSsizeBins = list(dataConc.columns)                                                           #returns a list of strings of the sizebins, assumes 114 columns of data,
-    SMPSsizeBins = list(map(float,SMPSsizeBins))                                                    #returns sizebins as a list of floats
+    #each file is reduced once to a cached summary, the mean dN/dlogDp per size bin is plotted from it
+    summaries = [file_summary(Path(f)), file_summary(Path(f1))]
+    dataConc = mean_distribution(summaries[0]).to_frame().T                                         #mean concentration of test file 1 as a one row frame
+    dataConc.columns = [str(d) for d in summaries[0]['dp']]
+    SMPSsizeBins = list(summaries[0]['dp'])                                                         #size bin midpoints as a list of floats
     bins = smps.utils.make_bins(lb = 13.3, ub = 805.8,midpoints = np.array(SMPSsizeBins))           #returns a 3xn matrix of size bins with lower, upper and midpoints
-    
-    #works with test file 2 to, grab the necessary data to display, dataConc1 and bins
-    dataRaw1 = pd.read_table(                                                                       #reads in the data, skipping over the metaDataLines
-        f1,
-        skiprows=metaDataLines,
-        delimiter = ','
-    )
-    dataConc1 = dataRaw1.get(dataRaw1.columns[range(42, 156)])                                      #gets the concentration data from the raw data. assumes 114 columns of concentration data
+    dataConc1 = mean_distribution(summaries[1]).to_frame().T                                        #mean concentration of test file 2
+    dataConc1.columns = [str(d) for d in summaries[1]['dp']]
 
     #Works with the display data to format both dataConc and dataConc1 on a single graph with a legend
     dates = ["6-11-24", "6-12-24"]                                                                      #creates the dates for the legend
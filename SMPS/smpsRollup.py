@@ -0,0 +1,283 @@
+"""
+Date: 10/19/26
+Purpose: Multi-resolution rollup pyramid for SMPS scans. Size bins and statistics are averaged
+to 5 minute, hourly, daily and monthly means with counts. Only the 5 minute level is built from
+raw scans, every coarser level is summed from the level below it, and new scans only rebuild
+the periods they fall in. Downstream scripts read the level they need with read_level.
+"""
+
+"""IMPORTS"""
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from smpsBins import size_bins, stat_cols, read_scans
+
+# level name : pandas frequency, finest first, each level must nest inside the next
+levels = {'5min': '5min', 'hourly': 'h', 'daily': 'D', 'monthly': 'MS'}
+
+def rollup_columns(columns):
+    """
+    Picks the columns to average by schema: the statistics columns and the size bins
+    ----------
+    Paramaters
+    ++++++++++
+    columns : [list of str] Column names of an SMPS dataframe
+
+    Returns
+    ++++++++++
+    cols : [list of str] Statistics columns present followed by the size bins sorted by diameter
+    """
+    bin_cols, _ = size_bins(columns)
+    return [c for c in stat_cols if c in columns] + bin_cols
+
+def numeric_columns(data):
+    """
+    Every numeric column of an SMPS dataframe in file order, text and time stamp columns are left out
+    ----------
+    Paramaters
+    ++++++++++
+    data : [Pandas DataFrame] SMPS scans
+
+    Returns
+    ++++++++++
+    cols : [list of str] Numeric column names
+    """
+    return list(data.select_dtypes(include='number').columns)
+
+def aggregate(data, freq, cols=None):
+    """
+    Sums and counts of every column over a time step, empty periods are dropped
+    ----------
+    Paramaters
+    ++++++++++
+    data : [Pandas DataFrame] SMPS scans indexed by scan time
+    freq : [str] pandas frequency of the time step
+    cols : [list of str] Columns to aggregate (default = None, rollup_columns)
+
+    Returns
+    ++++++++++
+    sums : [Pandas DataFrame] Sum of the non-missing values per period
+    counts : [Pandas DataFrame] Number of non-missing values per period
+    """
+    if cols is None:
+        cols = rollup_columns(data.columns)
+    values = data[cols].apply(pd.to_numeric, errors='coerce')
+    values.index = pd.to_datetime(values.index)
+    grouped = values.resample(freq)
+    sums, counts = grouped.sum(), grouped.count()
+    keep = counts.to_numpy().any(axis=1)
+    return sums[keep], counts[keep]
+
+def coarsen(sums, counts, freq):
+    """
+    Rolls a finer level up to a coarser one by summing its sums and counts
+    ----------
+    Paramaters
+    ++++++++++
+    sums : [Pandas DataFrame] Sums of the finer level
+    counts : [Pandas DataFrame] Counts of the finer level
+    freq : [str] pandas frequency of the coarser level
+
+    Returns
+    ++++++++++
+    sums, counts : [Pandas DataFrame] Sums and counts of the coarser level
+    """
+    s, n = sums.resample(freq).sum(), counts.resample(freq).sum()
+    keep = n.to_numpy().any(axis=1)
+    return s[keep], n[keep]
+
+def means(sums, counts):
+    """
+    Means of one level with the number of scans behind each row
+    ----------
+    Paramaters
+    ++++++++++
+    sums : [Pandas DataFrame] Sums of the level
+    counts : [Pandas DataFrame] Counts of the level
+
+    Returns
+    ++++++++++
+    avg : [Pandas DataFrame] Mean of every column and a 'Scan Count' column
+    """
+    n = counts.to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg = pd.DataFrame(np.where(n > 0, sums.to_numpy(dtype=float)/n, np.nan),
+                           index=sums.index, columns=sums.columns)
+    avg['Scan Count'] = n.max(axis=1).astype(int)
+    return avg
+
+def build_pyramid(data, levels=levels, cols=None):
+    """
+    Builds every level of the rollup in one pass over the scans
+    ----------
+    Paramaters
+    ++++++++++
+    data : [Pandas DataFrame] SMPS scans indexed by scan time
+    levels : [dict] Level names and frequencies, finest first (default = levels)
+    cols : [list of str] Columns to roll up (default = None, rollup_columns)
+
+    Returns
+    ++++++++++
+    pyramid : [dict] Level name : (sums, counts)
+    """
+    names = list(levels)
+    pyramid = {names[0]: aggregate(data, levels[names[0]], cols)}
+    for fine, coarse in zip(names[:-1], names[1:]):
+        pyramid[coarse] = coarsen(*pyramid[fine], levels[coarse])
+    return pyramid
+
+def _splice(old, new, start):
+    # keep old rows before start, replace everything from start on
+    return pd.concat([old[old.index < start], new]).sort_index()
+
+def update_pyramid(pyramid, data, levels=levels):
+    """
+    Adds newly arrived scans to an existing rollup. The new scans are added to the finest
+    level and only the coarser periods from the start of the earliest new scan's coarsest
+    period on are rebuilt. Scans already in the rollup must not be passed again.
+    ----------
+    Paramaters
+    ++++++++++
+    pyramid : [dict] Level name : (sums, counts) from build_pyramid or load_pyramid
+    data : [Pandas DataFrame] New SMPS scans indexed by scan time
+    levels : [dict] Level names and frequencies, finest first (default = levels)
+
+    Returns
+    ++++++++++
+    pyramid : [dict] Updated level name : (sums, counts)
+    """
+    names = list(levels)
+    old_s, old_n = pyramid[names[0]]
+    new_s, new_n = aggregate(data, levels[names[0]], list(old_s.columns))
+    if new_s.empty:
+        return pyramid
+    pyramid = dict(pyramid)
+    pyramid[names[0]] = (old_s.add(new_s, fill_value=0), old_n.add(new_n, fill_value=0).astype(int))
+
+    # start of the coarsest period touched, every finer period after it nests inside
+    start = pd.Series(0, index=new_s.index[:1]).resample(levels[names[-1]]).sum().index[0]
+    for fine, coarse in zip(names[:-1], names[1:]):
+        s, n = pyramid[fine]
+        part = coarsen(s[s.index >= start], n[n.index >= start], levels[coarse])
+        old_s, old_n = pyramid[coarse]
+        pyramid[coarse] = (_splice(old_s, part[0], start), _splice(old_n, part[1], start))
+    return pyramid
+
+def last_scan_path(folder, stem):
+    """
+    Path of the sidecar holding the time of the last scan in a saved rollup
+    """
+    return Path(folder) / f'{stem}_last_scan.txt'
+
+def read_last_scan(folder, stem):
+    """
+    Time of the last scan added to a saved rollup, None if it was not recorded
+    """
+    path = last_scan_path(folder, stem)
+    if not path.is_file():
+        return None
+    return pd.Timestamp(path.read_text().strip())
+
+def save_pyramid(pyramid, folder, stem, last_scan=None):
+    """
+    Writes each level as {stem}_{level}.csv (means and 'Scan Count') and
+    {stem}_{level}_counts.csv (per column counts used for later updates)
+    ----------
+    Paramaters
+    ++++++++++
+    pyramid : [dict] Level name : (sums, counts)
+    folder : [str/path-like] Output folder
+    stem : [str] File name prefix
+    last_scan : [datetime] Time of the last scan in the rollup, written to {stem}_last_scan.txt (default = None)
+
+    Returns
+    ++++++++++
+    NONE
+    """
+    folder = Path(folder)
+    for name, (sums, counts) in pyramid.items():
+        avg = means(sums, counts)
+        avg.index.names = ['DateTime Sample Start']
+        counts.index.names = ['DateTime Sample Start']
+        avg.to_csv(folder / f'{stem}_{name}.csv')
+        counts.to_csv(folder / f'{stem}_{name}_counts.csv')
+    if last_scan is not None:
+        last_scan_path(folder, stem).write_text(pd.Timestamp(last_scan).isoformat())
+
+def read_level(folder, stem, level='hourly'):
+    """
+    Reads the means of one level of a saved rollup
+    ----------
+    Paramaters
+    ++++++++++
+    folder : [str/path-like] Folder holding the rollup
+    stem : [str] File name prefix
+    level : [str] '5min', 'hourly', 'daily' or 'monthly' (default = 'hourly')
+
+    Returns
+    ++++++++++
+    avg : [Pandas DataFrame] Means and 'Scan Count' indexed by period start
+    """
+    return pd.read_csv(Path(folder) / f'{stem}_{level}.csv', index_col=0, parse_dates=True)
+
+def load_pyramid(folder, stem, levels=levels):
+    """
+    Reads a saved rollup back into sums and counts so it can be updated
+    ----------
+    Paramaters
+    ++++++++++
+    folder : [str/path-like] Folder holding the rollup
+    stem : [str] File name prefix
+    levels : [dict] Level names and frequencies, finest first (default = levels)
+
+    Returns
+    ++++++++++
+    pyramid : [dict] Level name : (sums, counts)
+    """
+    pyramid = {}
+    for name in levels:
+        avg = read_level(folder, stem, name).drop(columns='Scan Count')
+        counts = pd.read_csv(Path(folder) / f'{stem}_{name}_counts.csv', index_col=0, parse_dates=True)
+        counts = counts[avg.columns]
+        pyramid[name] = (avg.fillna(0)*counts.to_numpy(), counts)
+    return pyramid
+
+def rollup_files(files, folder, stem):
+    """
+    Builds the rollup from combined SMPS files, or updates it if one already exists in folder.
+    Only scans newer than the last scan in the existing rollup are added, the time of the
+    last scan is kept in {stem}_last_scan.txt next to the levels.
+    ----------
+    Paramaters
+    ++++++++++
+    files : [str/path-like or list] Combined SMPS file(s), metadata removed
+    folder : [str/path-like] Folder holding the rollup
+    stem : [str] File name prefix
+
+    Returns
+    ++++++++++
+    pyramid : [dict] Level name : (sums, counts)
+    """
+    data = read_scans(files)
+    first = list(levels)[0]
+    last = None
+    if (Path(folder) / f'{stem}_{first}_counts.csv').is_file():
+        pyramid = load_pyramid(folder, stem)
+        last = read_last_scan(folder, stem)
+        if last is None:
+            # rollups saved without the sidecar, only whole periods after the last one are safe
+            new = data.index >= pyramid[first][0].index.max() + pd.Timedelta(levels[first])
+        else:
+            new = data.index > last
+        pyramid = update_pyramid(pyramid, data[new])
+    else:
+        pyramid = build_pyramid(data)
+    if len(data):
+        last = data.index.max() if last is None else max(last, data.index.max())
+    save_pyramid(pyramid, folder, stem, last)
+    return pyramid
+
+if __name__ == '__main__':
+    filepath = Path(input("\nEnter full path of the combined SMPS file you would like to roll up.\n"))
+    rollup_files(filepath, filepath.parent, filepath.stem + '_rollup')
+    print(f'Rollup written to {filepath.parent}')
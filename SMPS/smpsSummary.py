@@ -0,0 +1,297 @@
+"""
+Date: 10/19/26
+Purpose: Per file summary cache for SMPS plots. Each file is reduced once to mergeable quantile
+sketches (t-digest style centroids) and fixed bin histograms of the key columns plus the summed
+size distribution. Box plots and histograms over many days are drawn from the cached summaries
+without re-reading the raw scans.
+"""
+
+"""IMPORTS"""
+import numpy as np
+import pandas as pd
+import os
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from smpsBins import size_bins, dlogdp
+
+key_cols = ['Geo. Mean (nm)', 'Geo. Std. Dev', 'Total Concentration (#/cm³)', 'Size Bin Sum']
+
+# fixed histogram edges so histograms from different files add bin by bin
+hist_edges = {'Geo. Mean (nm)': np.logspace(0, 3, 121),
+              'Geo. Std. Dev': np.linspace(1, 3.5, 101),
+              'Total Concentration (#/cm³)': np.logspace(0, 6, 121),
+              'Size Bin Sum': np.logspace(0, 7, 141)}
+
+compression = 100 # t-digest compression, larger keeps more centroids
+
+def _compress(mean, weight, delta=compression):
+    # merges neighbouring centroids whose quantile range spans less than one unit of
+    # the t-digest k1 scale, centroids near the tails stay small so extremes stay accurate
+    order = np.argsort(mean, kind='stable')
+    mean, weight = mean[order], weight[order]
+    cum = np.cumsum(weight)
+    q = (cum - weight/2)/cum[-1]
+    k = delta/2*(np.arcsin(2*q - 1)/np.pi + 0.5)
+    group = np.floor(k).astype(int)
+    group = np.unique(group, return_inverse=True)[1]
+    w = np.bincount(group, weights=weight)
+    m = np.bincount(group, weights=mean*weight)/w
+    return m, w
+
+def make_sketch(values, delta=compression):
+    """
+    Quantile sketch of a set of values
+    ----------
+    Paramaters
+    ++++++++++
+    values : [array-like] Values to summarize, nan are ignored
+    delta : [float] Compression (default = compression)
+
+    Returns
+    ++++++++++
+    sketch : [dict] Centroid 'mean' and 'weight' arrays with the exact 'min' and 'max'
+    """
+    v = np.asarray(values, dtype=float)
+    v = v[np.isfinite(v)]
+    if v.size == 0:
+        return {'mean': np.empty(0), 'weight': np.empty(0), 'min': np.nan, 'max': np.nan}
+    m, w = _compress(v, np.ones_like(v), delta)
+    return {'mean': m, 'weight': w, 'min': v.min(), 'max': v.max()}
+
+def merge_sketches(sketches, delta=compression):
+    """
+    Merges quantile sketches into one sketch of all of their values
+    ----------
+    Paramaters
+    ++++++++++
+    sketches : [list of dict] Sketches from make_sketch or merge_sketches
+    delta : [float] Compression (default = compression)
+
+    Returns
+    ++++++++++
+    sketch : [dict] Merged sketch
+    """
+    sketches = [s for s in sketches if len(s['weight'])]
+    if not sketches:
+        return make_sketch([])
+    m, w = _compress(np.concatenate([s['mean'] for s in sketches]),
+                     np.concatenate([s['weight'] for s in sketches]), delta)
+    return {'mean': m, 'weight': w, 'min': min(s['min'] for s in sketches),
+            'max': max(s['max'] for s in sketches)}
+
+def sketch_quantiles(sketch, q):
+    """
+    Estimated quantiles from a sketch, interpolating between centroids
+    ----------
+    Paramaters
+    ++++++++++
+    sketch : [dict] Quantile sketch
+    q : [array-like] Quantiles between 0 and 1
+
+    Returns
+    ++++++++++
+    values : [ndarray] Estimated value at each quantile (nan for an empty sketch)
+    """
+    q = np.asarray(q, dtype=float)
+    if len(sketch['weight']) == 0:
+        return np.full(q.shape, np.nan)
+    w = sketch['weight']
+    cum = np.cumsum(w)
+    x = np.concatenate(([0], cum - w/2, [cum[-1]]))/cum[-1]
+    y = np.concatenate(([sketch['min']], sketch['mean'], [sketch['max']]))
+    return np.interp(q, x, y)
+
+def _read_file(path):
+    # combined files start at the header, raw AIM exports have metadata lines first
+    skip = 0
+    with open(path, 'r', encoding='ISO-8859-1') as f:
+        for n, line in enumerate(f):
+            if n > 60:
+                break
+            if line.split(',')[0] in ('DateTime Sample Start', 'Scan Number'):
+                skip = n
+                break
+    data = pd.read_csv(path, skiprows=skip, encoding='ISO-8859-1')
+    data.columns = [c.replace('Â³', '³') for c in data.columns] #utf-8 files read as latin-1
+    return data
+
+def summarize(data, name=''):
+    """
+    Reduces a dataframe of SMPS scans to its summary
+    ----------
+    Paramaters
+    ++++++++++
+    data : [Pandas DataFrame] SMPS scans
+    name : [str] Label for the summary (default = '')
+
+    Returns
+    ++++++++++
+    summary : [dict] 'name', 'n_scans', sketches and histograms of key_cols, size bin 'dp',
+              summed dN/dlogDp 'bin_sum' and non-missing 'bin_count' per bin
+    """
+    bin_cols, dp = size_bins(data.columns)
+    bins = data[bin_cols].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    cols = {c: pd.to_numeric(data[c], errors='coerce').to_numpy(dtype=float) for c in key_cols[:-1] if c in data.columns}
+    cols['Size Bin Sum'] = np.where(np.isnan(bins).all(axis=1), np.nan, np.nansum(bins*dlogdp(dp), axis=1)) if len(dp) else np.full(len(data), np.nan)
+    summary = {'name': name, 'n_scans': len(data), 'dp': dp,
+               'bin_sum': np.nansum(bins, axis=0), 'bin_count': np.isfinite(bins).sum(axis=0)}
+    for c, v in cols.items():
+        summary['sketch', c] = make_sketch(v)
+        summary['hist', c] = np.histogram(v[np.isfinite(v)], hist_edges[c])[0]
+    return summary
+
+def save_summary(summary, path):
+    """
+    Writes a summary to an .npz file
+    ----------
+    Paramaters
+    ++++++++++
+    summary : [dict] Summary from summarize
+    path : [str/path-like] Output .npz file
+
+    Returns
+    ++++++++++
+    NONE
+    """
+    out = {'name': summary['name'], 'n_scans': summary['n_scans'], 'dp': summary['dp'],
+           'bin_sum': summary['bin_sum'], 'bin_count': summary['bin_count'],
+           'source_mtime': summary.get('source_mtime', np.nan)}
+    for i, c in enumerate(key_cols):
+        if ('sketch', c) in summary:
+            s = summary['sketch', c]
+            out[f'sketch{i}'] = np.vstack([s['mean'], s['weight']])
+            out[f'range{i}'] = np.array([s['min'], s['max']])
+            out[f'hist{i}'] = summary['hist', c]
+    np.savez(path, **out)
+
+def load_summary(path):
+    """
+    Reads a summary written by save_summary
+    ----------
+    Paramaters
+    ++++++++++
+    path : [str/path-like] .npz summary file
+
+    Returns
+    ++++++++++
+    summary : [dict] Summary as returned by summarize
+    """
+    with np.load(path) as z:
+        summary = {'name': str(z['name']), 'n_scans': int(z['n_scans']), 'dp': z['dp'],
+                   'bin_sum': z['bin_sum'], 'bin_count': z['bin_count'],
+                   'source_mtime': float(z['source_mtime'])}
+        for i, c in enumerate(key_cols):
+            if f'sketch{i}' in z:
+                summary['sketch', c] = {'mean': z[f'sketch{i}'][0], 'weight': z[f'sketch{i}'][1],
+                                        'min': z[f'range{i}'][0], 'max': z[f'range{i}'][1]}
+                summary['hist', c] = z[f'hist{i}']
+    return summary
+
+def file_summary(path, cache_dir=None):
+    """
+    Summary of one SMPS csv file, read from the cache unless the file changed since
+    ----------
+    Paramaters
+    ++++++++++
+    path : [str/path-like] SMPS csv file, combined or raw AIM export
+    cache_dir : [str/path-like] Folder for the .npz summaries (default = None, a
+                'summaries' folder next to the file)
+
+    Returns
+    ++++++++++
+    summary : [dict] Summary of the file
+    """
+    path = Path(path)
+    cache_dir = Path(cache_dir) if cache_dir is not None else path.parent / 'summaries'
+    cached = cache_dir / (path.stem + '.npz')
+    mtime = os.path.getmtime(path)
+    if cached.is_file():
+        summary = load_summary(cached)
+        if summary['source_mtime'] == mtime:
+            return summary
+    summary = summarize(_read_file(path), path.stem)
+    summary['source_mtime'] = mtime
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    save_summary(summary, cached)
+    return summary
+
+def folder_summaries(folder, cache_dir=None, workers=None):
+    """
+    Summaries of every csv file in a folder, files are summarized in parallel
+    ----------
+    Paramaters
+    ++++++++++
+    folder : [str/path-like] Folder of SMPS csv files
+    cache_dir : [str/path-like] Folder for the .npz summaries (default = None, folder/summaries)
+    workers : [int] Number of processes, 1 runs in this process (default = None, cpu count)
+
+    Returns
+    ++++++++++
+    summaries : [list of dict] One summary per file, sorted by file name
+    """
+    folder = Path(folder)
+    cache_dir = cache_dir if cache_dir is not None else folder / 'summaries'
+    files = sorted(p for p in folder.iterdir() if p.is_file() and p.suffix.lower() == '.csv')
+    if workers == 1 or len(files) <= 1:
+        return [file_summary(f, cache_dir) for f in files]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(file_summary, files, [cache_dir]*len(files)))
+
+def merge_summaries(summaries, name='merged'):
+    """
+    Combines summaries into one, as if all of their scans were in a single file
+    ----------
+    Paramaters
+    ++++++++++
+    summaries : [list of dict] Summaries with the same size bins
+    name : [str] Label for the merged summary (default = 'merged')
+
+    Returns
+    ++++++++++
+    summary : [dict] Merged summary
+    """
+    merged = {'name': name, 'n_scans': sum(s['n_scans'] for s in summaries), 'dp': summaries[0]['dp'],
+              'bin_sum': np.sum([s['bin_sum'] for s in summaries], axis=0),
+              'bin_count': np.sum([s['bin_count'] for s in summaries], axis=0)}
+    for c in key_cols:
+        have = [s for s in summaries if ('sketch', c) in s]
+        if have:
+            merged['sketch', c] = merge_sketches([s['sketch', c] for s in have])
+            merged['hist', c] = np.sum([s['hist', c] for s in have], axis=0)
+    return merged
+
+def box_stats(summaries, column):
+    """
+    Box and whisker statistics of one column for each summary, ready for Axes.bxp.
+    Whiskers are the 5th and 95th percentiles.
+    ----------
+    Paramaters
+    ++++++++++
+    summaries : [list of dict] Summaries, one box each
+    column : [str] One of key_cols
+
+    Returns
+    ++++++++++
+    stats : [list of dict] 'label', 'whislo', 'q1', 'med', 'q3', 'whishi' per summary
+    """
+    stats = []
+    for s in summaries:
+        lo, q1, med, q3, hi = sketch_quantiles(s['sketch', column], [0.05, 0.25, 0.5, 0.75, 0.95])
+        stats.append({'label': s['name'], 'whislo': lo, 'q1': q1, 'med': med, 'q3': q3,
+                      'whishi': hi, 'fliers': []})
+    return stats
+
+def mean_distribution(summary):
+    """
+    Mean dN/dlogDp of every size bin over the summarized scans
+    ----------
+    Paramaters
+    ++++++++++
+    summary : [dict] Summary
+
+    Returns
+    ++++++++++
+    dist : [Pandas Series] Mean dN/dlogDp indexed by bin midpoint diameter in nm
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.Series(summary['bin_sum']/summary['bin_count'], index=summary['dp'])
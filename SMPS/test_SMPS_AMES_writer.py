@@ -0,0 +1,18 @@
+"""
+Date: 10/19/26
+Purpose: Checks of the shared NASA AMES writer, run with pytest from the SMPS folder
+"""
+
+"""IMPORTS"""
+import numpy as np
+import pytest
+
+pytest.importorskip('ebas')
+from SMPS_AMES_writer import prepare_values
+
+def test_non_finite_values_are_missing():
+    data = np.array([[1.23456789, np.inf],
+                     [np.nan, -np.inf],
+                     [2.0, 3.0]])
+    values = prepare_values(data)
+    assert values == [[1.234568, None, 2.0], [None, None, 3.0]]